@@ -1,5 +1,99 @@
 # celery_worker.py
-from tasks import celery_app
+import json
+import redis
+from celery.signals import celeryd_init, worker_process_init, worker_process_shutdown
+from celery.worker.control import inspect_command
+from tasks import celery_app, MODEL_QUEUES
+from config import WORKER_WARMUP, WORKER_WARMUP_TIMEOUT, WORKER_STATUS_REDIS_URL
 
 # Файл используется для запуска воркера:
 # celery -A celery_worker.celery_app worker --loglevel=info
+# Воркер отдельной очереди (forecast.statistical, forecast.tree, forecast.neural):
+# celery -A celery_worker.celery_app worker -Q forecast.neural --loglevel=info
+# Статус прогрева процессов: celery -A celery_worker.celery_app inspect warmup_status
+
+# Процесс пула считается запущенным только после worker_process_init,
+# поэтому время ожидания увеличено на время прогрева
+celery_app.conf.worker_proc_alive_timeout = WORKER_WARMUP_TIMEOUT
+
+WARMUP_KEY_PREFIX = "forecast:warmup:"
+# Имя узла воркера: задаётся в основном процессе до запуска пула и наследуется процессами пула
+worker_nodename = None
+status_redis = redis.Redis.from_url(WORKER_STATUS_REDIS_URL, socket_connect_timeout=1)
+
+
+# Список моделей для прогрева из WORKER_WARMUP
+def warmup_models():
+    value = (WORKER_WARMUP or "").strip()
+    if value.lower() in ("", "0", "none", "false"):
+        return []
+    if value.lower() == "all":
+        return list(MODEL_QUEUES)
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+# Публикация статуса прогрева процесса: хэш по имени узла, поле — pid процесса.
+# Если Redis недоступен, процесс перестаёт публиковать статус после первой ошибки
+status_publishing = True
+
+
+def publish_warmup_status(status):
+    global status_publishing
+    if not status_publishing:
+        return
+    try:
+        key = WARMUP_KEY_PREFIX + (worker_nodename or "unknown")
+        status_redis.hset(key, str(status["pid"]), json.dumps(status))
+        status_redis.expire(key, 7 * 24 * 3600)
+    except Exception as e:
+        status_publishing = False
+        print(f"Не удалось сохранить статус прогрева: {e}")
+
+
+@celeryd_init.connect
+def remember_nodename(sender=None, **kwargs):
+    global worker_nodename
+    worker_nodename = sender
+
+
+@worker_process_init.connect
+def warm_up_process(**kwargs):
+    """
+    Прогрев процесса пула: настройка потоков torch и пробное обучение моделей,
+    чтобы первая задача свежего процесса выполнялась так же быстро, как последующие.
+    """
+    models = warmup_models()
+    if not models:
+        return
+    from forecast.warmup import warm_up
+    status = warm_up(models, on_update=publish_warmup_status)
+    print(f"Прогрев процесса {status['pid']} завершён за {status['seconds']} с: "
+          + ", ".join(f"{name} — {item['status']}" for name, item in status["models"].items()))
+
+
+@worker_process_shutdown.connect
+def forget_warmup_status(pid=None, **kwargs):
+    try:
+        status_redis.hdel(WARMUP_KEY_PREFIX + (worker_nodename or "unknown"), str(pid))
+    except Exception:
+        pass
+
+
+@inspect_command()
+def warmup_status(state, **kwargs):
+    """
+    Статус прогрева процессов пула этого воркера (pid -> модели, время, ошибки).
+    """
+    try:
+        raw = status_redis.hgetall(WARMUP_KEY_PREFIX + state.hostname)
+    except Exception as e:
+        return {"error": str(e)}
+    try:
+        alive = {str(pid) for pid in state.consumer.pool.info.get("processes", [])}
+    except Exception:
+        alive = None
+    return {
+        pid.decode(): json.loads(value)
+        for pid, value in raw.items()
+        if alive is None or pid.decode() in alive
+    }
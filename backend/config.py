@@ -18,3 +18,49 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./app.db")
 # Настройки Celery: брокер и backend для хранения результатов
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/1")
+# Формат результатов задач в backend: сериализатор (json или msgpack) и сжатие результата
+# прогноза (zlib или zstd — при установленном zstandard; пусто — без сжатия)
+CELERY_RESULT_SERIALIZER = os.getenv("CELERY_RESULT_SERIALIZER", "json")
+CELERY_RESULT_COMPRESSION = os.getenv("CELERY_RESULT_COMPRESSION", "") or None
+
+# Реестр обученных моделей: каталог с артефактами и его максимальный размер (в мегабайтах)
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "./model_registry")
+MODEL_REGISTRY_MAX_MB = int(os.getenv("MODEL_REGISTRY_MAX_MB", "2048"))
+
+# Хранилище загруженных наборов данных (общий каталог для API и воркеров Celery),
+# его максимальный размер (в мегабайтах) и время хранения неиспользуемого набора (в секундах)
+DATASET_STORE_DIR = os.getenv("DATASET_STORE_DIR", "./datasets")
+DATASET_STORE_MAX_MB = int(os.getenv("DATASET_STORE_MAX_MB", "4096"))
+DATASET_STORE_TTL = int(os.getenv("DATASET_STORE_TTL", str(7 * 24 * 3600)))
+
+# Параллелизм воркера: число процессов Celery (0 — по числу ядер) и потоков XGBoost
+# на задачу (0 — ядра делятся поровну между процессами воркера)
+CELERY_WORKER_CONCURRENCY = int(os.getenv("CELERY_WORKER_CONCURRENCY", "0"))
+# Сколько задач процесс воркера резервирует заранее (0 — значение Celery по умолчанию);
+# для долгих задач (нейросети) стоит 1, чтобы задачи не ждали за чужими обучениями
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv("CELERY_WORKER_PREFETCH_MULTIPLIER", "0"))
+XGB_NTHREAD = int(os.getenv("XGB_NTHREAD", "0"))
+# Потоков на задачу (torch, XGBoost, параллельный перебор); 0 — ядра делятся между процессами воркера
+TASK_THREAD_BUDGET = int(os.getenv("TASK_THREAD_BUDGET", "0"))
+# Минимальный интервал (в секундах) между отчётами о прогрессе обучения в result backend
+TASK_PROGRESS_INTERVAL = float(os.getenv("TASK_PROGRESS_INTERVAL", "2"))
+# Отмена задач: Redis для флагов отмены и минимальный интервал (в секундах) между проверками
+# флага в циклах обучения — за это время отменённая задача освобождает воркер
+TASK_CANCEL_REDIS_URL = os.getenv("TASK_CANCEL_REDIS_URL", "redis://redis:6379/2")
+TASK_CANCEL_CHECK_INTERVAL = float(os.getenv("TASK_CANCEL_CHECK_INTERVAL", "1"))
+# Бюджет времени (в секундах) на задачу нейросетевой модели, если он не задан в параметрах
+# модели (time_budget); 0 — без ограничения. Эпохи, фолды, батч и число MC-сэмплов
+# подбираются под бюджет, обучение останавливается по его исчерпании
+NEURAL_TIME_BUDGET = float(os.getenv("NEURAL_TIME_BUDGET", "600"))
+
+# Объединение одинаковых запросов прогноза: Redis для отпечатков запросов и время жизни
+# записей (в секундах), размер кэша результатов демо-эндпоинта в памяти процесса
+REQUEST_CACHE_REDIS_URL = os.getenv("REQUEST_CACHE_REDIS_URL", "redis://redis:6379/2")
+REQUEST_CACHE_TTL = int(os.getenv("REQUEST_CACHE_TTL", "3600"))
+REQUEST_CACHE_SIZE = int(os.getenv("REQUEST_CACHE_SIZE", "128"))
+
+# Прогрев процессов воркера: модели для пробного обучения ("all", "none" или список через запятую),
+# допустимое время прогрева одного процесса (в секундах) и Redis для публикации статуса прогрева
+WORKER_WARMUP = os.getenv("WORKER_WARMUP", "all")
+WORKER_WARMUP_TIMEOUT = float(os.getenv("WORKER_WARMUP_TIMEOUT", "120"))
+WORKER_STATUS_REDIS_URL = os.getenv("WORKER_STATUS_REDIS_URL", "redis://redis:6379/2")
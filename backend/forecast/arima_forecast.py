@@ -1,9 +1,307 @@
+import hashlib
+import os
+import queue
+import signal
+import time
+import warnings
+import billiard
+import numpy as np
 import pandas as pd
+from statsmodels.tsa.seasonal import STL
+from statsmodels.tsa.statespace import kalman_filter
 from statsmodels.tsa.statespace.sarimax import SARIMAX
+from statsmodels.tsa.stattools import kpss
+from forecast.resources import current_thread_budget
+from forecast.cancellation import check_cancelled
+
+
+# Оценка одного кандидата при подборе порядков: возвращает значение информационного критерия
+# (inf, если модель не сошлась). Функция верхнего уровня, чтобы её можно было отдать в пул процессов.
+def _fit_candidate(values, order, seasonal_order, criterion):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            result = SARIMAX(values, order=order, seasonal_order=seasonal_order).fit(disp=False, maxiter=50)
+        score = float(getattr(result, criterion))
+    except Exception:
+        score = np.inf
+    return score if np.isfinite(score) else np.inf
+
+
+# Порядок обычного дифференцирования по тесту KPSS (как ndiffs в auto.arima)
+def _ndiffs(values, max_d):
+    d = 0
+    series = values
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        while d < max_d and len(series) > 10 and kpss(series, regression='c', nlags='auto')[1] < 0.05:
+            series = np.diff(series)
+            d += 1
+    return d
+
+
+# Порядок сезонного дифференцирования по силе сезонности STL (порог 0.64, как nsdiffs в auto.arima)
+def _nsdiffs(values, s, max_D):
+    if max_D < 1 or s < 2 or len(values) < 2 * s + 1:
+        return 0
+    decomposition = STL(values, period=s).fit()
+    remainder = decomposition.resid
+    seasonal_var = np.var(decomposition.seasonal + remainder)
+    strength = max(0.0, 1 - np.var(remainder) / seasonal_var) if seasonal_var > 0 else 0.0
+    return 1 if strength > 0.64 else 0
+
+
+# Процесс оценки кандидатов: берёт задания (кандидат, порядки) из очереди tasks,
+# кладёт (кандидат, значение критерия) в results. Завершается, если родительский процесс
+# (воркер задачи) умер, не остановив пул
+def _candidate_worker(values, criterion, tasks, results, parent_pid):
+    while os.getppid() == parent_pid:
+        try:
+            candidate, order, seasonal_order = tasks.get(timeout=1.0)
+        except queue.Empty:
+            continue
+        results.put((candidate, _fit_candidate(values, order, seasonal_order, criterion)))
+
+
+class CandidatePool:
+    """
+    Пул процессов для оценки кандидатов при подборе порядков. Процессы создаются через
+    billiard (как пулы Celery): в отличие от multiprocessing он разрешает дочерние процессы
+    и внутри daemon-процесса prefork-воркера. Ряд передаётся процессам при запуске (fork),
+    задания — только порядки. terminate() убивает процессы вместе с начатыми оценками,
+    поэтому по таймауту или при отмене задачи они не продолжают занимать ядра.
+    """
+
+    def __init__(self, processes, values, criterion):
+        self.tasks = billiard.Queue()
+        self.results = billiard.Queue()
+        self.processes = [
+            billiard.Process(target=_candidate_worker, daemon=True,
+                             args=(values, criterion, self.tasks, self.results, os.getpid()))
+            for _ in range(processes)
+        ]
+        for process in self.processes:
+            process.start()
+
+    def submit(self, candidate, order, seasonal_order):
+        self.tasks.put((candidate, order, seasonal_order))
+
+    def get(self, timeout):
+        """
+        Очередной результат (кандидат, значение) или None, если за timeout секунд его нет.
+        """
+        try:
+            return self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def terminate(self):
+        for process in self.processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGKILL)
+        for process in self.processes:
+            process.join(timeout=1.0)
+        # Очереди больше не читаются: их фоновые потоки не должны ждать при выходе
+        for q in (self.tasks, self.results):
+            q.cancel_join_thread()
+            q.close()
+
+
+# Фильтр Калмана без хранения отфильтрованных состояний, ковариаций, усилений и сглаживания:
+# сохраняются только одношаговые прогнозы, нужные для прогноза по истории
+LONG_SERIES_MEMORY = (kalman_filter.MEMORY_NO_FILTERED | kalman_filter.MEMORY_NO_PREDICTED_COV |
+                      kalman_filter.MEMORY_NO_GAIN | kalman_filter.MEMORY_NO_SMOOTHING |
+                      kalman_filter.MEMORY_NO_STD_FORECAST)
+
+
+class LongSeriesSARIMAResults:
+    """
+    Результаты SARIMA в режиме длинных рядов (часовые данные с s=24/168 и т.п.).
+    Параметры оцениваются на ограниченном хвосте ряда (window наблюдений) с простым
+    дифференцированием (simple_differencing: в состоянии нет сезонных разностей),
+    концентрированной дисперсией и фильтром low_memory. Прогноз по истории и прогноз вперёд
+    получаются одним экономным проходом фильтра с найденными параметрами и интегрированием
+    разностей обратно к уровням ряда. Повторяет используемую часть интерфейса
+    результатов statsmodels: params, predict, forecast, append.
+    """
+
+    def __init__(self, series: pd.Series, order, seasonal_order, params, window: int):
+        self.series = series
+        self.order = tuple(order)
+        self.seasonal_order = tuple(seasonal_order)
+        self.params = params
+        self.window = window
+        self.freq = series.index.freq or pd.infer_freq(series.index)
+        self._filtered = None
+        # Коэффициенты оператора разностей (1 - L)^d (1 - L^s)^D
+        d, (D, s) = self.order[1], (self.seasonal_order[1], self.seasonal_order[3])
+        poly = np.array([1.0])
+        for _ in range(d):
+            poly = np.convolve(poly, [1.0, -1.0])
+        for _ in range(D):
+            poly = np.convolve(poly, np.r_[1.0, np.zeros(s - 1), -1.0])
+        self.poly = poly
+
+    @classmethod
+    def fit(cls, series: pd.Series, order, seasonal_order, window: int = 5000, start_params=None):
+        tail = series.iloc[-window:]
+        model = SARIMAX(tail, order=order, seasonal_order=seasonal_order,
+                        simple_differencing=True, concentrate_scale=True)
+        result = model.fit(start_params=start_params, disp=False, low_memory=True)
+        return cls(series, order, seasonal_order, np.asarray(result.params), window)
+
+    def _filter(self, series: pd.Series):
+        model = SARIMAX(series, order=self.order, seasonal_order=self.seasonal_order,
+                        simple_differencing=True, concentrate_scale=True)
+        return model.filter(self.params, conserve_memory=LONG_SERIES_MEMORY)
+
+    def predict(self, start=None, end=None) -> pd.Series:
+        if self._filtered is None:
+            self._filtered = self._filter(self.series)
+        values = self.series.to_numpy(dtype=float)
+        m = len(self.poly) - 1
+        # Уровень = прогноз разности + часть оператора разностей от прошлых значений
+        lagged = values[m:] - np.convolve(values, self.poly, mode='valid')
+        levels = values.copy()
+        levels[m:] = np.asarray(self._filtered.fittedvalues) + lagged
+        return pd.Series(levels, index=self.series.index).loc[start:end]
+
+    def forecast(self, steps: int) -> pd.Series:
+        # Состояние на конце ряда: полный проход, если он уже есть, иначе — по хвосту ряда
+        filtered = self._filtered if self._filtered is not None else self._filter(self.series.iloc[-self.window:])
+        diff_forecast = np.asarray(filtered.forecast(steps))
+        m = len(self.poly) - 1
+        history = list(self.series.to_numpy(dtype=float)[-m:]) if m else []
+        levels = []
+        for value in diff_forecast:
+            level = value - sum(self.poly[k] * history[-k] for k in range(1, m + 1))
+            history.append(level)
+            levels.append(level)
+        index = pd.date_range(start=self.series.index[-1], periods=steps + 1, freq=self.freq)[1:]
+        return pd.Series(levels, index=index, name='predicted_mean')
+
+    def append(self, new_obs: pd.Series) -> "LongSeriesSARIMAResults":
+        return LongSeriesSARIMAResults(pd.concat([self.series, new_obs]), self.order, self.seasonal_order,
+                                       self.params, self.window)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_filtered'] = None
+        return state
+
+
+# Отпечаток ряда (значения и даты) для проверки, что новый ряд продолжает сохранённый
+def _series_hash(series):
+    return hashlib.sha256(pd.util.hash_pandas_object(series, index=True).values.tobytes()).hexdigest()
+
+
+# Автоматический подбор порядков SARIMA пошаговым поиском (stepwise, как в auto.arima).
+# d и D определяются тестами, затем оцениваются стартовые модели и на каждом шаге — все
+# соседи текущей лучшей (p, q, P, Q на ±1, а также p и q / P и Q одновременно) в пределах
+# сетки; поиск останавливается, когда соседи не улучшают критерий или истекает time_budget
+# секунд. Кандидаты одного шага оцениваются параллельно в пуле процессов (CandidatePool).
+# Возвращает словарь с выбранными порядками или None, если ни одна модель не оценена.
+def auto_sarima_order(ts, s, max_p=3, max_q=3, max_P=2, max_Q=2, max_d=2, max_D=1,
+                      criterion='aic', time_budget=60.0, max_workers=None):
+    criterion = criterion.lower()
+    if criterion not in ('aic', 'bic', 'aicc', 'hqic'):
+        raise ValueError(f"Неизвестный информационный критерий: {criterion}")
+    started = time.monotonic()
+    deadline = started + time_budget
+    values = np.asarray(ts, dtype=float)
+    seasonal = s > 1
+    if not seasonal:
+        max_P = max_Q = 0
+    d = _ndiffs(values, max_d)
+    D = _nsdiffs(values, s, max_D) if seasonal else 0
+    bounds = (max_p, max_q, max_P, max_Q)
+
+    def clip(candidate):
+        return tuple(min(max(v, 0), b) for v, b in zip(candidate, bounds))
+
+    def orders(candidate):
+        p, q, P, Q = candidate
+        return (p, d, q), (P, D, Q, s if seasonal else 0)
+
+    frontier = list(dict.fromkeys(clip(c) for c in [(2, 2, 1, 1), (0, 0, 0, 0), (1, 0, 1, 0), (0, 1, 0, 1)]))
+    scores = {}
+    best = None
+    timed_out = False
+    budget = current_thread_budget()
+    n_workers = max(1, min(max_workers or (budget or {}).get('workers') or os.cpu_count() or 1, 8))
+    pool = CandidatePool(n_workers, values, criterion)
+    try:
+        while frontier:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            for c in frontier:
+                pool.submit(c, *orders(c))
+            # Результаты ожидаются короткими отрезками: между ними проверяется отмена задачи
+            # (при отмене или таймауте finally завершает пул вместе с начатыми оценками)
+            pending = len(frontier)
+            while pending and remaining > 0:
+                result = pool.get(timeout=min(remaining, 1.0))
+                if result is not None:
+                    scores[result[0]] = result[1]
+                    pending -= 1
+                check_cancelled()
+                remaining = deadline - time.monotonic()
+            timed_out = timed_out or bool(pending)
+            previous = best
+            finite = [c for c, score in scores.items() if np.isfinite(score)]
+            best = min(finite, key=scores.get) if finite else None
+            if best is None or best == previous or timed_out:
+                break
+            neighbours = []
+            for i in range(4):
+                for step in (-1, 1):
+                    candidate = list(best)
+                    candidate[i] += step
+                    neighbours.append(clip(candidate))
+            for i, j in ((0, 1), (2, 3)):
+                for step in (-1, 1):
+                    candidate = list(best)
+                    candidate[i] += step
+                    candidate[j] += step
+                    neighbours.append(clip(candidate))
+            frontier = [c for c in dict.fromkeys(neighbours) if c not in scores]
+    finally:
+        pool.terminate()
+
+    if best is None:
+        return None
+    order, seasonal_order = orders(best)
+    return {
+        'order': list(order),
+        'seasonal_order': list(seasonal_order),
+        'criterion': criterion,
+        'score': scores[best],
+        'evaluated': len(scores),
+        'timed_out': timed_out,
+        'elapsed': round(time.monotonic() - started, 2)
+    }
 
 
 def sarima_forecast(df, horizon, test_size, dt_name, y_name, freq, confidence_level=95,
-                    order=(1, 1, 1), seasonal_order=(1, 1, 1, 12)):
+                    order=(1, 1, 1), seasonal_order=(1, 1, 1, 12), artifacts=None, refit_full=False,
+                    auto_params=None, refit_every=None, long_series=None, window=5000):
+    # artifacts — необязательный словарь для реестра моделей: 'model' хранит обученные
+    # результаты SARIMAX; при их наличии оценка параметров пропускается.
+    # Модель оценивается один раз: те же результаты дают прогноз на train, на test и на горизонт
+    # (для горизонта фильтр Калмана дополняется тестовым участком без переоценки параметров).
+    # refit_full — переоценить модель на всём ряду, стартуя с найденных параметров (start_params).
+    # auto_params — если задан, порядки подбираются auto_sarima_order по обучающей части ряда
+    # (ключи max_p, max_q, max_P, max_Q, max_d, max_D, information_criterion, search_time_budget,
+    # search_workers); order и seasonal_order тогда задают только сезонный период s.
+    # Режим обновления: artifacts['base'] — сохранённое состояние той же модели на более коротком
+    # ряду. Если текущая обучающая часть продолжает его, результаты дополняются только новыми
+    # наблюдениями (append, без переоценки параметров). refit_every — после скольких таких
+    # обновлений выполнить полную переоценку (стартуя с прежних параметров); None — никогда.
+    # long_series — режим длинных рядов (LongSeriesSARIMAResults): оценка на последних window
+    # наблюдениях с simple_differencing, low_memory и концентрированной дисперсией.
+    # None — включается автоматически для рядов длиннее window с сезонным периодом от 24.
     try:
         data = df.copy()
         data[dt_name] = pd.to_datetime(data[dt_name])
@@ -15,13 +313,60 @@ def sarima_forecast(df, horizon, test_size, dt_name, y_name, freq, confidence_le
 
         ts = data[y_name]
         n = len(ts)
+        cached = artifacts.get('model') if artifacts is not None else None
+        fitted = cached['fit'] if cached is not None else None
+        full_fit = cached.get('full_fit') if cached is not None else None
+        search = cached.get('search') if cached is not None else None
+        updates = cached.get('updates', 0) if cached is not None else 0
+        fit_ts = ts.iloc[:n - test_size] if 0 < test_size < n else ts
+        if long_series is None:
+            long_series = n > window and seasonal_order[3] >= 24
+
+        base = artifacts.get('base') if artifacts is not None else None
+        start_params = None
+        if fitted is None and base is not None and base['n_fit'] <= len(fit_ts) \
+                and isinstance(base['fit'], LongSeriesSARIMAResults) == long_series \
+                and _series_hash(fit_ts.iloc[:base['n_fit']]) == base['fit_hash']:
+            search = base.get('search')
+            updates = base.get('updates', 0) + 1
+            if refit_every and updates >= refit_every:
+                # Плановая полная переоценка с прежних параметров
+                start_params = base['fit'].params
+                updates = 0
+            else:
+                new_obs = fit_ts.iloc[base['n_fit']:]
+                fitted = base['fit'].append(new_obs) if len(new_obs) else base['fit']
+                print(f"SARIMA: модель дополнена {len(new_obs)} новыми наблюдениями без переоценки")
+
+        if auto_params is not None and fitted is None and search is None:
+            search = auto_sarima_order(
+                fit_ts.iloc[-window:] if long_series else fit_ts,
+                s=seasonal_order[3],
+                max_p=auto_params.get('max_p', 3),
+                max_q=auto_params.get('max_q', 3),
+                max_P=auto_params.get('max_P', 2),
+                max_Q=auto_params.get('max_Q', 2),
+                max_d=auto_params.get('max_d', 2),
+                max_D=auto_params.get('max_D', 1),
+                criterion=auto_params.get('information_criterion', 'aic'),
+                time_budget=auto_params.get('search_time_budget', 60.0),
+                max_workers=auto_params.get('search_workers')
+            )
+            print(f"Подбор порядков SARIMA: {search}")
+        if search is not None:
+            order, seasonal_order = tuple(search['order']), tuple(search['seasonal_order'])
 
         if test_size > 0 and test_size < n:
             train_ts = ts.iloc[:n - test_size]
             test_ts = ts.iloc[n - test_size:]
 
-            model_train = SARIMAX(train_ts, order=order, seasonal_order=seasonal_order)
-            model_fit = model_train.fit(disp=False)
+            if fitted is not None:
+                model_fit = fitted
+            elif long_series:
+                model_fit = LongSeriesSARIMAResults.fit(train_ts, order, seasonal_order, window, start_params)
+            else:
+                model_train = SARIMAX(train_ts, order=order, seasonal_order=seasonal_order)
+                model_fit = model_train.fit(start_params=start_params, disp=False)
 
             train_pred = model_fit.predict(start=train_ts.index[0], end=train_ts.index[-1])
             forecast_train = pd.DataFrame({
@@ -39,8 +384,13 @@ def sarima_forecast(df, horizon, test_size, dt_name, y_name, freq, confidence_le
 
             forecast_all = forecast_train.copy()
         else:
-            model = SARIMAX(ts, order=order, seasonal_order=seasonal_order)
-            model_fit = model.fit(disp=False)
+            if fitted is not None:
+                model_fit = fitted
+            elif long_series:
+                model_fit = LongSeriesSARIMAResults.fit(ts, order, seasonal_order, window, start_params)
+            else:
+                model = SARIMAX(ts, order=order, seasonal_order=seasonal_order)
+                model_fit = model.fit(start_params=start_params, disp=False)
             all_pred = model_fit.predict(start=ts.index[0], end=ts.index[-1])
             forecast_all = pd.DataFrame({
                 "ds": ts.index,
@@ -57,8 +407,27 @@ def sarima_forecast(df, horizon, test_size, dt_name, y_name, freq, confidence_le
                 df_forecast["yhat_upper"] = df_forecast["y_forecast"] * (1 + margin)
                 df_forecast["model_name"] = "SARIMA"
 
-        model_future = SARIMAX(train_ts if (test_size > 0 and test_size < n) else ts,
-                               order=order, seasonal_order=seasonal_order).fit(disp=False)
+        if test_size > 0 and test_size < n:
+            if refit_full:
+                if full_fit is None and long_series:
+                    full_fit = LongSeriesSARIMAResults.fit(ts, order, seasonal_order, window, model_fit.params)
+                elif full_fit is None:
+                    full_fit = SARIMAX(ts, order=order, seasonal_order=seasonal_order).fit(
+                        start_params=model_fit.params, disp=False)
+                model_future = full_fit
+            else:
+                model_future = model_fit.append(test_ts)
+        else:
+            model_future = model_fit
+        if artifacts is not None:
+            artifacts['model'] = {
+                'fit': model_fit,
+                'full_fit': full_fit,
+                'search': search,
+                'n_fit': len(fit_ts),
+                'fit_hash': _series_hash(fit_ts),
+                'updates': updates
+            }
         future_pred = model_future.forecast(steps=horizon)
         last_date = ts.index[-1]
         future_dates = pd.date_range(start=last_date, periods=horizon + 1, freq=freq)[1:]
@@ -0,0 +1,71 @@
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Callable, Optional
+
+
+class ForecastCancelled(BaseException):
+    """
+    Задача прогнозирования отменена пользователем.
+    Наследуется от BaseException (как asyncio.CancelledError): обработчики
+    except Exception в функциях прогноза не должны превращать отмену в пустой результат.
+    """
+
+
+class CancellationToken:
+    """
+    Флаг отмены задачи. Источник флага (is_cancelled, например, ключ в Redis) опрашивается
+    не чаще раза в min_interval секунд, поэтому проверку можно вызывать на каждом батче.
+    После срабатывания флаг запоминается.
+    """
+
+    def __init__(self, is_cancelled: Callable[[], bool], min_interval: float = 1.0):
+        self.is_cancelled = is_cancelled
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self.cancelled = False
+
+    def check(self) -> None:
+        if not self.cancelled:
+            now = time.monotonic()
+            with self._lock:
+                if now - self._last_check < self.min_interval:
+                    return
+                self._last_check = now
+            try:
+                self.cancelled = bool(self.is_cancelled())
+            except Exception as e:
+                print(f"Не удалось проверить флаг отмены задачи: {e}")
+        if self.cancelled:
+            raise ForecastCancelled("Задача отменена")
+
+
+# Флаг отмены выполняемой задачи (None — отмена не поддерживается, проверки ничего не делают)
+_token = contextvars.ContextVar("cancellation_token", default=None)
+
+
+@contextlib.contextmanager
+def cancellation_scope(is_cancelled: Callable[[], bool], min_interval: float = 1.0):
+    """
+    Включает кооперативную отмену на время задачи: check_cancelled() в циклах обучения,
+    перебора SARIMA и MC Dropout выбрасывает ForecastCancelled, когда флаг установлен.
+    """
+    token = CancellationToken(is_cancelled, min_interval)
+    reset = _token.set(token)
+    try:
+        yield token
+    finally:
+        _token.reset(reset)
+
+
+def current_token() -> Optional[CancellationToken]:
+    return _token.get()
+
+
+# Проверка отмены между эпохами/батчами/шагами перебора
+def check_cancelled() -> None:
+    token = _token.get()
+    if token is not None:
+        token.check()
@@ -0,0 +1,242 @@
+import math
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from sklearn.model_selection import TimeSeriesSplit
+from typing import Callable, Dict, List
+
+from config import NEURAL_TIME_BUDGET
+from forecast.resources import current_thread_budget
+
+# Минимум окон в валидационной части фолда
+MIN_VAL_WINDOWS = 8
+# Ряд, начиная с которого кросс-валидация ограничивается тремя фолдами (число окон обучения)
+LARGE_SERIES_WINDOWS = 50_000
+# Размер батча подбирается так, чтобы эпоха занимала не больше стольких шагов
+TARGET_STEPS_PER_EPOCH = 200
+MIN_BATCH_SIZE = 8
+MAX_BATCH_SIZE = 1024
+# Меньше этого числа MC-сэмплов среднее неустойчиво: прогноз делается детерминированным проходом
+MIN_MC_SAMPLES = 10
+# Доля бюджета, отводимая прогнозу (исторический прогноз по всем окнам и горизонт)
+FORECAST_SHARE = 0.2
+
+
+def _pow2_floor(n: int) -> int:
+    return 1 << (max(1, int(n)).bit_length() - 1)
+
+
+def _pow2_ceil(n: int) -> int:
+    return 1 << (max(1, int(n)) - 1).bit_length()
+
+
+def plan_data_size(params: Dict, n_train: int, horizon: int) -> Dict:
+    """
+    Параметры обучения по длине ряда: заданные значения n_splits — верхняя граница,
+    batch_size — отправная точка.
+      - n_splits уменьшается, пока в валидационной части фолда меньше MIN_VAL_WINDOWS окон
+        (не меньше двух фолдов); для длинных рядов — не больше трёх;
+      - batch_size уменьшается для коротких рядов (хотя бы четыре шага на эпоху)
+        и растёт для длинных (не больше TARGET_STEPS_PER_EPOCH шагов, до MAX_BATCH_SIZE).
+    Возвращает изменённые значения.
+    """
+    window = params['seq_length'] + horizon
+    windows = max(1, n_train - window + 1)
+    n_splits = int(params['n_splits'])
+    max_splits = n_train // (window + MIN_VAL_WINDOWS - 1) - 1
+    n_splits = max(2, min(n_splits, max_splits))
+    if windows > LARGE_SERIES_WINDOWS:
+        n_splits = min(n_splits, 3)
+
+    batch_size = int(params['batch_size'])
+    batch_size = min(batch_size, max(MIN_BATCH_SIZE, _pow2_floor(windows // 4)))
+    batch_size = max(batch_size, min(MAX_BATCH_SIZE, _pow2_ceil(math.ceil(windows / TARGET_STEPS_PER_EPOCH))))
+    return {'n_splits': n_splits, 'batch_size': batch_size}
+
+
+def measure_step_time(build_fn: Callable, data: np.ndarray, params: Dict, horizon: int,
+                      loss_fn: nn.Module, device: str, steps: int = 3):
+    """
+    Время шага обучения и прямого прохода в пересчёте на одно окно: несколько шагов
+    на отдельной модели (build_fn) по первому батчу. Состояние генератора случайных чисел
+    сохраняется, поэтому замер не меняет инициализацию и обучение основной модели.
+    Возвращает (секунд на окно при обучении, секунд на окно при прямом проходе)
+    или None, если в данных нет ни одного окна.
+    """
+    # Импорт здесь: neural_common использует план обучения из этого модуля
+    from forecast.neural_common import SlidingWindowLoader
+
+    loader = SlidingWindowLoader(data, params['seq_length'], horizon,
+                                 batch_size=params['batch_size'], shuffle=False)
+    if not len(loader):
+        return None
+    x, y = next(iter(loader))
+    x, y = x.to(device), y.to(device)
+    with torch.random.fork_rng(devices=[]):
+        model, optimizer = build_fn()[:2]
+        model.train()
+
+        def train_step():
+            optimizer.zero_grad()
+            loss = loss_fn(model(x), y)
+            loss.backward()
+            optimizer.step()
+
+        # Первый шаг не учитывается: выделение памяти и инициализация ядер
+        train_step()
+        t0 = time.perf_counter()
+        for _ in range(steps):
+            train_step()
+        train_row = (time.perf_counter() - t0) / steps / len(x)
+        with torch.no_grad():
+            t0 = time.perf_counter()
+            for _ in range(steps):
+                model(x)
+            forward_row = (time.perf_counter() - t0) / steps / len(x)
+    return train_row, forward_row
+
+
+def measure_forward_time(model: nn.Module, data: np.ndarray, params: Dict, horizon: int,
+                         device: str, steps: int = 3):
+    """
+    Время прямого прохода уже обученной модели (из реестра) в пересчёте на одно окно:
+    несколько проходов по первому батчу. Возвращает секунд на окно или None,
+    если в данных нет ни одного окна.
+    """
+    from forecast.neural_common import SlidingWindowLoader
+
+    loader = SlidingWindowLoader(data, params['seq_length'], horizon,
+                                 batch_size=params['batch_size'], shuffle=False)
+    if not len(loader):
+        return None
+    x = next(iter(loader))[0].to(device)
+    model.eval()
+    with torch.no_grad():
+        # Первый проход не учитывается: выделение памяти и инициализация ядер
+        model(x)
+        t0 = time.perf_counter()
+        for _ in range(steps):
+            model(x)
+    return (time.perf_counter() - t0) / steps / len(x)
+
+
+def _plan_mc_samples(params: Dict, n_total: int, horizon: int, forward_row: float, seconds: float) -> float:
+    # Прогноз: MC Dropout по всем окнам ряда (каждый сэмпл — прямой проход). mc_samples
+    # уменьшается, чтобы прогноз уложился в seconds; меньше MIN_MC_SAMPLES — MC Dropout отключается.
+    # Возвращает оценку времени прогноза
+    forecast_rows = max(1, n_total - params['seq_length'] - horizon + 1) + 1
+    if params['mc_dropout']:
+        affordable = int(seconds / (forecast_rows * forward_row))
+        if affordable < MIN_MC_SAMPLES:
+            params['mc_dropout'] = False
+        else:
+            params['mc_samples'] = min(int(params['mc_samples']), affordable)
+    return forecast_rows * forward_row * (params['mc_samples'] if params['mc_dropout'] else 1)
+
+
+def _epoch_seconds(splits: List, n_train: int, params: Dict, horizon: int,
+                   train_row: float, forward_row: float) -> float:
+    # Оценка времени одной эпохи всех этапов обучения: фолды кросс-валидации (обучение
+    # и валидация), при parallel_folds — параллельно, плюс переобучение на всей выборке
+    def windows(n):
+        return max(0, n - params['seq_length'] - horizon + 1)
+
+    cv = sum(windows(len(train_idx)) * train_row + windows(len(val_idx)) * forward_row
+             for train_idx, val_idx in splits)
+    full = windows(n_train) * train_row
+    if not params['parallel_folds']:
+        return cv if cv > 0 else full
+    budget = current_thread_budget()
+    workers = params['fold_workers'] or (budget['workers'] if budget else 1)
+    return cv / max(1, min(len(splits), workers)) + full
+
+
+def plan_time_budget(params: Dict, build_fn: Callable, loss_fn: nn.Module, train_data: np.ndarray,
+                     n_total: int, splits: List, horizon: int, device: str,
+                     started: float) -> Dict:
+    """
+    План обучения под бюджет времени задачи (params['time_budget'] или NEURAL_TIME_BUDGET,
+    отсчитывается от started). При auto_plan по замеренному времени шага (measure_step_time)
+      - mc_samples уменьшается так, чтобы прогноз занял не больше FORECAST_SHARE бюджета
+        (если не помещается даже MIN_MC_SAMPLES — MC Dropout отключается);
+      - epochs уменьшается до числа эпох, которое помещается в оставшееся время;
+        если не помещается и одна эпоха, фолдов остаётся два и они обучаются последовательно.
+    В params записывается deadline — момент (time.monotonic), когда обучение останавливается
+    (training_time_exceeded), оставляя время на прогноз; None — без ограничения.
+    Возвращает {'params', 'splits', 'time_budget', 'epoch_seconds', 'forecast_seconds', 'truncated'};
+    truncated — план сократил обучение (эпохи, фолды, параллельные фолды) под бюджет.
+    """
+    time_budget = params.get('time_budget')
+    time_budget = float(NEURAL_TIME_BUDGET if time_budget is None else time_budget)
+    requested = params
+    params = {**params, 'deadline': None}
+    plan = {'params': params, 'splits': splits, 'time_budget': time_budget,
+            'epoch_seconds': None, 'forecast_seconds': None, 'truncated': False}
+    if time_budget <= 0:
+        return plan
+    params['deadline'] = started + time_budget
+    if not params['auto_plan']:
+        return plan
+    step_time = measure_step_time(build_fn, train_data, params, horizon, loss_fn, device)
+    if step_time is None:
+        return plan
+    train_row, forward_row = (max(t, 1e-9) for t in step_time)
+    remaining = started + time_budget - time.monotonic()
+
+    forecast_seconds = _plan_mc_samples(params, n_total, horizon, forward_row, FORECAST_SHARE * remaining)
+
+    epoch_seconds = _epoch_seconds(splits, len(train_data), params, horizon, train_row, forward_row)
+    train_seconds = remaining - forecast_seconds
+    if epoch_seconds > train_seconds:
+        # Даже одна эпоха не помещается в бюджет: два фолда и последовательное обучение,
+        # которое можно остановить посреди эпохи (при parallel_folds модель переобучается
+        # на всей выборке хотя бы одну полную эпоху)
+        params['parallel_folds'] = False
+        if len(splits) > 2:
+            params['n_splits'] = 2
+            splits = list(TimeSeriesSplit(n_splits=2).split(train_data))
+        epoch_seconds = _epoch_seconds(splits, len(train_data), params, horizon, train_row, forward_row)
+    if epoch_seconds > 0:
+        params['epochs'] = max(1, min(int(params['epochs']), int(train_seconds / epoch_seconds)))
+    params['deadline'] = started + time_budget - forecast_seconds
+    plan.update(splits=splits, epoch_seconds=round(epoch_seconds, 4),
+                forecast_seconds=round(forecast_seconds, 4),
+                truncated=any(params[key] != requested[key] for key in ('epochs', 'n_splits', 'parallel_folds')))
+    return plan
+
+
+def plan_forecast_budget(params: Dict, model: nn.Module, data: np.ndarray, n_total: int,
+                         horizon: int, device: str, started: float) -> Dict:
+    """
+    Прогнозная часть плана plan_time_budget для модели из реестра (обучение пропускается):
+    при auto_plan и ненулевом бюджете mc_samples уменьшается по замеренному времени прямого
+    прохода (measure_forward_time) так, чтобы прогноз занял не больше FORECAST_SHARE бюджета;
+    если не помещается даже MIN_MC_SAMPLES — MC Dropout отключается.
+    Возвращает параметры по плану.
+    """
+    time_budget = params.get('time_budget')
+    time_budget = float(NEURAL_TIME_BUDGET if time_budget is None else time_budget)
+    params = {**params, 'deadline': None}
+    if time_budget <= 0 or not params['auto_plan'] or not params['mc_dropout']:
+        return params
+    forward_row = measure_forward_time(model, data, params, horizon, device)
+    if forward_row is None:
+        return params
+    remaining = started + time_budget - time.monotonic()
+    _plan_mc_samples(params, n_total, horizon, max(forward_row, 1e-9), FORECAST_SHARE * remaining)
+    return params
+
+
+# Обучение сокращено бюджетом времени: план уменьшил эпохи или фолды либо обучение
+# остановлено по deadline. Такая модель зависит от загрузки воркера (замеренного времени шага),
+# поэтому не сохраняется в реестр моделей
+def training_truncated(plan: Dict) -> bool:
+    return plan['truncated'] or training_time_exceeded(plan['params'])
+
+
+# Истёк ли бюджет обучения: params['deadline'] — момент (time.monotonic), после которого
+# обучение останавливается (None — без ограничения)
+def training_time_exceeded(params: Dict) -> bool:
+    deadline = params.get('deadline')
+    return deadline is not None and time.monotonic() >= deadline
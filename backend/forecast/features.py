@@ -0,0 +1,316 @@
+import hashlib
+import re
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, List, Optional, Sequence
+
+
+# Календарные признаки, которые строит create_features в нейросетевых модулях
+CALENDAR_COLUMNS = ('month', 'month_sin', 'month_cos', 'week', 'day', 'weekday')
+
+
+def calendar_values(date: pd.Timestamp) -> Dict[str, float]:
+    month = date.month
+    return {
+        'month': month,
+        'month_sin': np.sin(2 * np.pi * month / 12),
+        'month_cos': np.cos(2 * np.pi * month / 12),
+        'week': date.isocalendar()[1],
+        'day': date.day,
+        'weekday': date.weekday(),
+    }
+
+
+def calendar_columns(seasonality: str) -> List[str]:
+    # Тот же выбор календарных признаков по строке сезонности, что и в create_features
+    if 'M' in seasonality:
+        return ['month', 'month_sin', 'month_cos']
+    if 'W' in seasonality:
+        return ['week', 'month', 'month_sin', 'month_cos']
+    if 'D' in seasonality:
+        return ['day', 'weekday']
+    return []
+
+
+def calendar_matrix(dates: pd.DatetimeIndex, columns: Sequence[str]) -> np.ndarray:
+    # Календарные признаки для набора дат сразу (столбцы в порядке columns)
+    out = np.empty((len(dates), len(columns)), dtype=np.float64)
+    for j, name in enumerate(columns):
+        if name == 'month':
+            out[:, j] = dates.month
+        elif name == 'month_sin':
+            out[:, j] = np.sin(2 * np.pi * dates.month / 12)
+        elif name == 'month_cos':
+            out[:, j] = np.cos(2 * np.pi * dates.month / 12)
+        elif name == 'week':
+            out[:, j] = dates.isocalendar().week.to_numpy(dtype=np.float64)
+        elif name == 'day':
+            out[:, j] = dates.day
+        elif name == 'weekday':
+            out[:, j] = dates.weekday
+    return out
+
+
+class FeatureMatrix:
+    """
+    Результат build_feature_matrix: непрерывный массив float32 (строки с NaN удалены),
+    имена столбцов, временной индекс строк и имя целевого столбца.
+    target — цель тех же строк в исходной точности float64: float32 хранит только 24 бита
+    мантиссы, поэтому фактические значения, остатки и интервалы считаются по target,
+    а массив values служит входом моделей.
+    Массивы общие для кэша, поэтому помечены как только для чтения.
+    """
+
+    def __init__(self, values: np.ndarray, columns: List[str], index: pd.DatetimeIndex, target_col: str,
+                 target: Optional[np.ndarray] = None):
+        self.values = values
+        self.columns = columns
+        self.index = index
+        self.target_col = target_col
+        self.target = target
+
+    def column_indices(self, names: Sequence[str]) -> List[int]:
+        return [self.columns.index(name) for name in names]
+
+    def to_frame(self) -> pd.DataFrame:
+        # Признаки — float32, целевой столбец — float64 (target)
+        frame = pd.DataFrame(self.values, index=self.index, columns=self.columns)
+        if self.target is not None:
+            frame[self.target_col] = self.target
+        return frame
+
+
+# Небольшой LRU-кэш матриц признаков внутри процесса: ключ — хэш данных и параметров
+_FEATURE_CACHE: 'OrderedDict[str, FeatureMatrix]' = OrderedDict()
+FEATURE_CACHE_SIZE = 8
+
+
+def _rolling_sums(values: np.ndarray, window: int):
+    # Скользящие сумма и сумма квадратов через кумулятивные суммы (за один проход).
+    # Значения центрируются, чтобы уменьшить потерю точности в дисперсии;
+    # окна, содержащие пропуски, дают NaN, как rolling в pandas.
+    missing = np.isnan(values)
+    center = float(values[~missing].mean()) if (~missing).any() else 0.0
+    centered = np.where(missing, 0.0, values - center)
+    csum = np.concatenate(([0.0], np.cumsum(centered)))
+    csq = np.concatenate(([0.0], np.cumsum(centered ** 2)))
+    cmiss = np.concatenate(([0], np.cumsum(missing)))
+    sums = np.full(len(values), np.nan)
+    sumsq = np.full(len(values), np.nan)
+    if len(values) >= window:
+        sums[window - 1:] = csum[window:] - csum[:-window]
+        sumsq[window - 1:] = csq[window:] - csq[:-window]
+        has_missing = (cmiss[window:] - cmiss[:-window]) > 0
+        sums[window - 1:][has_missing] = np.nan
+        sumsq[window - 1:][has_missing] = np.nan
+    return sums, sumsq, center
+
+
+def build_feature_matrix(df: pd.DataFrame, dt_col: str, target_col: str, lag_periods: int,
+                         seasonality: str = '', window_sizes: Optional[Sequence[int]] = None,
+                         include_exog: bool = True, use_cache: bool = True,
+                         lagged_stats: bool = False) -> FeatureMatrix:
+    """
+    Векторизованное построение признаков, общее для всех моделей.
+    Столбцы и строки совпадают с прежним create_features: цель, числовые экзогенные столбцы,
+    lag_1..lag_N (через sliding_window_view), rolling_mean_w/rolling_std_w (через кумулятивные
+    суммы), diff_1 и календарные признаки; строки с пропусками удаляются.
+    Весь результат заполняется в одном заранее выделенном массиве float32; цель дополнительно
+    хранится в float64 (FeatureMatrix.target).
+    lagged_stats — скользящие статистики и diff_1 сдвигаются на шаг назад (считаются по значениям
+    до t-1 включительно), чтобы строку t можно было использовать для прогноза цели t (деревья).
+    """
+    window_sizes = [int(w) for w in window_sizes] if window_sizes else []
+    dates = pd.DatetimeIndex(pd.to_datetime(df[dt_col]))
+    y = df[target_col].to_numpy(dtype=np.float64, copy=True)
+    exog_cols = []
+    if include_exog:
+        exog_cols = [c for c in df.columns
+                     if c not in (dt_col, target_col) and pd.api.types.is_numeric_dtype(df[c])]
+    exog = df[exog_cols].to_numpy(dtype=np.float64) if exog_cols else np.empty((len(df), 0))
+
+    cache_key = None
+    if use_cache:
+        digest = hashlib.sha1()
+        for arr in (dates.asi8, y, exog):
+            digest.update(np.ascontiguousarray(arr).tobytes())
+        digest.update(repr((target_col, exog_cols, lag_periods, seasonality, window_sizes,
+                            lagged_stats)).encode())
+        cache_key = digest.hexdigest()
+        if cache_key in _FEATURE_CACHE:
+            _FEATURE_CACHE.move_to_end(cache_key)
+            return _FEATURE_CACHE[cache_key]
+
+    columns = [target_col] + exog_cols + [f'lag_{i}' for i in range(1, lag_periods + 1)]
+    for window in window_sizes:
+        columns += [f'rolling_mean_{window}', f'rolling_std_{window}']
+    if window_sizes:
+        columns.append('diff_1')
+    calendar = calendar_columns(seasonality)
+    columns += calendar
+
+    n = len(y)
+    out = np.empty((n, len(columns)), dtype=np.float32)
+    out[:, 0] = y
+    col = 1
+    if exog_cols:
+        out[:, col:col + len(exog_cols)] = exog
+        col += len(exog_cols)
+    if lag_periods > 0:
+        padded = np.concatenate((np.full(lag_periods, np.nan), y))
+        # windows[t, j] = y[t - lag_periods + j]; lag_i — столбец lag_periods - i
+        windows = sliding_window_view(padded, lag_periods + 1)[:n]
+        out[:, col:col + lag_periods] = windows[:, lag_periods - 1::-1]
+        col += lag_periods
+    # Ряд, по которому считаются статистики: при lagged_stats — сдвинутый на шаг назад
+    stats_y = np.concatenate(([np.nan], y[:-1])) if lagged_stats else y
+    for window in window_sizes:
+        sums, sumsq, center = _rolling_sums(stats_y, window)
+        out[:, col] = sums / window + center
+        if window > 1:
+            var = (sumsq - sums ** 2 / window) / (window - 1)
+            out[:, col + 1] = np.sqrt(np.maximum(var, 0.0))
+        else:
+            out[:, col + 1] = np.nan
+        col += 2
+    if window_sizes:
+        out[0, col] = np.nan
+        out[1:, col] = np.diff(stats_y)
+        col += 1
+    if calendar:
+        out[:, col:col + len(calendar)] = calendar_matrix(dates, calendar)
+        col += len(calendar)
+
+    valid = ~np.isnan(out).any(axis=1)
+    if valid.all():
+        values, index, target = out, dates, y
+    else:
+        # Пропуски от лагов и окон — только в начале; тогда берётся срез без копирования
+        start = int(np.argmax(valid)) if valid.any() else n
+        if valid[start:].all():
+            values, index, target = out[start:], dates[start:], y[start:]
+        else:
+            values, index, target = np.ascontiguousarray(out[valid]), dates[valid], y[valid]
+    values.flags.writeable = False
+    target.flags.writeable = False
+    index = index.rename(dt_col)
+
+    matrix = FeatureMatrix(values, columns, index, target_col, target)
+    if cache_key is not None:
+        _FEATURE_CACHE[cache_key] = matrix
+        while len(_FEATURE_CACHE) > FEATURE_CACHE_SIZE:
+            _FEATURE_CACHE.popitem(last=False)
+    return matrix
+
+
+def create_features(df: pd.DataFrame, dt_col: str, target_col: str,
+                    lag_periods: int, seasonality: str, window_sizes: List[int] = None) -> pd.DataFrame:
+    """
+    Признаки нейросетевых моделей в виде DataFrame с временным индексом
+    (обёртка над build_feature_matrix с прежней сигнатурой).
+    """
+    return build_feature_matrix(df, dt_col, target_col, lag_periods, seasonality, window_sizes).to_frame()
+
+
+class RecursiveFeatureUpdater:
+    """
+    Инкрементальный пересчёт признаков для рекурсивного прогноза.
+    По имени столбца определяется его смысл (цель, lag_i, rolling_mean_w, rolling_std_w,
+    diff_1, календарные признаки); остальные столбцы (экзогенные) удерживаются
+    на последнем известном значении. Последние значения цели хранятся в кольцевом буфере
+    фиксированного размера, суммы и суммы квадратов скользящих окон обновляются
+    за O(1) на шаг, поэтому DataFrame на каждом шаге не перестраивается.
+    """
+
+    def __init__(self, columns: Sequence[str], target_col: str, history: np.ndarray,
+                 last_row: np.ndarray, scaler=None):
+        self.columns = list(columns)
+        self.target_index = self.columns.index(target_col)
+        self.scaler = scaler
+        self.template = np.asarray(last_row, dtype=np.float64).copy()
+
+        self.lags = {}
+        self.windows = set()
+        self.mean_cols, self.std_cols = {}, {}
+        self.diff_col = None
+        self.calendar_cols = {}
+        for i, col in enumerate(self.columns):
+            if re.fullmatch(r'lag_\d+', col):
+                self.lags[i] = int(col.split('_')[1])
+            elif re.fullmatch(r'rolling_mean_\d+', col):
+                self.mean_cols[i] = int(col.rsplit('_', 1)[1])
+                self.windows.add(self.mean_cols[i])
+            elif re.fullmatch(r'rolling_std_\d+', col):
+                self.std_cols[i] = int(col.rsplit('_', 1)[1])
+                self.windows.add(self.std_cols[i])
+            elif col == 'diff_1':
+                self.diff_col = i
+            elif col in CALENDAR_COLUMNS:
+                self.calendar_cols[i] = col
+
+        # Буфер хранит значение текущего шага и все значения, нужные лагам и окнам
+        self.size = max([1] + list(self.lags.values()) + list(self.windows)) + 1
+        self.buffer = np.zeros(self.size)
+        history = np.asarray(history, dtype=np.float64)[-self.size:]
+        self.count = len(history)
+        self.buffer[:self.count] = history
+        self.pos = self.count % self.size
+
+        self.sums, self.sumsq = {}, {}
+        for w in self.windows:
+            tail = history[-w:]
+            self.sums[w] = float(tail.sum())
+            self.sumsq[w] = float((tail ** 2).sum())
+
+    @classmethod
+    def from_frame(cls, feature_df: pd.DataFrame, target_col: str, history: np.ndarray,
+                   scaler=None) -> 'RecursiveFeatureUpdater':
+        """
+        Создаёт обновлятель по DataFrame признаков (последняя строка задаёт экзогенные значения)
+        и исходной истории цели (она длиннее feature_df, из которого удалены строки с NaN).
+        """
+        return cls(feature_df.columns, target_col, history,
+                   feature_df.iloc[-1].to_numpy(dtype=np.float64), scaler)
+
+    def _value(self, steps_back: int) -> float:
+        # Значение цели steps_back шагов назад относительно последнего добавленного
+        return self.buffer[(self.pos - 1 - steps_back) % self.size]
+
+    def step(self, value: float, date: pd.Timestamp, scaled: bool = True) -> np.ndarray:
+        """
+        Добавляет значение цели следующего шага с датой date и возвращает строку признаков
+        для этого шага (масштабированную scaler'ом, если он задан и scaled=True).
+        """
+        for w in self.windows:
+            leaving = self._value(w - 1) if self.count >= w else 0.0
+            self.sums[w] += value - leaving
+            self.sumsq[w] += value * value - leaving * leaving
+        prev = self._value(0)
+        self.buffer[self.pos] = value
+        self.pos = (self.pos + 1) % self.size
+        self.count += 1
+
+        row = self.template.copy()
+        row[self.target_index] = value
+        for i, lag in self.lags.items():
+            row[i] = self._value(lag)
+        for i, w in self.mean_cols.items():
+            row[i] = self.sums[w] / w
+        for i, w in self.std_cols.items():
+            if w > 1:
+                var = (self.sumsq[w] - self.sums[w] ** 2 / w) / (w - 1)
+                row[i] = np.sqrt(max(var, 0.0))
+            else:
+                row[i] = 0.0
+        if self.diff_col is not None:
+            row[self.diff_col] = value - prev
+        if self.calendar_cols:
+            calendar = calendar_values(pd.Timestamp(date))
+            for i, col in self.calendar_cols.items():
+                row[i] = calendar[col]
+
+        if scaled and self.scaler is not None:
+            row = row * self.scaler.scale_ + self.scaler.min_
+        return row
@@ -0,0 +1,576 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from torch.cuda.amp import autocast, GradScaler
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from forecast.resources import current_thread_budget
+from forecast.cancellation import check_cancelled
+from forecast.features import RecursiveFeatureUpdater
+from forecast.progress import progress_skip, progress_stage, progress_step
+from forecast.compute_plan import (plan_forecast_budget, plan_time_budget, training_time_exceeded,
+                                   training_truncated)
+
+
+# Квантили для доверительного интервала по уровню доверия (в процентах)
+def confidence_quantiles(confidence_level: float) -> Tuple[float, float]:
+    alpha = (1 - confidence_level / 100.0) / 2
+    return alpha, 1 - alpha
+
+
+# Векторизованный MC Dropout: все сэмплы считаются одним (или несколькими) большими батчами.
+# Батч x повторяется n_samples раз, так что каждая строка получает свою dropout-маску.
+# max_rows ограничивает число строк в одном прямом проходе (бюджет по памяти).
+# Возвращает среднее [batch, horizon] и квантили [len(quantiles), batch, horizon].
+def mc_dropout_predict(model: nn.Module, x: torch.Tensor, n_samples: int,
+                       max_rows: int = 8192,
+                       quantiles: Sequence[float] = (0.025, 0.975)) -> Tuple[np.ndarray, np.ndarray]:
+    batch = x.size(0)
+    samples_per_chunk = max(1, min(n_samples, max_rows // max(batch, 1)))
+    chunks = []
+    done = 0
+    while done < n_samples:
+        check_cancelled()
+        k = min(samples_per_chunk, n_samples - done)
+        out = model(x.repeat(k, *([1] * (x.dim() - 1))))
+        chunks.append(out.float().view(k, batch, -1))
+        done += k
+    samples = torch.cat(chunks, dim=0)
+    mean = samples.mean(dim=0)
+    q = torch.quantile(samples, torch.tensor(quantiles, dtype=samples.dtype, device=samples.device), dim=0)
+    return mean.cpu().numpy(), q.cpu().numpy()
+
+
+# Функция для включения MC Dropout: перевод dropout-слоёв в режим train, остальные слои — в eval.
+# Слои трансформера переводятся в train целиком: в режиме eval они идут по быстрому пути
+# без dropout; у рекуррентных слоёв в train включается dropout между слоями (num_layers > 1).
+# Нормализация в этих слоях — LayerNorm, от режима она не зависит
+def enable_mc_dropout(model: nn.Module):
+    model.eval()
+    for m in model.modules():
+        if isinstance(m, (nn.Dropout, nn.TransformerEncoderLayer, nn.TransformerDecoderLayer)):
+            m.train()
+        elif isinstance(m, nn.RNNBase) and m.dropout > 0:
+            m.train()
+
+
+# Механизм ранней остановки
+class EarlyStopping:
+    def __init__(self, patience=5, delta=0):
+        self.patience = patience
+        self.delta = delta
+        self.counter = 0
+        self.best_score = None
+        self.early_stop = False
+
+    def __call__(self, current_loss: float):
+        if self.best_score is None:
+            self.best_score = current_loss
+        elif current_loss > self.best_score + self.delta:
+            self.counter += 1
+            if self.counter >= self.patience:
+                self.early_stop = True
+        else:
+            self.best_score = current_loss
+            self.counter = 0
+
+
+# Копия состояния модели (лучший checkpoint): state_dict() возвращает ссылки на тензоры
+# параметров, которые меняются при дальнейшем обучении
+def snapshot_state(model: nn.Module) -> dict:
+    return {k: v.detach().clone() for k, v in model.state_dict().items()}
+
+
+# Загрузчик скользящих окон без поэлементных аллокаций.
+# Массив переводится в тензор один раз, окна — представление unfold над ним,
+# поэтому батч без перемешивания — это срез представления, а с перемешиванием —
+# одна выборка по индексам на весь батч. Заменяет DataLoader(TimeSeriesDataset(...)).
+class SlidingWindowLoader:
+    def __init__(self, data: np.ndarray, seq_length: int, horizon: int,
+                 batch_size: int, shuffle: bool = False):
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        tensor = torch.as_tensor(np.ascontiguousarray(data, dtype=np.float32))
+        self.n_windows = max(0, len(tensor) - seq_length - horizon + 1)
+        if self.n_windows > 0:
+            # x: [n_windows, seq_length, features], y: [n_windows, horizon]
+            self.x = tensor.unfold(0, seq_length, 1).transpose(1, 2)[:self.n_windows]
+            self.y = tensor[:, 0].unfold(0, horizon, 1)[seq_length:seq_length + self.n_windows]
+        else:
+            self.x = tensor.new_empty((0, seq_length, tensor.shape[1]))
+            self.y = tensor.new_empty((0, horizon))
+
+    def __len__(self):
+        return (self.n_windows + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        if self.shuffle:
+            order = torch.randperm(self.n_windows)
+            for start in range(0, self.n_windows, self.batch_size):
+                idx = order[start:start + self.batch_size]
+                yield self.x[idx], self.y[idx]
+        else:
+            for start in range(0, self.n_windows, self.batch_size):
+                yield self.x[start:start + self.batch_size], self.y[start:start + self.batch_size]
+
+
+# Параллельное обучение фолдов кросс-валидации.
+# Для каждого фолда build_fn создаёт свежую модель/оптимизатор/планировщик/раннюю остановку
+# (последовательно в основном потоке, чтобы инициализация была детерминированной),
+# затем fold_fn(fold, split, components) обучает фолды в пуле потоков и возвращает
+# список статистик. Используются потоки, а не процессы: torch отпускает GIL в вычислениях,
+# а daemon-процессам prefork-пула Celery запрещено порождать дочерние процессы.
+# Внутрипроцессные потоки torch делятся поровну между фолдами.
+def train_folds_parallel(fold_fn: Callable, build_fn: Callable, splits: list,
+                         max_workers: Optional[int] = None) -> List[dict]:
+    if not splits:
+        return []
+    budget = current_thread_budget()
+    cpu_count = budget['workers'] if budget else os.cpu_count() or 1
+    n_workers = max(1, min(len(splits), max_workers or cpu_count))
+    runs = [(fold, split, build_fn()) for fold, split in enumerate(splits)]
+    # Каждый фолд выполняется в своей копии контекста задачи (бюджет потоков, отчёт о прогрессе)
+    contexts = [contextvars.copy_context() for _ in runs]
+    prev_threads = torch.get_num_threads()
+    torch.set_num_threads(max(1, prev_threads // n_workers))
+    try:
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(lambda ctx, run: ctx.run(fold_fn, *run), contexts, runs))
+    finally:
+        torch.set_num_threads(prev_threads)
+    return [item for stats in results for item in stats]
+
+
+# Планировщик скорости обучения и ранняя остановка для собранных модели и оптимизатора.
+# build_fn моделей возвращает training_components(model, optimizer, params)
+def training_components(model: nn.Module, optimizer, params: Dict):
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingWarmRestarts(optimizer, T_0=10, T_mult=2)
+    early_stopping = EarlyStopping(patience=params['patience'], delta=params['delta'])
+    return model, optimizer, scheduler, early_stopping
+
+
+# Шаг оптимизации по батчу (со смешанной точностью, если задан amp_scaler); возвращает потери
+def _train_step(model, x, y, loss_fn, optimizer, amp_scaler) -> float:
+    optimizer.zero_grad()
+    with autocast(enabled=(amp_scaler is not None)):
+        output = model(x)
+        loss = loss_fn(output, y)
+    if amp_scaler:
+        amp_scaler.scale(loss).backward()
+        torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+        amp_scaler.step(optimizer)
+        amp_scaler.update()
+    else:
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+        optimizer.step()
+    return loss.item()
+
+
+# Функция обучения модели с кросс-валидацией: фолды splits обучаются последовательно на одной
+# модели, лучшее по валидации состояние запоминается. Ранняя остановка завершает и оставшиеся фолды;
+# по исчерпании бюджета времени (params['deadline']) оставшиеся фолды пропускаются.
+# Возвращает (обучен ли хоть один фолд, лучшее состояние модели)
+def train_model(model, train_data, params, horizon, device, loss_fn, optimizer, scheduler, amp_scaler, early_stopping, splits,
+                fold_stats: Optional[List[dict]] = None, first_fold: int = 0):
+    best_val_loss = np.inf
+    best_model_state = None
+    trained = False
+
+    for fold, (train_idx, val_idx) in enumerate(splits, start=first_fold):
+        if trained and training_time_exceeded(params):
+            # Бюджет времени исчерпан: оставшиеся фолды не обучаются
+            progress_skip(params['epochs'])
+            continue
+        train_fold = train_data[train_idx]
+        val_fold = train_data[val_idx]
+        if (len(train_fold) - params['seq_length'] - horizon + 1 <= 0
+                or len(val_fold) - params['seq_length'] - horizon + 1 <= 0):
+            progress_skip(params['epochs'])
+            continue
+
+        train_loader = SlidingWindowLoader(
+            train_fold, params['seq_length'], horizon,
+            batch_size=params['batch_size'],
+            shuffle=False
+        )
+        val_loader = SlidingWindowLoader(
+            val_fold, params['seq_length'], horizon,
+            batch_size=params['batch_size'],
+            shuffle=False
+        )
+        trained = True
+
+        fold_best_loss, fold_best_epoch = np.inf, 0
+        for epoch in range(params['epochs']):
+            model.train()
+            epoch_train_loss = 0.0
+            for x, y in train_loader:
+                check_cancelled()
+                if training_time_exceeded(params):
+                    break
+                x, y = x.to(device), y.to(device)
+                epoch_train_loss += _train_step(model, x, y, loss_fn, optimizer, amp_scaler)
+
+            model.eval()
+            epoch_val_loss = 0.0
+            with torch.no_grad():
+                for x, y in val_loader:
+                    x, y = x.to(device), y.to(device)
+                    with autocast(enabled=(amp_scaler is not None)):
+                        output = model(x)
+                        loss = loss_fn(output, y)
+                    epoch_val_loss += loss.item()
+            avg_val_loss = epoch_val_loss / len(val_loader)
+            progress_step(fold=fold + 1, epoch=epoch + 1,
+                          train_loss=epoch_train_loss / len(train_loader), val_loss=avg_val_loss)
+            if avg_val_loss < fold_best_loss:
+                fold_best_loss, fold_best_epoch = avg_val_loss, epoch
+            if avg_val_loss < best_val_loss:
+                best_val_loss = avg_val_loss
+                best_model_state = snapshot_state(model)
+            scheduler.step()
+            early_stopping(avg_val_loss)
+            if early_stopping.early_stop or training_time_exceeded(params):
+                progress_skip(params['epochs'] - epoch - 1)
+                break
+        if fold_stats is not None:
+            fold_stats.append({'fold': fold, 'best_val_loss': fold_best_loss, 'best_epoch': fold_best_epoch})
+        if early_stopping.early_stop:
+            progress_skip((len(splits) - (fold - first_fold) - 1) * params['epochs'])
+            break
+
+    return trained, best_model_state
+
+
+# Функция обучения модели на всей обучающей выборке (переобучение после параллельных фолдов
+# или fallback, если ни один фолд не обучен). Возвращает лучшее по ошибке обучения состояние
+def train_full_model(model, train_data, params, horizon, device, loss_fn, optimizer, scheduler, amp_scaler, early_stopping):
+    best_train_loss = np.inf
+    best_model_state = None
+    train_loader = SlidingWindowLoader(
+        train_data, params['seq_length'], horizon,
+        batch_size=params['batch_size'],
+        shuffle=True
+    )
+    for epoch in range(params['epochs']):
+        model.train()
+        epoch_train_loss = 0.0
+        for x, y in train_loader:
+            check_cancelled()
+            if epoch and training_time_exceeded(params):
+                break
+            x, y = x.to(device), y.to(device)
+            epoch_train_loss += _train_step(model, x, y, loss_fn, optimizer, amp_scaler)
+        avg_train_loss = epoch_train_loss / len(train_loader)
+        progress_step(epoch=epoch + 1, train_loss=avg_train_loss)
+        if avg_train_loss < best_train_loss:
+            best_train_loss = avg_train_loss
+            best_model_state = snapshot_state(model)
+        scheduler.step()
+        early_stopping(avg_train_loss)
+        if early_stopping.early_stop or training_time_exceeded(params):
+            progress_skip(params['epochs'] - epoch - 1)
+            break
+    return best_model_state
+
+
+def fit_neural_model(build_fn: Callable, loss_fn: nn.Module, train_data: np.ndarray, n_total: int,
+                     splits: list, params: Dict, horizon: int, device: str, started: float,
+                     scaler=None, artifacts: Optional[Dict] = None) -> Tuple[nn.Module, Dict]:
+    """
+    Обучение нейросетевой модели. build_fn() собирает свежие модель, оптимизатор, планировщик
+    и раннюю остановку (training_components).
+      - План под бюджет времени (plan_time_budget): эпохи, фолды и MC-сэмплы по замеренному
+        времени шага; по исчерпании бюджета обучение останавливается с лучшим состоянием.
+      - parallel_folds: фолды обучаются параллельно со свежей инициализацией, затем модель
+        переобучается на всей обучающей выборке с медианным лучшим числом эпох;
+        иначе фолды обучаются последовательно на одной модели (train_model),
+        а если ни один фолд не обучен — на всей выборке.
+    В artifacts['model'] сохраняются веса, scaler и truncated — обучение сокращено бюджетом
+    (такая модель не сохраняется в реестр).
+    Возвращает (модель с лучшим состоянием, параметры по плану).
+    """
+    model, optimizer, scheduler, early_stopping = build_fn()
+    amp_scaler = GradScaler() if device == 'cuda' else None
+
+    plan = plan_time_budget(params, build_fn, loss_fn, train_data, n_total, splits, horizon, device, started)
+    params = plan['params']
+    splits = plan['splits']
+    print(f"План обучения: бюджет {plan['time_budget']} с, эпох {params['epochs']}, "
+          f"фолдов {len(splits)}, батч {params['batch_size']}, "
+          f"MC-сэмплов {params['mc_samples'] if params['mc_dropout'] else 0}")
+
+    if params['parallel_folds']:
+        def run_fold(fold, split, components):
+            fold_model, fold_optimizer, fold_scheduler, fold_early_stopping = components
+            fold_amp_scaler = GradScaler() if device == 'cuda' else None
+            stats = []
+            train_model(fold_model, train_data, params, horizon, device, loss_fn, fold_optimizer,
+                        fold_scheduler, fold_amp_scaler, fold_early_stopping, [split], stats,
+                        first_fold=fold)
+            return stats
+
+        progress_stage('cv', len(splits) * params['epochs'], n_folds=len(splits), epochs=params['epochs'])
+        fold_stats = train_folds_parallel(run_fold, build_fn, splits, params['fold_workers'])
+        retrain_params = params
+        if fold_stats:
+            cv_score = float(np.mean([item['best_val_loss'] for item in fold_stats]))
+            print(f"Средняя ошибка на валидации по {len(fold_stats)} фолдам: {cv_score:.6f}")
+            best_epochs = int(np.median([item['best_epoch'] for item in fold_stats])) + 1
+            retrain_params = {**params, 'epochs': best_epochs}
+        progress_stage('full', retrain_params['epochs'], epochs=retrain_params['epochs'])
+        best_model_state = train_full_model(
+            model, train_data, retrain_params, horizon, device, loss_fn, optimizer, scheduler, amp_scaler, early_stopping
+        )
+    else:
+        progress_stage('cv', len(splits) * params['epochs'], n_folds=len(splits), epochs=params['epochs'])
+        trained, best_model_state = train_model(
+            model, train_data, params, horizon, device, loss_fn, optimizer, scheduler, amp_scaler, early_stopping, splits
+        )
+        if not trained:
+            progress_stage('full', params['epochs'], epochs=params['epochs'])
+            best_model_state = train_full_model(
+                model, train_data, params, horizon, device, loss_fn, optimizer, scheduler, amp_scaler, early_stopping
+            )
+
+    if best_model_state is not None:
+        model.load_state_dict(best_model_state)
+    if artifacts is not None:
+        artifacts['model'] = {
+            'state_dict': {k: v.detach().cpu().clone() for k, v in model.state_dict().items()},
+            'scaler': scaler,
+            'truncated': training_truncated(plan)
+        }
+    return model, params
+
+
+# Прямой многошаговый прогноз: выходной слой модели уже выдаёт horizon значений,
+# поэтому весь горизонт получается одним прямым проходом по последнему окну.
+# При mc_dropout используется векторизованный MC Dropout (среднее и квантили),
+# иначе — один детерминированный проход. Значения возвращаются в исходном масштабе.
+def restore_neural_model(build_fn: Callable, fitted: Dict, train_data: np.ndarray, n_total: int,
+                         params: Dict, horizon: int, device: str, started: float) -> Tuple[nn.Module, Dict]:
+    """
+    Модель из реестра: веса fitted['state_dict'] загружаются в модель build_fn(), обучение
+    пропускается. Число MC-сэмплов подбирается под бюджет времени так же, как после обучения
+    (plan_forecast_budget). Возвращает (модель, параметры по плану).
+    """
+    model = build_fn()[0]
+    model.load_state_dict(fitted['state_dict'])
+    params = plan_forecast_budget(params, model, train_data, n_total, horizon, device, started)
+    print(f"Модель из реестра: MC-сэмплов {params['mc_samples'] if params['mc_dropout'] else 0}")
+    return model, params
+
+
+def direct_forecast(model: nn.Module, scaled_data: np.ndarray, params: dict, scaler, device: str,
+                    quantiles: Sequence[float] = (0.025, 0.975)) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    x = torch.as_tensor(np.ascontiguousarray(scaled_data[-params['seq_length']:], dtype=np.float32))
+    x = x.unsqueeze(0).to(device)
+    with torch.no_grad():
+        if params['mc_dropout']:
+            mean, q = mc_dropout_predict(model, x, params['mc_samples'], params['mc_max_rows'], quantiles)
+            mean, lower, upper = mean[0], q[0, 0], q[1, 0]
+        else:
+            model.eval()
+            mean = model(x).float().cpu().numpy()[0]
+            lower = upper = mean
+    data_min, data_max = scaler.data_min_[0], scaler.data_max_[0]
+    return tuple(v * (data_max - data_min) + data_min for v in (mean, lower, upper))
+
+
+# Агрегация исторического прогноза по перекрывающимся окнам.
+# Прогноз окна i на шаге h относится к моменту seq_length + i + h; для каждого момента
+# считаются сумма, сумма квадратов и число прогнозов. Моменты шага h образуют непрерывный
+# отрезок, поэтому накопление — это horizon векторных сложений срезов вместо N*H кортежей
+# и groupby. Возвращает среднее (y_forecast) и разброс между окнами (y_spread, СКО)
+# в исходном масштабе только для моментов, на которые есть хотя бы один прогноз.
+def aggregate_historical_forecast(index: pd.Index, all_forecasts: np.ndarray, seq_length: int,
+                                  scaler, target: int = 0) -> pd.DataFrame:
+    n = len(index)
+    sums = np.zeros(n)
+    sumsq = np.zeros(n)
+    counts = np.zeros(n, dtype=np.int64)
+    forecasts = np.asarray(all_forecasts, dtype=np.float64)
+    if forecasts.ndim == 2 and forecasts.size:
+        data_min, data_max = scaler.data_min_[target], scaler.data_max_[target]
+        values = forecasts * (data_max - data_min) + data_min
+        # Центрирование снижает потерю точности в сумме квадратов
+        center = np.nanmean(values) if np.isfinite(values).any() else 0.0
+        values -= center
+        n_windows = values.shape[0]
+        for h in range(values.shape[1]):
+            start = seq_length + h
+            stop = min(start + n_windows, n)
+            if stop <= start:
+                break
+            column = values[:stop - start, h]
+            sums[start:stop] += column
+            sumsq[start:stop] += column * column
+            counts[start:stop] += 1
+    else:
+        center = 0.0
+    observed = counts > 0
+    counts = counts[observed]
+    mean = sums[observed] / counts
+    spread = np.sqrt(np.maximum(sumsq[observed] / counts - mean * mean, 0.0))
+    return pd.DataFrame({
+        'ds': index[observed],
+        'y_forecast': mean + center,
+        'y_spread': spread
+    })
+
+
+# Функция прогнозирования батчами (по всем окнам загрузчика): при mc_dropout — векторизованный
+# MC Dropout, среднее и нижняя/верхняя квантили по сэмплам, иначе — детерминированный проход
+def make_forecast(model: nn.Module, data_loader: SlidingWindowLoader, params: Dict,
+                  device: str, quantiles: Sequence[float] = (0.025, 0.975)) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if params['mc_dropout']:
+        enable_mc_dropout(model)
+    else:
+        model.eval()
+    forecasts, lower, upper = [], [], []
+    with torch.no_grad():
+        for x, _ in data_loader:
+            check_cancelled()
+            x = x.to(device)
+            if params['mc_dropout']:
+                mean, q = mc_dropout_predict(model, x, params['mc_samples'], params['mc_max_rows'], quantiles)
+                forecasts.append(mean)
+                lower.append(q[0])
+                upper.append(q[1])
+            else:
+                pred = model(x).cpu().numpy()
+                forecasts.append(pred)
+                lower.append(pred)
+                upper.append(pred)
+    if not forecasts:
+        return np.array([]), np.array([]), np.array([])
+    return np.concatenate(forecasts, axis=0), np.concatenate(lower, axis=0), np.concatenate(upper, axis=0)
+
+
+# Функция итеративного прогнозирования будущих значений.
+# Признаки очередного шага (лаги, скользящие статистики, разность, календарь) пересчитываются
+# инкрементально через RecursiveFeatureUpdater, окно модели сдвигается на месте.
+def iterative_forecast(model: nn.Module, scaled_data: np.ndarray, params: Dict, scaler, horizon: int,
+                       device: str, updater, future_dates: pd.DatetimeIndex) -> List[float]:
+    current_seq = np.array(scaled_data[-params['seq_length']:], dtype=np.float32)
+    target = updater.target_index
+    data_min, data_max = scaler.data_min_[target], scaler.data_max_[target]
+    future_forecasts = []
+    for i in range(horizon):
+        try:
+            x = torch.from_numpy(current_seq).unsqueeze(0).to(device)
+            with torch.no_grad(), autocast(enabled=(device == 'cuda')):
+                pred = model(x).float().cpu().numpy()[0]
+            forecast_value = pred[0] * (data_max - data_min) + data_min
+            future_forecasts.append(forecast_value)
+            current_seq[:-1] = current_seq[1:]
+            current_seq[-1] = updater.step(forecast_value, future_dates[i])
+        except Exception as e:
+            print(f"Ошибка при прогнозировании шага {i}: {e}")
+            future_forecasts.extend([future_forecasts[-1] if future_forecasts else 0.0] * (horizon - i))
+            break
+    return future_forecasts
+
+
+def forecast_frames(model: nn.Module, df: pd.DataFrame, feature_df: pd.DataFrame, scaled_data: np.ndarray,
+                    scaler, params: Dict, horizon: int, test_size: int, dt_name: str, y_name: str,
+                    freq: str, confidence_level: float, device: str) -> Tuple[pd.DataFrame, ...]:
+    """
+    Прогноз обученной модели в формате результатов:
+      - исторический прогноз — среднее перекрывающихся окон (aggregate_historical_forecast);
+      - интервалы — по разбросу остатков (±1.96 СКО) или, при mc_dropout и mc_intervals,
+        по квантилям MC Dropout уровня confidence_level;
+      - прогноз на horizon шагов — прямой (direct_forecast) или рекурсивный
+        (forecast_strategy == 'recursive', iterative_forecast).
+    Бесконечности и NaN заменяются нулями.
+    Возвращает (forecast_all, forecast_train, forecast_test, forecast_horizon).
+    """
+    progress_stage('forecast')
+    quantiles = confidence_quantiles(confidence_level)
+    full_loader = SlidingWindowLoader(scaled_data, params['seq_length'], horizon,
+                                      batch_size=params['batch_size'], shuffle=False)
+    all_forecasts, mc_lower, mc_upper = make_forecast(model, full_loader, params, device, quantiles)
+    print("Размер all_forecasts:", all_forecasts.shape)
+
+    # Исторический прогноз. Разброс между окнами (y_spread) в результат не входит:
+    # формат forecast_all общий для всех моделей
+    forecast_df = aggregate_historical_forecast(feature_df.index, all_forecasts, params['seq_length'], scaler)
+    forecast_all = pd.merge(
+        feature_df[[y_name]].reset_index().rename(columns={dt_name: 'ds', y_name: 'y_fact'}),
+        forecast_df[['ds', 'y_forecast']],
+        on='ds',
+        how='left'
+    )
+
+    residuals = forecast_all['y_fact'] - forecast_all['y_forecast']
+    std_val = residuals.std() if residuals.std() > 0 else 1e-5
+    z_score = 1.96  # для доверительного интервала ~95%
+    forecast_all['yhat_lower'] = forecast_all['y_forecast'] - z_score * std_val
+    forecast_all['yhat_upper'] = forecast_all['y_forecast'] + z_score * std_val
+    use_mc_intervals = params['mc_dropout'] and params['mc_intervals']
+    if use_mc_intervals:
+        # Интервалы по квантилям MC Dropout вместо разброса остатков
+        for col, bound in (('yhat_lower', mc_lower), ('yhat_upper', mc_upper)):
+            bound_df = aggregate_historical_forecast(feature_df.index, bound, params['seq_length'], scaler)
+            forecast_all[col] = forecast_all['ds'].map(bound_df.set_index('ds')['y_forecast'])
+
+    split_idx = len(forecast_all) - test_size
+    forecast_train = forecast_all.iloc[:split_idx]
+    forecast_test = forecast_all.iloc[split_idx:]
+
+    future_dates = pd.date_range(
+        start=forecast_all['ds'].max(),
+        periods=horizon + 1,
+        freq=freq
+    )[1:]
+
+    # Прогноз будущих значений: прямой (весь горизонт одним проходом) или рекурсивный
+    future_lower = future_upper = None
+    if params['forecast_strategy'] == 'recursive':
+        updater = RecursiveFeatureUpdater.from_frame(feature_df, y_name, df[y_name].to_numpy(dtype=float), scaler)
+        future_forecasts = iterative_forecast(model, scaled_data, params, scaler, horizon, device,
+                                              updater, future_dates)
+    else:
+        future_forecasts, future_lower, future_upper = direct_forecast(
+            model, scaled_data, params, scaler, device, quantiles
+        )
+    forecast_horizon = pd.DataFrame({
+        'ds': future_dates,
+        'y_forecast': future_forecasts,
+        'yhat_lower': np.array(future_forecasts) - z_score * std_val,
+        'yhat_upper': np.array(future_forecasts) + z_score * std_val
+    })
+    if use_mc_intervals and future_lower is not None:
+        forecast_horizon['yhat_lower'] = future_lower
+        forecast_horizon['yhat_upper'] = future_upper
+
+    # Замена бесконечностей и NaN на 0
+    for df_ in [forecast_all, forecast_train, forecast_test, forecast_horizon]:
+        df_.replace([np.inf, -np.inf], np.nan, inplace=True)
+        df_.fillna(0, inplace=True)
+
+    return forecast_all, forecast_train, forecast_test, forecast_horizon
+
+
+# Запасной прогноз при ошибке: последнее известное значение на весь горизонт
+def fallback_forecast(df: pd.DataFrame, dt_name: str, y_name: str, horizon: int,
+                      freq: str) -> Tuple[pd.DataFrame, ...]:
+    last_value = df[y_name].iloc[-1] if not df.empty else 0
+    future_dates = pd.date_range(
+        start=pd.to_datetime(df[dt_name].iloc[-1]) if not df.empty else pd.Timestamp.today(),
+        periods=horizon + 1,
+        freq=freq
+    )[1:]
+    forecast_horizon = pd.DataFrame({
+        'ds': future_dates,
+        'y_forecast': [last_value] * horizon,
+        'yhat_lower': [last_value] * horizon,
+        'yhat_upper': [last_value] * horizon,
+    })
+    forecast_all = forecast_train = forecast_test = forecast_horizon.copy()
+    return forecast_all, forecast_train, forecast_test, forecast_horizon
@@ -0,0 +1,111 @@
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Callable, Optional
+
+# Репортёр выполняемой задачи (None — прогресс никуда не отправляется)
+_reporter = contextvars.ContextVar("progress_reporter", default=None)
+
+
+class ProgressReporter:
+    """
+    Прогресс обучения: этап (stage), число выполненных и ожидаемых единиц работы (эпох)
+    и поля последнего шага (фолд, эпоха, ошибки). publish(meta) вызывается не чаще,
+    чем раз в min_interval секунд (начало этапа публикуется сразу).
+    ETA — время этапа, делённое на число выполненных эпох и умноженное на оставшиеся;
+    эпохи, пропущенные ранней остановкой, вычитаются из ожидаемых (skip).
+    Методы потокобезопасны: фолды могут обучаться в параллельных потоках.
+    """
+
+    def __init__(self, publish: Callable[[dict], None], min_interval: float = 2.0):
+        self.publish = publish
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+        self.started = time.monotonic()
+        self.meta = {}
+        self.stage_started = self.started
+        self.done = 0
+        self.total = 0
+
+    def _snapshot(self) -> dict:
+        now = time.monotonic()
+        stage_elapsed = now - self.stage_started
+        eta = None
+        if self.done and self.total:
+            eta = round(stage_elapsed / self.done * max(self.total - self.done, 0), 1)
+        return {
+            **self.meta,
+            'done': self.done,
+            'total': self.total,
+            'elapsed': round(now - self.started, 1),
+            'eta': eta,
+        }
+
+    def _emit(self, force: bool) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_publish < self.min_interval:
+            return
+        self._last_publish = now
+        try:
+            self.publish(self._snapshot())
+        except Exception as e:
+            print(f"Не удалось отправить прогресс задачи: {e}")
+
+    def start_stage(self, stage: str, total: int = 0, **fields) -> None:
+        with self._lock:
+            self.meta = {'stage': stage, **fields}
+            self.stage_started = time.monotonic()
+            self.done = 0
+            self.total = int(total)
+            self._emit(force=True)
+
+    def step(self, **fields) -> None:
+        with self._lock:
+            self.done += 1
+            self.meta.update(fields)
+            self._emit(force=False)
+
+    def skip(self, units: int) -> None:
+        with self._lock:
+            self.total = max(self.done, self.total - int(units))
+
+
+@contextlib.contextmanager
+def progress_reporting(publish: Callable[[dict], None], min_interval: float = 2.0):
+    """
+    Включает отчёт о прогрессе на время задачи: функции ниже обращаются к этому репортёру.
+    """
+    reporter = ProgressReporter(publish, min_interval)
+    token = _reporter.set(reporter)
+    try:
+        yield reporter
+    finally:
+        _reporter.reset(token)
+
+
+def current_reporter() -> Optional[ProgressReporter]:
+    return _reporter.get()
+
+
+# Начало этапа (например, 'cv' — кросс-валидация, 'full' — обучение на всей выборке,
+# 'forecast' — прогноз); total — ожидаемое число эпох этапа
+def progress_stage(stage: str, total: int = 0, **fields) -> None:
+    reporter = _reporter.get()
+    if reporter is not None:
+        reporter.start_stage(stage, total, **fields)
+
+
+# Завершённая эпоха: фолд, номер эпохи, ошибки на обучении и валидации
+def progress_step(**fields) -> None:
+    reporter = _reporter.get()
+    if reporter is not None:
+        reporter.step(**{k: (round(float(v), 6) if isinstance(v, float) else v) for k, v in fields.items()})
+
+
+# Эпохи, которые не будут выполнены (ранняя остановка)
+def progress_skip(units: int) -> None:
+    reporter = _reporter.get()
+    if reporter is not None and units > 0:
+        reporter.skip(units)
@@ -1,5 +1,7 @@
 import pandas as pd
 from prophet import Prophet
+from scipy.stats import norm
+from prophet.serialize import model_to_json, model_from_json
 
 def apply_confidence_intervals(forecast_df, confidence_level):
     """
@@ -13,15 +15,33 @@ def apply_confidence_intervals(forecast_df, confidence_level):
     forecast_df['yhat_upper'] = None
     return forecast_df
 
+def apply_analytic_intervals(forecast_df, residual_std, confidence_level):
+    """
+    Аналитические интервалы при uncertainty_samples=0: yhat ± z·σ, где σ — СКО остатков
+    на обучающей части, z — квантиль нормального распределения для уровня доверия.
+    """
+    z = norm.ppf(0.5 + confidence_level / 200.0)
+    forecast_df['yhat_lower'] = forecast_df['yhat'] - z * residual_std
+    forecast_df['yhat_upper'] = forecast_df['yhat'] + z * residual_std
+    return forecast_df
+
 def prophet_forecast(df,
                      horizon,
                      test_size,
                      dt_name,
                      y_name,
                      freq,
-                     confidence_level=95):
+                     confidence_level=95,
+                     artifacts=None,
+                     prophet_params=None):
     """
     Если test_size > 0, делим данные на train и test.
+    artifacts — необязательный словарь для реестра моделей: если в нём есть 'model'
+    (JSON обученной модели), обучение пропускается; иначе после обучения туда
+    записывается JSON модели.
+    prophet_params — параметры из uniqueParams; uncertainty_samples задаёт число сэмплов
+    для интервалов (по умолчанию 1000, как в Prophet; 0 — аналитические интервалы по СКО остатков).
+    История и горизонт прогнозируются одним вызовом predict, результат делится на части.
     Возвращаем:
       - forecast_all: прогноз и фактические значения для всей истории,
       - forecast_train: для тренировочной части,
@@ -29,6 +49,9 @@ def prophet_forecast(df,
       - forecast_horizon: прогноз на будущий горизонт.
     """
     try:
+        prophet_params = prophet_params or {}
+        uncertainty_samples = int(prophet_params.get('uncertainty_samples', 1000))
+
         data = df.copy()
         data[dt_name] = pd.to_datetime(data[dt_name])
         data.sort_values(dt_name, inplace=True)
@@ -41,8 +64,8 @@ def prophet_forecast(df,
 
         df_prophet = pd.DataFrame({
             'ds': data.index,
-            'y': data[y_name]
-        }).sort_values('ds')
+            'y': data[y_name].to_numpy()
+        }).sort_values('ds').reset_index(drop=True)
 
         n = len(df_prophet)
         if test_size > 0 and test_size < n:
@@ -52,31 +75,44 @@ def prophet_forecast(df,
             train_df = df_prophet.copy()
             test_df = pd.DataFrame(columns=['ds', 'y'])
 
-        # Инициализируем Prophet с заданным уровнем доверия
-        m = Prophet(interval_width=confidence_level / 100.0)
-        m.fit(train_df)
+        if artifacts is not None and artifacts.get('model') is not None:
+            # Обученная модель из реестра: уровень доверия и число сэмплов применяются при прогнозе
+            m = model_from_json(artifacts['model'])
+            m.interval_width = confidence_level / 100.0
+            m.uncertainty_samples = uncertainty_samples
+        else:
+            # Инициализируем Prophet с заданным уровнем доверия
+            m = Prophet(interval_width=confidence_level / 100.0, uncertainty_samples=uncertainty_samples)
+            m.fit(train_df)
+            if artifacts is not None:
+                artifacts['model'] = model_to_json(m)
+
+        # Один вызов predict для истории и будущего горизонта
+        last_date = df_prophet['ds'].max()
+        future_dates = pd.date_range(start=last_date, periods=horizon + 1, freq=freq)[1:]
+        prediction = m.predict(pd.DataFrame({
+            'ds': pd.concat([df_prophet['ds'], pd.Series(future_dates)], ignore_index=True)
+        }))
+        if uncertainty_samples == 0:
+            fitted = prediction['yhat'].iloc[:len(train_df)].to_numpy()
+            residual_std = float((train_df['y'].to_numpy() - fitted).std())
+            prediction = apply_analytic_intervals(prediction, residual_std, confidence_level)
+        prediction = apply_confidence_intervals(prediction, confidence_level)
+        prediction.rename(columns={'yhat': 'y_forecast'}, inplace=True)
+        prediction['model_name'] = 'Prophet'
 
-        # Прогноз для всей истории
-        forecast_all = m.predict(df_prophet[['ds']])
-        forecast_all = apply_confidence_intervals(forecast_all, confidence_level)
-        # Сливаем фактические значения (y) с прогнозом
+        # Прогноз для всей истории: сливаем фактические значения (y) с прогнозом
+        forecast_all = prediction.iloc[:n][['ds', 'y_forecast', 'yhat_lower', 'yhat_upper', 'model_name']]
         forecast_all = forecast_all.merge(df_prophet, on='ds', how='left')
-        forecast_all.rename(columns={'y': 'y_fact', 'yhat': 'y_forecast'}, inplace=True)
-        forecast_all['model_name'] = 'Prophet'
+        forecast_all.rename(columns={'y': 'y_fact'}, inplace=True)
         forecast_all = forecast_all[['ds', 'y_fact', 'y_forecast', 'yhat_lower', 'yhat_upper', 'model_name']]
 
-        train_forecast = forecast_all[forecast_all['ds'].isin(train_df['ds'])].copy()
-        test_forecast = forecast_all[forecast_all['ds'].isin(test_df['ds'])].copy()
+        train_forecast = forecast_all.iloc[:len(train_df)].copy()
+        test_forecast = forecast_all.iloc[len(train_df):].copy()
 
         # Прогноз для будущего горизонта
-        last_date = df_prophet['ds'].max()
-        future = m.make_future_dataframe(periods=horizon, freq=freq, include_history=True)
-        future = future[future['ds'] > last_date]
-        future_fore = m.predict(future)
-        future_fore = apply_confidence_intervals(future_fore, confidence_level)
-        future_fore.rename(columns={'yhat': 'y_forecast'}, inplace=True)
-        forecast_horizon = future_fore[['ds', 'y_forecast', 'yhat_lower', 'yhat_upper']].copy()
-        forecast_horizon['model_name'] = 'Prophet'
+        forecast_horizon = prediction.iloc[n:][['ds', 'y_forecast', 'yhat_lower', 'yhat_upper', 'model_name']]
+        forecast_horizon = forecast_horizon.reset_index(drop=True)
 
         return forecast_all, train_forecast, test_forecast, forecast_horizon
     except Exception as e:
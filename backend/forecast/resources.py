@@ -0,0 +1,98 @@
+import os
+import contextlib
+import contextvars
+import torch
+from threadpoolctl import threadpool_limits
+from typing import Dict, Optional
+
+from config import CELERY_WORKER_CONCURRENCY, TASK_THREAD_BUDGET, XGB_NTHREAD
+
+# Класс модели определяет, кому внутри задачи отдаются потоки процесса
+MODEL_CLASSES = {
+    "Prophet": "statistical",
+    "SARIMA": "statistical",
+    "XGBoost": "tree",
+    "LSTM": "neural",
+    "GRU": "neural",
+    "Transformer": "neural",
+}
+
+# Бюджет выполняемой задачи (None вне thread_budget)
+_active_budget = contextvars.ContextVar("thread_budget", default=None)
+
+
+# Число ядер, доступных процессу (с учётом привязки к CPU, например, в контейнере)
+def available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def plan_thread_budget(model: str, concurrency: Optional[int] = None) -> Dict:
+    """
+    Бюджет потоков задачи: ядра делятся поровну между процессами воркера
+    (CELERY_WORKER_CONCURRENCY, по умолчанию Celery запускает по процессу на ядро)
+    либо задаются явно TASK_THREAD_BUDGET. Доля процесса отдаётся тому, кто считает:
+      - statistical (Prophet, SARIMA) — BLAS в один поток (матрицы малы, потоки BLAS
+        только мешают), доля идёт на параллельный перебор кандидатов (workers);
+      - tree (XGBoost) — nthread и OpenMP;
+      - neural — intra-op потоки torch и OpenMP.
+    Потоки BLAS numpy/scipy для tree и neural ограничены одним: основная работа — в XGBoost/torch.
+    """
+    cores = available_cores()
+    concurrency = max(1, concurrency or CELERY_WORKER_CONCURRENCY or cores)
+    share = TASK_THREAD_BUDGET or max(1, cores // concurrency)
+    model_class = MODEL_CLASSES.get(model, "statistical")
+    budget = {
+        "model_class": model_class,
+        "cores": cores,
+        "concurrency": concurrency,
+        "share": share,
+        "blas": 1,
+        "openmp": 1,
+        "torch_intra": 1,
+        "torch_interop": 1,
+        "xgb_nthread": 1,
+        "workers": share,
+    }
+    if model_class == "tree":
+        budget["xgb_nthread"] = XGB_NTHREAD or share
+        budget["openmp"] = budget["xgb_nthread"]
+    elif model_class == "neural":
+        budget["torch_intra"] = share
+        budget["openmp"] = share
+    return budget
+
+
+# Inter-op потоки torch задаются один раз на процесс (до первой параллельной операции);
+# если это уже невозможно, возвращается действующее значение
+def _set_torch_interop(threads: int) -> int:
+    with contextlib.suppress(RuntimeError):
+        if torch.get_num_interop_threads() != threads:
+            torch.set_num_interop_threads(threads)
+    return torch.get_num_interop_threads()
+
+
+@contextlib.contextmanager
+def thread_budget(model: str, concurrency: Optional[int] = None):
+    """
+    Применяет бюджет потоков на время задачи: BLAS и OpenMP (threadpoolctl),
+    intra/inter-op потоки torch; n_jobs XGBoost и число рабочих потоков перебора
+    берутся из current_thread_budget(). После задачи прежние ограничения восстанавливаются.
+    Возвращает бюджет (фактические значения) для метаданных задачи.
+    """
+    budget = plan_thread_budget(model, concurrency)
+    prev_threads = torch.get_num_threads()
+    token = _active_budget.set(budget)
+    try:
+        with threadpool_limits(limits={"blas": budget["blas"], "openmp": budget["openmp"]}):
+            torch.set_num_threads(budget["torch_intra"])
+            budget["torch_interop"] = _set_torch_interop(budget["torch_interop"])
+            yield budget
+    finally:
+        torch.set_num_threads(prev_threads)
+        _active_budget.reset(token)
+
+
+def current_thread_budget() -> Optional[Dict]:
+    return _active_budget.get()
@@ -0,0 +1,107 @@
+import os
+import time
+import contextlib
+import io
+import numpy as np
+import pandas as pd
+import torch
+from typing import Callable, Dict, Iterable, Optional
+
+from forecast.prophet_forecast import prophet_forecast
+from forecast.xgboost_forecast import xgboost_forecast
+from forecast.arima_forecast import sarima_forecast
+from forecast.lstm_forecast import lstm_forecast
+from forecast.gru_forecast import gru_forecast
+from forecast.transformers_forecast import transformer_forecast
+from forecast.resources import plan_thread_budget
+
+WARMUP_MODELS = ("Prophet", "SARIMA", "XGBoost", "LSTM", "GRU", "Transformer")
+
+# Минимальные параметры нейросетей для прогрева: одна эпоха, крошечная сеть, без MC Dropout
+_NEURAL_PARAMS = {
+    'seq_length': 6, 'lag_periods': 2, 'window_sizes': [3], 'num_layers': 1, 'hidden_dim': 8,
+    'batch_size': 32, 'epochs': 1, 'patience': 1, 'n_splits': 2, 'mc_dropout': False,
+    'mc_samples': 2, 'use_attention': False
+}
+
+
+# Небольшой синтетический ряд (тренд + недельная сезонность) для пробных обучений
+def _dummy_series(n: int = 120) -> pd.DataFrame:
+    t = np.arange(n)
+    return pd.DataFrame({
+        'ds': pd.date_range('2020-01-01', periods=n, freq='D'),
+        'y': 10 + 0.05 * t + np.sin(2 * np.pi * t / 7)
+    })
+
+
+def _fit(model: str, df: pd.DataFrame) -> None:
+    common = dict(horizon=3, test_size=10, dt_name='ds', y_name='y', freq='D')
+    if model == "Prophet":
+        # Загрузка модели cmdstan и первое обучение
+        prophet_forecast(df, prophet_params={'uncertainty_samples': 0}, **common)
+    elif model == "SARIMA":
+        sarima_forecast(df, order=(1, 0, 0), seasonal_order=(0, 0, 0, 0), **common)
+    elif model == "XGBoost":
+        xgboost_forecast(df, xgb_params={'n_estimators': 2, 'max_depth': 2}, **common)
+    elif model == "LSTM":
+        lstm_forecast(df, model_params=dict(_NEURAL_PARAMS), seasonality='D', **common)
+    elif model == "GRU":
+        gru_forecast(df, model_params=dict(_NEURAL_PARAMS), seasonality='D', **common)
+    elif model == "Transformer":
+        params = dict(_NEURAL_PARAMS, d_model=8, nhead=2, dim_feedforward=16)
+        transformer_forecast(df, model_params=params, seasonality='D', **common)
+    else:
+        raise ValueError(f"Неизвестная модель: {model}")
+
+
+# Настройка потоков torch для процесса воркера по плану бюджета нейросетевых задач.
+# Inter-op потоки задаются здесь, пока в процессе не было параллельных операций torch
+def configure_torch_threads(threads: Optional[int] = None) -> int:
+    budget = plan_thread_budget("LSTM")
+    torch.set_num_threads(threads or budget['torch_intra'])
+    with contextlib.suppress(RuntimeError):
+        torch.set_num_interop_threads(budget['torch_interop'])
+    return torch.get_num_threads()
+
+
+def warm_up(models: Iterable[str] = WARMUP_MODELS, verbose: bool = False,
+            on_update: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Прогрев процесса воркера: настройка потоков torch и пробное обучение каждой модели
+    на маленьком синтетическом ряду, чтобы загрузка библиотек, модели cmdstan и первые
+    вызовы нативного кода не приходились на первую задачу пользователя.
+    Возвращает статус: время и результат по каждой модели. Ошибка одной модели
+    не прерывает прогрев остальных. on_update(status) вызывается до прогрева
+    и после каждой модели (например, для публикации статуса).
+    """
+    started = time.time()
+    status = {
+        'pid': os.getpid(),
+        'state': 'running',
+        'started': started,
+        'torch_threads': configure_torch_threads(),
+        'models': {}
+    }
+    if on_update:
+        on_update(status)
+    df = _dummy_series()
+    for model in models:
+        t0 = time.perf_counter()
+        try:
+            if verbose:
+                _fit(model, df)
+            else:
+                # Прогрев не засоряет лог воркера выводом моделей
+                with contextlib.redirect_stdout(io.StringIO()):
+                    _fit(model, df)
+            status['models'][model] = {'status': 'ok', 'seconds': round(time.perf_counter() - t0, 3)}
+        except Exception as e:
+            status['models'][model] = {'status': 'error', 'seconds': round(time.perf_counter() - t0, 3),
+                                       'error': str(e)}
+        if on_update:
+            on_update(status)
+    status['state'] = 'done'
+    status['seconds'] = round(time.time() - started, 3)
+    if on_update:
+        on_update(status)
+    return status
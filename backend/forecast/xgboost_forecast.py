@@ -1,10 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from xgboost import XGBRegressor
+from xgboost import Booster, XGBRegressor
+from forecast.resources import current_thread_budget, plan_thread_budget
+from forecast.features import build_feature_matrix, calendar_columns, calendar_matrix
 
-def xgboost_forecast(df, horizon, test_size, dt_name, y_name, freq, confidence_level=95, xgb_params=None):
+
+# Число потоков XGBoost по умолчанию: бюджет выполняемой задачи (thread_budget),
+# вне задачи — XGB_NTHREAD или доля ядер процесса воркера по плану для XGBoost
+def default_nthread():
+    budget = current_thread_budget() or plan_thread_budget("XGBoost")
+    return budget["xgb_nthread"]
+
+
+class HorizonFeatureBuilder:
+    """
+    Строки признаков для шагов горизонта в порядке столбцов build_feature_matrix
+    с lagged_stats=True: lag_1..lag_N, rolling_mean_w/rolling_std_w и diff_1 по значениям
+    до предыдущего шага, календарные признаки даты шага.
+    Значения ряда хранятся в заранее выделенном буфере (история + прогнозы),
+    календарь для всех дат горизонта считается сразу, строка признаков переиспользуется.
+    """
+
+    def __init__(self, history, horizon, lag, window_sizes, calendar, future_dates):
+        self.lag = lag
+        self.window_sizes = list(window_sizes)
+        self.size = max([lag, 2 if self.window_sizes else 1] + self.window_sizes)
+        history = np.asarray(history, dtype=np.float64)[-self.size:]
+        self.buffer = np.empty(len(history) + horizon, dtype=np.float64)
+        self.buffer[:len(history)] = history
+        self.end = len(history)
+        self.calendar = calendar_matrix(future_dates, calendar) if calendar else None
+        n_features = lag + 2 * len(self.window_sizes) + (1 if self.window_sizes else 0) + len(calendar)
+        self.x = np.empty((1, n_features), dtype=np.float32)
+
+    def row(self, step):
+        buffer, end, x = self.buffer, self.end, self.x[0]
+        x[:self.lag] = buffer[end - self.lag:end][::-1]
+        col = self.lag
+        for w in self.window_sizes:
+            window = buffer[end - w:end]
+            x[col] = window.mean()
+            x[col + 1] = window.std(ddof=1)
+            col += 2
+        if self.window_sizes:
+            x[col] = buffer[end - 1] - buffer[end - 2]
+            col += 1
+        if self.calendar is not None:
+            x[col:] = self.calendar[step]
+        return self.x
+
+    def push(self, value):
+        self.buffer[self.end] = value
+        self.end += 1
+
+
+# Рекурсивный прогноз на horizon шагов: прогноз шага дописывается в буфер построителя
+# и участвует в признаках следующего шага; бустер вызывается через inplace_predict без DMatrix.
+def recursive_forecast(booster, builder, horizon):
+    forecasts = np.empty(horizon, dtype=float)
+    for i in range(horizon):
+        forecasts[i] = booster.inplace_predict(builder.row(i))[0]
+        builder.push(forecasts[i])
+    return forecasts
+
+
+# Прямая стратегия: отдельный бустер на каждый шаг горизонта h (цель — значение через h шагов
+# после строки признаков). Бустеры обучаются параллельно в пуле потоков (XGBoost отпускает GIL
+# при обучении), бюджет потоков XGBoost (n_jobs) делится между задачами поровну.
+def train_direct_boosters(X, y, horizon, xgb_params, max_workers=None):
+    budget = xgb_params.get('n_jobs') or default_nthread()
+    n_workers = max(1, min(horizon, max_workers or budget))
+    n_jobs = max(1, budget // n_workers)
+
+    def fit_step(h):
+        rows = len(y) - h
+        model = XGBRegressor(**{**xgb_params, 'n_jobs': n_jobs})
+        model.fit(X[:rows], y[h:h + rows])
+        return model.get_booster()
+
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(fit_step, range(horizon)))
+
+
+# Прогноз всего горизонта прямой стратегией: одна строка признаков первого шага для всех бустеров
+def direct_forecast(boosters, builder):
+    row = builder.row(0)
+    return np.array([booster.inplace_predict(row)[0] for booster in boosters], dtype=float)
+
+
+def xgboost_forecast(df, horizon, test_size, dt_name, y_name, freq, confidence_level=95, xgb_params=None,
+                     artifacts=None):
     """
     Прогнозирование с использованием XGBoost.
-    Создаются лаговые признаки (lag = 5).
+    Признаки строятся один раз матрицей float32 (build_feature_matrix): лаги (lags, по умолчанию 5),
+    скользящие среднее и СКО по окнам window_sizes с diff_1 и календарные признаки по строке
+    seasonality ('M', 'W', 'D'); статистики считаются по значениям до предыдущего шага.
     Данные делятся на train и test (последние test_size строк).
     Выполняется рекурсивное прогнозирование на заданный горизонт.
     Возвращаются четыре DataFrame:
@@ -12,25 +103,39 @@ def xgboost_forecast(df, horizon, test_size, dt_name, y_name, freq, confidence_l
       - forecast_train: прогноз для тренировочной выборки
       - forecast_test: прогноз для тестовой выборки
       - forecast_horizon: прогноз на будущее (горизонт)
+    artifacts — необязательный словарь для реестра моделей: 'model' хранит
+    сериализованный бустер (save_raw), при его наличии обучение пропускается.
+    Стратегия горизонта задаётся ключом forecast_strategy в xgb_params:
+      - 'recursive' (по умолчанию) — один бустер, прогнозы подставляются в лаги;
+      - 'direct' — по бустеру на каждый шаг, обучаются параллельно (direct_workers потоков).
+    Параметры бустера по умолчанию учитывают воркер: tree_method='hist', n_jobs (nthread) —
+    доля ядер процесса воркера (default_nthread), max_bin — не больше размера обучающей выборки.
     """
-    if xgb_params is None:
-        xgb_params = {}
+    xgb_params = dict(xgb_params or {})
+    strategy = xgb_params.pop('forecast_strategy', 'recursive')
+    direct_workers = xgb_params.pop('direct_workers', None)
+    lag = int(xgb_params.pop('lags', 5))
+    window_sizes = [int(w) for w in xgb_params.pop('window_sizes', None) or [] if int(w) > 1]
+    seasonality = xgb_params.pop('seasonality', '') or ''
+    if 'nthread' in xgb_params:
+        xgb_params['n_jobs'] = xgb_params.pop('nthread')
+    xgb_params.setdefault('tree_method', 'hist')
+    xgb_params.setdefault('n_jobs', default_nthread())
     try:
         data = df.copy()
         data[dt_name] = pd.to_datetime(data[dt_name])
         data.set_index(dt_name, inplace=True)
         data = data.sort_index()
         data = data.asfreq(freq=freq)
-        data = data.fillna(method='ffill').fillna(0)
+        data = data.ffill().fillna(0)
         data[y_name] = data[y_name].astype(float)
 
-        lag = 5
-        df_features = pd.DataFrame()
-        for i in range(1, lag + 1):
-            df_features[f'lag_{i}'] = data[y_name].shift(i)
-        df_features['y'] = data[y_name]
-        df_features['ds'] = data.index
-        df_features = df_features.dropna()
+        features = build_feature_matrix(data[[y_name]].rename_axis(dt_name).reset_index(), dt_name, y_name, lag,
+                                        seasonality=seasonality, window_sizes=window_sizes,
+                                        include_exog=False, lagged_stats=True)
+        feature_cols = [col for col in features.columns if col != y_name]
+        df_features = features.to_frame().rename(columns={y_name: 'y'}).reset_index(drop=True)
+        df_features['ds'] = features.index
 
         n = len(df_features)
         if test_size > 0 and test_size < n:
@@ -40,9 +145,34 @@ def xgboost_forecast(df, horizon, test_size, dt_name, y_name, freq, confidence_l
             train_df = df_features.copy()
             test_df = pd.DataFrame(columns=df_features.columns)
 
+        xgb_params.setdefault('max_bin', int(min(256, max(16, len(train_df)))))
         model = XGBRegressor(**xgb_params)
-        feature_cols = [f"lag_{i}" for i in range(1, lag + 1)]
-        model.fit(train_df[feature_cols], train_df["y"])
+        cached = artifacts.get('model') if artifacts is not None else None
+        direct_boosters = None
+        if cached is not None:
+            model.load_model(bytearray(cached['booster']))
+            if cached.get('direct') is not None:
+                direct_boosters = []
+                for raw in cached['direct']:
+                    booster = Booster()
+                    booster.load_model(bytearray(raw))
+                    direct_boosters.append(booster)
+        else:
+            model.fit(train_df[feature_cols], train_df["y"])
+        if strategy == 'direct' and direct_boosters is None:
+            if len(train_df) > horizon:
+                direct_boosters = train_direct_boosters(
+                    train_df[feature_cols].to_numpy(dtype=np.float32), train_df["y"].to_numpy(dtype=np.float32),
+                    horizon, xgb_params, direct_workers
+                )
+            else:
+                print("XGBoost: недостаточно данных для прямой стратегии, используется рекурсивная")
+        if artifacts is not None and cached is None:
+            artifacts['model'] = {
+                'booster': bytes(model.get_booster().save_raw(raw_format="ubj")),
+                'direct': [bytes(b.save_raw(raw_format="ubj")) for b in direct_boosters]
+                if direct_boosters is not None else None
+            }
 
         pred_all = model.predict(df_features[feature_cols])
         forecast_all = df_features.copy()
@@ -57,18 +187,16 @@ def xgboost_forecast(df, horizon, test_size, dt_name, y_name, freq, confidence_l
         forecast_train = forecast_all[forecast_all["ds"].isin(train_df["ds"])].copy()
         forecast_test = forecast_all[forecast_all["ds"].isin(test_df["ds"])].copy()
 
-        last_row = df_features.iloc[-1]
-        last_lags = list(last_row[feature_cols])
-        future_forecasts = []
+        # Признаки шагов горизонта: lag_1 первого шага — последнее наблюдение
         last_date = df_features["ds"].max()
         future_dates = pd.date_range(start=last_date, periods=horizon + 1, freq=freq)[1:]
-        current_lags = last_lags.copy()
-        for dt in future_dates:
-            X_input = [current_lags]
-            y_pred = model.predict(X_input)[0]
-            future_forecasts.append({"ds": dt, "y_forecast": y_pred})
-            current_lags = current_lags[1:] + [y_pred]
-        future_fore = pd.DataFrame(future_forecasts)
+        builder = HorizonFeatureBuilder(data[y_name].to_numpy(), horizon, lag, window_sizes,
+                                        calendar_columns(seasonality), future_dates)
+        if direct_boosters is not None:
+            future_values = direct_forecast(direct_boosters, builder)
+        else:
+            future_values = recursive_forecast(model.get_booster(), builder, horizon)
+        future_fore = pd.DataFrame({"ds": future_dates, "y_forecast": future_values})
         future_fore["yhat_lower"] = future_fore["y_forecast"] * (1 - margin)
         future_fore["yhat_upper"] = future_fore["y_forecast"] * (1 + margin)
         future_fore["model_name"] = "XGBoost"
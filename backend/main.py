@@ -14,6 +14,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Dataset-Id"],
 )
 
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
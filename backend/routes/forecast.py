@@ -1,14 +1,36 @@
 # routes/forecast.py
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from celery.result import AsyncResult
+import json
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, model_validator
 from forecast.arima_forecast import sarima_forecast
 from forecast.prophet_forecast import prophet_forecast
 from forecast.xgboost_forecast import xgboost_forecast
-from tasks import run_forecast, celery_app
+from tasks import (run_forecast, celery_app, dataset_store, cancel_flags, broker_priority,
+                   MAX_PRIORITY, DEFAULT_PRIORITY)
+from services.forecast_result import (COLUMNAR_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, is_columnar,
+                                      unpack_forecast_result)
+from services.task_status import READY_STATES, TaskStatusService
+from services.request_cache import (InflightCoalescer, TaskDeduplicator, records_digest,
+                                    request_fingerprint)
+from utils.auth import get_current_user
+from models.user import User
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 import pandas as pd
 
 forecast_router = APIRouter()
+task_deduplicator = TaskDeduplicator()
+demo_coalescer = InflightCoalescer()
+task_status = TaskStatusService(celery_app)
+# Интервал keep-alive комментариев в потоке SSE (секунды)
+SSE_HEARTBEAT_SECONDS = 15.0
 
 class ForecastRequest(BaseModel):
     model: str
@@ -19,106 +41,277 @@ class ForecastRequest(BaseModel):
     y_name: str
     freq: str
     confidence_level: int = 95
+    data: list = []
+    dataset_id: Optional[str] = None
+    # Принудительный пересчёт без переиспользования задач и кэша
+    force: bool = False
+    # Приоритет задачи в своей очереди: 0..9, больше — важнее
+    priority: int = Field(DEFAULT_PRIORITY, ge=0, le=MAX_PRIORITY)
+
+    @model_validator(mode="after")
+    def check_source(self):
+        # Данные передаются либо записями в data, либо ссылкой на набор в хранилище
+        if not self.data and not self.dataset_id:
+            raise ValueError("Нужно передать data или dataset_id")
+        if self.dataset_id and not dataset_store.exists(self.dataset_id):
+            raise ValueError("Набор данных не найден")
+        return self
+
+
+class DatasetRequest(BaseModel):
     data: list
 
+
+@forecast_router.post("/datasets")
+async def create_dataset(request_data: DatasetRequest, current_user: User = Depends(get_current_user)):
+    """
+    Сохраняет переданные записи (например, данные после предобработки) в хранилище
+    и возвращает dataset_id, чтобы не пересылать их в каждом запросе прогноза.
+    Набор принадлежит текущему пользователю; те же данные того же пользователя
+    возвращают существующий dataset_id.
+    """
+    if not request_data.data:
+        raise HTTPException(status_code=400, detail="Пустой набор данных")
+    try:
+        dataset_id = await run_in_threadpool(dataset_store.put, pd.DataFrame(request_data.data), current_user.id)
+        return {"dataset_id": dataset_id, "rows": len(request_data.data)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def forecast_fingerprint(request_data: ForecastRequest) -> str:
+    """
+    Отпечаток запроса: параметры прогноза и хэш содержимого данных. Одинаковые данные
+    дают один отпечаток независимо от того, переданы они записями или через dataset_id.
+    """
+    if request_data.dataset_id:
+        data_digest = await run_in_threadpool(dataset_store.content_hash, request_data.dataset_id)
+    else:
+        data_digest = await run_in_threadpool(records_digest, request_data.data)
+    fields = request_data.model_dump(exclude={"data", "dataset_id", "force", "priority"})
+    return request_fingerprint(fields, data_digest)
+
+
+async def is_reusable_task(task_id: str) -> bool:
+    if (await task_status.get(task_id))["status"] in ("FAILURE", "REVOKED"):
+        return False
+    # Отменённая, но ещё не остановившаяся задача не отдаётся новому запросу
+    return not await cancel_flags.is_requested(task_id)
+
+
 @forecast_router.post("/forecast")
 async def forecast_endpoint(request_data: ForecastRequest):
     """
-    Принимает запрос на прогнозирование, отправляет задачу в очередь и возвращает task_id.
+    Принимает запрос на прогнозирование, отправляет задачу в очередь класса модели
+    (с приоритетом priority) и возвращает task_id.
+    Одинаковый запрос, пока его задача выполняется или её результат ещё хранится,
+    получает task_id существующей задачи (deduplicated=true) вместо постановки новой.
     """
     try:
-        task = run_forecast.delay(
-            request_data.model,
-            request_data.uniqueParams,
-            request_data.horizon,
-            request_data.history,
-            request_data.dt_name,
-            request_data.y_name,
-            request_data.freq,
-            request_data.confidence_level,
-            request_data.data
-        )
-        return {"message": "Forecast task submitted", "task_id": task.id}
+        def submit(task_id: str):
+            run_forecast.apply_async(args=(
+                request_data.model,
+                request_data.uniqueParams,
+                request_data.horizon,
+                request_data.history,
+                request_data.dt_name,
+                request_data.y_name,
+                request_data.freq,
+                request_data.confidence_level,
+                [] if request_data.dataset_id else request_data.data,
+                request_data.dataset_id
+            ), task_id=task_id, priority=broker_priority(request_data.priority))
+
+        if request_data.force:
+            task_id, deduplicated = uuid.uuid4().hex, False
+            submit(task_id)
+        else:
+            fingerprint = await forecast_fingerprint(request_data)
+            task_id, deduplicated = await task_deduplicator.submit(fingerprint, submit, is_reusable_task)
+        return {"message": "Forecast task submitted", "task_id": task_id, "deduplicated": deduplicated}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@forecast_router.delete("/forecast/{task_id}")
+async def cancel_forecast(task_id: str):
+    """
+    Отмена задачи прогнозирования. Задача в очереди отзывается (revoke) и не начнётся;
+    выполняющаяся получает флаг отмены, который проверяется между эпохами/батчами,
+    шагами перебора SARIMA и сэмплами MC Dropout, и освобождает воркер за несколько секунд.
+    Завершённую задачу отменить нельзя (cancelled=false).
+    """
+    state = await task_status.get(task_id)
+    if state["status"] in READY_STATES:
+        return {"task_id": task_id, "cancelled": False, "status": state["status"]}
+    try:
+        await cancel_flags.request(task_id)
+        await run_in_threadpool(celery_app.control.revoke, task_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"task_id": task_id, "cancelled": True, "status": state["status"]}
+
+
+def negotiate_result(request: Request, payload: dict):
+    """
+    Отдаёт статус с результатом в формате, который запросил клиент (заголовок Accept):
+    колоночный JSON, колоночный msgpack (если установлен msgpack) или прежние списки записей.
+    """
+    accept = request.headers.get("accept", "")
+    result = payload.get("result")
+    if is_columnar(result):
+        if MSGPACK_MEDIA_TYPE in accept and msgpack is not None:
+            return Response(content=msgpack.packb(payload), media_type=MSGPACK_MEDIA_TYPE)
+        if COLUMNAR_MEDIA_TYPE in accept:
+            return JSONResponse(content=payload, media_type=COLUMNAR_MEDIA_TYPE)
+        payload = {**payload, "result": unpack_forecast_result(result)}
+    return payload
+
+
+def status_payload(state: dict, request: Optional[Request] = None, columnar: Optional[bool] = None):
+    """
+    Ответ о статусе задачи: для PENDING — без результата, для STARTED/PROGRESS — progress,
+    для FAILURE и REVOKED — текст ошибки, иначе результат в формате, выбранном заголовком Accept (или явно параметром columnar).
+    """
+    payload = {"task_id": state["task_id"], "status": state["status"]}
+    if state["status"] == "PENDING":
+        return payload
+    if state["status"] in ("STARTED", "PROGRESS"):
+        # Ход выполнения: для PROGRESS — этап, фолд, эпоха, ошибки и ETA
+        return {**payload, "progress": state["result"] or {}}
+    if state["status"] in ("FAILURE", "REVOKED"):
+        return {**payload, "result": str(state["result"])}
+    payload["result"] = state["result"]
+    if columnar is None:
+        return negotiate_result(request, payload)
+    if not columnar and is_columnar(payload["result"]):
+        payload["result"] = unpack_forecast_result(payload["result"])
+    return payload
+
+
 @forecast_router.get("/forecast/status/{task_id}")
-async def get_forecast_status(task_id: str):
+async def get_forecast_status(task_id: str, request: Request):
     """
     Эндпоинт для получения статуса задачи прогнозирования.
-    Если задача завершена, возвращается результат.
-    """
-    task_result = AsyncResult(task_id, app=celery_app)
-    if task_result.state == "PENDING":
-        return {"task_id": task_id, "status": task_result.state}
-    elif task_result.state != "FAILURE":
-        return {
-            "task_id": task_id,
-            "status": task_result.state,
-            "result": task_result.result
-        }
+    Если задача завершена, возвращается результат (формат — по заголовку Accept).
+    Статус читается асинхронно из result backend, не блокируя цикл событий.
+    """
+    return status_payload(await task_status.get(task_id), request)
+
+
+@forecast_router.get("/forecast/status/{task_id}/wait")
+async def wait_forecast_status(task_id: str, request: Request, since: Optional[str] = None,
+                               timeout: float = Query(25.0, gt=0, le=60)):
+    """
+    Long-poll: ответ приходит, как только статус задачи отличается от since
+    (например, since=PENDING), или по истечении timeout с текущим статусом.
+    """
+    return status_payload(await task_status.wait(task_id, since=since, timeout=timeout), request)
+
+
+@forecast_router.get("/forecast/events/{task_id}")
+async def forecast_events(task_id: str, format: str = "records"):
+    """
+    Server-Sent Events: событие status с каждым новым состоянием задачи и итоговым
+    результатом; поток закрывается после завершения задачи. format=columnar — результат
+    в колоночном формате (EventSource не позволяет задать заголовок Accept).
+    """
+    columnar = format == "columnar"
+
+    async def stream():
+        async for state in task_status.watch(task_id, heartbeat=SSE_HEARTBEAT_SECONDS):
+            if state is None:
+                yield ": keep-alive\n\n"
+                continue
+            payload = jsonable_encoder(status_payload(state, columnar=columnar))
+            yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# Расчёт демо-прогноза (выполняется в пуле потоков, вне цикла событий)
+def compute_demo_forecast(request: ForecastRequest) -> dict:
+    if request.dataset_id:
+        df = dataset_store.load(request.dataset_id, [request.dt_name, request.y_name])
     else:
-        return {
-            "task_id": task_id,
-            "status": task_result.state,
-            "result": str(task_result.info)
-        }
+        df = pd.DataFrame(request.data)
+    artifacts = None
+    if request.model == "Prophet":
+        forecast_all, forecast_train, forecast_test, forecast_horizon = prophet_forecast(
+            df,
+            horizon=request.horizon,
+            test_size=request.history,
+            dt_name=request.dt_name,
+            y_name=request.y_name,
+            freq=request.freq,
+            confidence_level=request.confidence_level,
+            prophet_params=request.uniqueParams
+        )
+    elif request.model == "XGBoost":
+        forecast_all, forecast_train, forecast_test, forecast_horizon = xgboost_forecast(
+            df,
+            horizon=request.horizon,
+            test_size=request.history,
+            dt_name=request.dt_name,
+            y_name=request.y_name,
+            freq=request.freq,
+            confidence_level=request.confidence_level,
+            xgb_params=request.uniqueParams
+        )
+    elif request.model == "SARIMA":
+        order = (request.uniqueParams.get("p", 1),
+                 request.uniqueParams.get("d", 1),
+                 request.uniqueParams.get("q", 1))
+        seasonal_order = (
+            request.uniqueParams.get("P", 1),
+            request.uniqueParams.get("D", 1),
+            request.uniqueParams.get("Q", 1),
+            request.uniqueParams.get("s", 2)
+        )
+        artifacts = {}
+        forecast_all, forecast_train, forecast_test, forecast_horizon = sarima_forecast(
+            df,
+            horizon=request.horizon,
+            test_size=request.history,
+            dt_name=request.dt_name,
+            y_name=request.y_name,
+            freq=request.freq,
+            confidence_level=request.confidence_level,
+            order=order,
+            seasonal_order=seasonal_order,
+            refit_full=bool(request.uniqueParams.get("refit_full", False)),
+            refit_every=request.uniqueParams.get("refit_every"),
+            long_series=request.uniqueParams.get("long_series"),
+            window=request.uniqueParams.get("window", 5000),
+            auto_params=request.uniqueParams if request.uniqueParams.get("auto") else None,
+            artifacts=artifacts
+        )
+    else:
+        raise HTTPException(status_code=400, detail="Unsupported model")
+
+    result = {
+        "forecast_all": forecast_all.to_dict(orient="records"),
+        "forecast_train": forecast_train.to_dict(orient="records"),
+        "forecast_test": forecast_test.to_dict(orient="records"),
+        "forecast_horizon": forecast_horizon.to_dict(orient="records")
+    }
+    if artifacts and artifacts["model"].get("search"):
+        result["sarima_search"] = artifacts["model"]["search"]
+    return result
 
 
 @forecast_router.post("/forecast_demo")
-async def forecast_endpoint(request: ForecastRequest):
+async def forecast_demo_endpoint(request: ForecastRequest):
+    """
+    Синхронный прогноз без очереди. Расчёт идёт в пуле потоков; одинаковые запросы,
+    пришедшие во время расчёта, ждут его результат, готовые результаты отдаются из кэша.
+    """
     try:
-        df = pd.DataFrame(request.data)
-        if request.model == "Prophet":
-            forecast_all, forecast_train, forecast_test, forecast_horizon = prophet_forecast(
-                df,
-                horizon=request.horizon,
-                test_size=request.history,
-                dt_name=request.dt_name,
-                y_name=request.y_name,
-                freq=request.freq,
-                confidence_level=request.confidence_level
-            )
-        elif request.model == "XGBoost":
-            forecast_all, forecast_train, forecast_test, forecast_horizon = xgboost_forecast(
-                df,
-                horizon=request.horizon,
-                test_size=request.history,
-                dt_name=request.dt_name,
-                y_name=request.y_name,
-                freq=request.freq,
-                confidence_level=request.confidence_level,
-                xgb_params=request.uniqueParams
-            )
-        elif request.model == "SARIMA":
-            order = (request.uniqueParams.get("p", 1),
-                     request.uniqueParams.get("d", 1),
-                     request.uniqueParams.get("q", 1))
-            seasonal_order = (
-                request.uniqueParams.get("P", 1),
-                request.uniqueParams.get("D", 1),
-                request.uniqueParams.get("Q", 1),
-                request.uniqueParams.get("s", 2)
-            )
-            forecast_all, forecast_train, forecast_test, forecast_horizon = sarima_forecast(
-                df,
-                horizon=request.horizon,
-                test_size=request.history,
-                dt_name=request.dt_name,
-                y_name=request.y_name,
-                freq=request.freq,
-                confidence_level=request.confidence_level,
-                order=order,
-                seasonal_order=seasonal_order
-            )
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported model")
-
-        return {
-            "forecast_all": forecast_all.to_dict(orient="records"),
-            "forecast_train": forecast_train.to_dict(orient="records"),
-            "forecast_test": forecast_test.to_dict(orient="records"),
-            "forecast_horizon": forecast_horizon.to_dict(orient="records")
-        }
+        if request.force:
+            return await run_in_threadpool(compute_demo_forecast, request)
+        fingerprint = await forecast_fingerprint(request)
+        return await demo_coalescer.run(
+            fingerprint, lambda: run_in_threadpool(compute_demo_forecast, request))
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
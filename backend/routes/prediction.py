@@ -1,12 +1,14 @@
 import os
 import pandas as pd
 import aiofiles
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from utils.auth import get_current_user
 from models.user import User
 from services.history_service import record_history_bg
+from services.dataset_store import DatasetStore
 from fastapi.concurrency import run_in_threadpool
 from statsmodels.tsa.stattools import adfuller, kpss
 from statsmodels.stats.diagnostic import acorr_ljungbox
@@ -17,14 +19,37 @@ logger = logging.getLogger("prediction")
 logger.setLevel(logging.DEBUG)
 
 prediction_router = APIRouter()
+dataset_store = DatasetStore()
+
+
+def load_dataset(dataset_id: str, current_user: User, columns: Optional[list] = None) -> pd.DataFrame:
+    """
+    Загружает набор данных из хранилища с проверкой владельца.
+    """
+    try:
+        meta = dataset_store.meta(dataset_id)
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail="Набор данных не найден")
+    if meta.get("owner_id") is not None and meta["owner_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Набор данных не найден")
+    try:
+        return dataset_store.load(dataset_id, columns)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @prediction_router.post("/upload")
 async def upload_file(
         background_tasks: BackgroundTasks,
         file: UploadFile = File(...),
+        include_data: bool = True,
         db: AsyncSession = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
+    """
+    Сохраняет файл в хранилище наборов данных и возвращает dataset_id, по которому
+    его принимают эндпоинты прогноза, заполнения пропусков и тестов.
+    include_data=false отключает возврат всего файла в full_data.
+    """
     upload_folder = "./uploads"
     if not os.path.exists(upload_folder):
         os.makedirs(upload_folder)
@@ -54,32 +79,49 @@ async def upload_file(
         logger.error(f"Ошибка обработки файла: {e}")
         raise HTTPException(status_code=400, detail="Ошибка обработки файла. Проверьте корректность формата.")
 
+    os.remove(file_path)
+
+    try:
+        dataset_id = await run_in_threadpool(dataset_store.put, data, current_user.id)
+    except Exception as e:
+        logger.error(f"Ошибка сохранения набора данных: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка сохранения набора данных")
+
     df_head = data.head().to_dict(orient="records")
-    full_data = data.to_dict(orient="records")
     columns = list(data.columns)
 
-    os.remove(file_path)
-
     background_tasks.add_task(record_history_bg, current_user.id, f"Загружен файл: {file.filename}")
 
-    return {"df_head": df_head, "full_data": full_data, "columns": columns}
+    result = {"dataset_id": dataset_id, "df_head": df_head, "columns": columns, "rows": len(data)}
+    if include_data:
+        result["full_data"] = data.to_dict(orient="records")
+    return result
 
 @prediction_router.post("/imputation")
 async def imputation_endpoint(
     payload: dict,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    """
+    Заполнение пропусков. Данные передаются записями в data или ссылкой dataset_id;
+    результат сохраняется новым набором, его идентификатор — в заголовке X-Dataset-Id.
+    """
     try:
         data_records = payload.get("data")
+        dataset_id = payload.get("dataset_id")
         date_column = payload.get("date_column")
         value_column = payload.get("value_column")
         method = payload.get("imputationMethod", "linear")
         freq = payload.get("imputationFrequency", "D")
         constant_val = payload.get("imputationConstant", 0)
-        if not data_records or not date_column or not value_column:
+        if not (data_records or dataset_id) or not date_column or not value_column:
             raise HTTPException(status_code=400, detail="Неверный формат данных")
-        df = pd.DataFrame(data_records)
+        if dataset_id:
+            df = load_dataset(dataset_id, current_user)
+        else:
+            df = pd.DataFrame(data_records)
         df[date_column] = pd.to_datetime(df[date_column])
         df = df.sort_values(by=date_column)
         df = df.set_index(date_column)
@@ -96,7 +138,10 @@ async def imputation_endpoint(
             df[value_column] = df[value_column].fillna(constant_val)
         else:
             df[value_column] = df[value_column].fillna(method='ffill')
+        response.headers["X-Dataset-Id"] = await run_in_threadpool(dataset_store.put, df, current_user.id)
         return df.to_dict(orient="records")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка заполнения пропусков: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -110,6 +155,9 @@ async def timeseries_tests(
     logger.debug(f"Вызов /timeseries_tests от пользователя: {current_user.id}")
     
     values = payload.get("values")
+    if payload.get("dataset_id") and payload.get("value_column"):
+        column = payload["value_column"]
+        values = load_dataset(payload["dataset_id"], current_user, [column])[column].dropna().tolist()
     if not values or not isinstance(values, list):
         raise HTTPException(status_code=400, detail="Неверный формат данных")
     
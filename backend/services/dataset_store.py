@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import DATASET_STORE_DIR, DATASET_STORE_MAX_MB, DATASET_STORE_TTL
+
+DATASET_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _update_digest(digest, entry: dict, array: np.ndarray) -> None:
+    digest.update(f"{entry['name']}|{entry['kind']}|{array.dtype.str}|{array.shape}".encode("utf-8"))
+    digest.update(np.ascontiguousarray(array).tobytes())
+
+
+class DatasetStore:
+    """
+    Серверное хранилище загруженных наборов данных: файл загружается один раз,
+    дальше эндпоинты и воркеры Celery ссылаются на него по dataset_id.
+    Каждый столбец хранится отдельным .npy-файлом (числа — в своём типе, даты — int64 нс,
+    строки — юникод фиксированной ширины с маской пропусков), описание столбцов — в meta.json.
+    Файлы открываются через np.load(mmap_mode='r'), поэтому чтение не разбирает JSON
+    и затрагивает только нужные столбцы.
+    dataset_id выводится из хэша содержимого и владельца: повторная загрузка тех же данных
+    тем же пользователем возвращает существующий набор. Время последнего доступа хранится
+    в mtime meta.json; наборы старше ttl секунд и давно не использованные наборы сверх
+    max_bytes удаляются (evict).
+    """
+
+    def __init__(self, root: str = DATASET_STORE_DIR, max_bytes: int = DATASET_STORE_MAX_MB * 1024 * 1024,
+                 ttl: float = DATASET_STORE_TTL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, dataset_id: str) -> str:
+        if not DATASET_ID_PATTERN.match(dataset_id or ""):
+            raise ValueError(f"Некорректный идентификатор набора данных: {dataset_id}")
+        return os.path.join(self.root, dataset_id)
+
+    def _touch(self, dataset_id: str) -> None:
+        try:
+            os.utime(os.path.join(self._path(dataset_id), "meta.json"))
+        except FileNotFoundError:
+            pass
+
+    def put(self, df: pd.DataFrame, owner_id: Optional[int] = None) -> str:
+        """
+        Сохраняет DataFrame и возвращает dataset_id. Если набор с тем же содержимым
+        и владельцем уже есть, он переиспользуется (обновляется только время доступа).
+        Запись идёт во временный каталог, который затем атомарно переименовывается;
+        после записи вытесняются устаревшие наборы.
+        """
+        digest = hashlib.sha256()
+        columns, arrays = [], []
+        for i, name in enumerate(df.columns):
+            series = df[name]
+            entry = {"name": str(name), "file": f"{i}.npy"}
+            mask = None
+            if pd.api.types.is_datetime64_any_dtype(series):
+                entry["kind"] = "datetime"
+                values = series.dt.tz_localize(None) if series.dt.tz is not None else series
+                array = values.to_numpy(dtype="datetime64[ns]").view(np.int64)
+            elif pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+                entry["kind"] = "numeric"
+                array = series.to_numpy()
+            else:
+                entry["kind"] = "string"
+                mask = series.isna().to_numpy()
+                array = series.astype(str).to_numpy(dtype=str)
+                entry["mask"] = f"{i}.mask.npy"
+                digest.update(mask.tobytes())
+            array = np.ascontiguousarray(array)
+            _update_digest(digest, entry, array)
+            columns.append(entry)
+            arrays.append((entry, array, mask))
+        content_hash = digest.hexdigest()
+        dataset_id = hashlib.sha256(f"{content_hash}|{owner_id}".encode("utf-8")).hexdigest()[:32]
+        if self.exists(dataset_id):
+            self._touch(dataset_id)
+            return dataset_id
+
+        tmp_dir = tempfile.mkdtemp(dir=self.root, prefix=".tmp_")
+        try:
+            for entry, array, mask in arrays:
+                if mask is not None:
+                    np.save(os.path.join(tmp_dir, entry["mask"]), mask)
+                np.save(os.path.join(tmp_dir, entry["file"]), array)
+            meta = {"rows": int(len(df)), "columns": columns, "owner_id": owner_id,
+                    "content_hash": content_hash}
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            try:
+                os.replace(tmp_dir, self._path(dataset_id))
+            except OSError:
+                # Тот же набор одновременно сохранил другой процесс
+                if not self.exists(dataset_id):
+                    raise
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.evict(keep=dataset_id)
+        return dataset_id
+
+    def meta(self, dataset_id: str) -> dict:
+        """
+        Описание набора: число строк, столбцы, владелец. FileNotFoundError, если набора нет.
+        """
+        with open(os.path.join(self._path(dataset_id), "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def content_hash(self, dataset_id: str) -> str:
+        """
+        Хэш содержимого набора (имена, типы и значения столбцов): одинаковые данные,
+        загруженные несколько раз, дают один хэш. Для наборов, сохранённых до появления
+        поля content_hash, хэш вычисляется по файлам.
+        """
+        meta = self.meta(dataset_id)
+        if meta.get("content_hash"):
+            return meta["content_hash"]
+        path = self._path(dataset_id)
+        digest = hashlib.sha256()
+        for entry in meta["columns"]:
+            if "mask" in entry:
+                digest.update(np.load(os.path.join(path, entry["mask"])).tobytes())
+            _update_digest(digest, entry, np.load(os.path.join(path, entry["file"]), mmap_mode="r"))
+        return digest.hexdigest()
+
+    def exists(self, dataset_id: str) -> bool:
+        try:
+            return os.path.exists(os.path.join(self._path(dataset_id), "meta.json"))
+        except ValueError:
+            return False
+
+    def load(self, dataset_id: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Загружает набор (или только столбцы columns). Числовые столбцы и даты
+        отображаются в память без копирования; строки восстанавливаются с пропусками.
+        """
+        path = self._path(dataset_id)
+        meta = self.meta(dataset_id)
+        self._touch(dataset_id)
+        entries = meta["columns"]
+        if columns is not None:
+            wanted = set(columns)
+            missing = wanted - {entry["name"] for entry in entries}
+            if missing:
+                raise KeyError(f"В наборе {dataset_id} нет столбцов: {sorted(missing)}")
+            entries = [entry for entry in entries if entry["name"] in wanted]
+        data = {}
+        for entry in entries:
+            array = np.load(os.path.join(path, entry["file"]), mmap_mode="r")
+            if entry["kind"] == "datetime":
+                data[entry["name"]] = pd.DatetimeIndex(array.view("datetime64[ns]"))
+            elif entry["kind"] == "string":
+                values = np.asarray(array).astype(object)
+                values[np.load(os.path.join(path, entry["mask"]))] = None
+                data[entry["name"]] = values
+            else:
+                data[entry["name"]] = array
+        return pd.DataFrame(data, copy=False)
+
+    def delete(self, dataset_id: str) -> None:
+        shutil.rmtree(self._path(dataset_id), ignore_errors=True)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Удаляет наборы, к которым не обращались дольше ttl секунд, затем — в порядке давности
+        доступа, пока общий размер превышает max_bytes. Набор keep (только что сохранённый)
+        не удаляется. Временные каталоги прерванных записей удаляются по тому же ttl.
+        """
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if name.startswith(".tmp_"):
+                    if now - os.stat(path).st_mtime > self.ttl:
+                        shutil.rmtree(path, ignore_errors=True)
+                    continue
+                if not DATASET_ID_PATTERN.match(name):
+                    continue
+                accessed = os.stat(os.path.join(path, "meta.json")).st_mtime
+                size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            except FileNotFoundError:
+                continue
+            entries.append((accessed, size, name))
+        total = sum(size for _, size, _ in entries)
+        for accessed, size, name in sorted(entries):
+            if name == keep:
+                continue
+            if now - accessed <= self.ttl and total <= self.max_bytes:
+                break
+            self.delete(name)
+            total -= size
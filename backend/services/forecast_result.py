@@ -0,0 +1,177 @@
+import base64
+import json
+import zlib
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import zstandard
+except ImportError:  # zstd необязателен: без пакета результаты сжимаются zlib
+    zstandard = None
+
+# Тип содержимого компактного (колоночного) результата прогноза
+COLUMNAR_MEDIA_TYPE = "application/vnd.timeflow.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+RESULT_FORMAT = "columnar"
+RESULT_FORMAT_VERSION = 1
+
+# Сжатие результата: имя -> (сжать, распаковать)
+COMPRESSIONS = {"zlib": (lambda data: zlib.compress(data, 6), zlib.decompress)}
+if zstandard is not None:
+    COMPRESSIONS["zstd"] = (lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+                            lambda data: zstandard.ZstdDecompressor().decompress(data))
+
+
+def _columns(df: pd.DataFrame) -> dict:
+    """
+    DataFrame -> словарь столбцов: даты — миллисекунды эпохи (int), числа — списки float
+    с None вместо NaN/inf, строки — как есть.
+    """
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if col == "ds" or pd.api.types.is_datetime64_any_dtype(series):
+            values = pd.to_datetime(series).to_numpy(dtype="datetime64[ms]").astype(np.int64)
+            out[col] = values.tolist()
+        elif pd.api.types.is_numeric_dtype(series):
+            values = series.to_numpy(dtype=np.float64)
+            finite = np.isfinite(values)
+            out[col] = [float(v) if ok else None for v, ok in zip(values.tolist(), finite.tolist())]
+        else:
+            out[col] = series.where(series.notna(), None).tolist()
+    return out
+
+
+def _index_range(all_ds: np.ndarray, part: pd.DataFrame) -> Optional[Tuple[int, int]]:
+    """
+    Диапазон [start, stop) строк forecast_all, совпадающих с частью part
+    (по датам и порядку), или None, если часть не является непрерывным отрезком.
+    """
+    if part.empty:
+        return (0, 0)
+    part_ds = pd.to_datetime(part["ds"]).to_numpy(dtype="datetime64[ms]")
+    start = int(np.searchsorted(all_ds, part_ds[0]))
+    stop = start + len(part_ds)
+    if stop <= len(all_ds) and np.array_equal(all_ds[start:stop], part_ds):
+        return (start, stop)
+    return None
+
+
+def pack_forecast_result(forecast_all: pd.DataFrame, forecast_train: pd.DataFrame,
+                         forecast_test: pd.DataFrame, forecast_horizon: pd.DataFrame,
+                         extra: Optional[dict] = None, compression: Optional[str] = None) -> dict:
+    """
+    Компактный результат прогноза: столбцы вместо записей, model_name — одно поле,
+    train/test — диапазоны индексов в forecast_all. Если часть не содержится в forecast_all
+    отрезком (например, у SARIMA тест не входит в историю), она передаётся своими столбцами.
+    extra — дополнительные поля результата. При заданном compression результат
+    сжимается целиком (compress_forecast_result).
+    """
+    model_name = None
+    for df in (forecast_all, forecast_horizon):
+        if "model_name" in df.columns and len(df):
+            model_name = str(df["model_name"].iloc[0])
+            break
+
+    def strip(df: pd.DataFrame) -> pd.DataFrame:
+        return df.drop(columns=["model_name"], errors="ignore").reset_index(drop=True)
+
+    forecast_all = strip(forecast_all)
+    all_ds = pd.to_datetime(forecast_all["ds"]).to_numpy(dtype="datetime64[ms]") \
+        if "ds" in forecast_all.columns else np.array([], dtype="datetime64[ms]")
+    result = {
+        "format": RESULT_FORMAT,
+        "version": RESULT_FORMAT_VERSION,
+        "ds_unit": "ms",
+        "model_name": model_name,
+        "forecast_all": _columns(forecast_all),
+        "forecast_horizon": _columns(strip(forecast_horizon)),
+    }
+    for name, part in (("train", forecast_train), ("test", forecast_test)):
+        part = strip(part)
+        index_range = _index_range(all_ds, part) if "ds" in part.columns or part.empty else None
+        if index_range is not None:
+            result[name] = list(index_range)
+        else:
+            result[f"forecast_{name}"] = _columns(part)
+    result.update(extra or {})
+    return compress_forecast_result(result, compression)
+
+
+def is_columnar(result) -> bool:
+    return isinstance(result, dict) and result.get("format") == RESULT_FORMAT
+
+
+def compress_forecast_result(result: dict, compression: Optional[str]) -> dict:
+    """
+    Сжатый колоночный результат: JSON результата, сжатый zlib или zstd (если установлен
+    zstandard, иначе — zlib), в base64 — такой результат сохраняется любым сериализатором
+    Celery. Без compression результат возвращается как есть.
+    """
+    if not compression:
+        return result
+    if compression not in COMPRESSIONS:
+        print(f"Сжатие {compression} недоступно, результат сжимается zlib")
+        compression = "zlib"
+    compress = COMPRESSIONS[compression][0]
+    data = compress(json.dumps(result, separators=(",", ":")).encode("utf-8"))
+    return {"format": RESULT_FORMAT, "version": RESULT_FORMAT_VERSION,
+            "compression": compression, "data": base64.b64encode(data).decode("ascii")}
+
+
+def decompress_forecast_result(result):
+    """
+    Распаковка результата, сжатого compress_forecast_result; прочие значения возвращаются как есть.
+    """
+    if not is_columnar(result) or "compression" not in result:
+        return result
+    if result["compression"] not in COMPRESSIONS:
+        raise ValueError(f"Неизвестное сжатие результата: {result['compression']}")
+    decompress = COMPRESSIONS[result["compression"]][1]
+    return json.loads(decompress(base64.b64decode(result["data"])).decode("utf-8"))
+
+
+def _records(columns: dict, model_name: Optional[str], start: int = 0, stop: Optional[int] = None) -> list:
+    names = list(columns)
+    if not names:
+        return []
+    length = len(columns[names[0]])
+    stop = length if stop is None else stop
+    records = []
+    for i in range(start, stop):
+        row = {}
+        for name in names:
+            value = columns[name][i]
+            row[name] = pd.Timestamp(value, unit="ms") if name == "ds" and value is not None else value
+        if model_name is not None:
+            row["model_name"] = model_name
+        records.append(row)
+    return records
+
+
+def unpack_forecast_result(result: dict) -> dict:
+    """
+    Колоночный результат -> прежний формат (четыре списка записей) для клиентов,
+    которые не запрашивают колоночный формат. Прочие поля результата сохраняются.
+    """
+    if not is_columnar(result):
+        return result
+    result = decompress_forecast_result(result)
+    model_name = result.get("model_name")
+    all_columns = result["forecast_all"]
+    out = {
+        "forecast_all": _records(all_columns, model_name),
+        "forecast_horizon": _records(result["forecast_horizon"], model_name),
+    }
+    for name in ("train", "test"):
+        if name in result:
+            start, stop = result[name]
+            out[f"forecast_{name}"] = _records(all_columns, model_name, start, stop)
+        else:
+            out[f"forecast_{name}"] = _records(result[f"forecast_{name}"], model_name)
+    skip = {"format", "version", "ds_unit", "model_name", "train", "test",
+            "forecast_all", "forecast_train", "forecast_test", "forecast_horizon"}
+    out.update({key: value for key, value in result.items() if key not in skip})
+    return out
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from typing import Any, Optional
+
+import pandas as pd
+
+from config import MODEL_REGISTRY_DIR, MODEL_REGISTRY_MAX_MB
+
+
+def make_registry_key(model: str, params: dict, df: pd.DataFrame, freq: str, **extra) -> str:
+    """
+    Строит ключ артефакта: SHA-256 от модели, параметров, частоты, дополнительных полей
+    (имена столбцов, размер теста и т.п.) и содержимого данных.
+    Параметры сериализуются в канонический JSON, данные хэшируются построчно средствами pandas.
+    """
+    header = json.dumps(
+        {"model": model, "params": params, "freq": freq, **extra},
+        sort_keys=True, default=str
+    )
+    digest = hashlib.sha256(header.encode("utf-8"))
+    digest.update(",".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def make_lineage_key(model: str, params: dict, freq: str, **extra) -> str:
+    """
+    Ключ «линии» модели без учёта содержимого данных: по нему хранится последнее обученное
+    состояние, которое можно дополнить новыми наблюдениями вместо обучения с нуля.
+    """
+    header = json.dumps(
+        {"lineage": True, "model": model, "params": params, "freq": freq, **extra},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(header.encode("utf-8")).hexdigest()
+
+
+class ModelRegistry:
+    """
+    Файловое хранилище обученных артефактов (state_dict + MinMaxScaler, результаты SARIMAX,
+    JSON модели Prophet, бустеры XGBoost) с ограничением по размеру и LRU-вытеснением.
+    Каждый артефакт — отдельный pickle-файл; время последнего доступа хранится в mtime файла,
+    поэтому хранилище можно разделять между процессами воркера.
+    """
+
+    def __init__(self, root: str = MODEL_REGISTRY_DIR, max_bytes: int = MODEL_REGISTRY_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Возвращает артефакт по ключу или None. Обращение обновляет mtime файла (LRU).
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                artifact = pickle.load(f)
+            os.utime(path)
+            return artifact
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Не удалось загрузить артефакт {key}: {e}")
+            return None
+
+    def put(self, key: str, artifact: Any) -> None:
+        """
+        Атомарно сохраняет артефакт (запись во временный файл и os.replace),
+        затем вытесняет давно не использованные артефакты сверх лимита.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Удаляет артефакты в порядке давности доступа, пока общий размер превышает лимит.
+        """
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            total -= size
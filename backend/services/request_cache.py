@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from config import REQUEST_CACHE_REDIS_URL, REQUEST_CACHE_TTL, REQUEST_CACHE_SIZE
+
+
+def request_fingerprint(fields: dict, data_digest: str) -> str:
+    """
+    Канонический хэш запроса прогноза: параметры сериализуются в JSON с сортировкой ключей,
+    данные представлены своим хэшем (содержимое набора или записей, а не dataset_id).
+    """
+    header = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(f"{header}|{data_digest}".encode("utf-8")).hexdigest()
+
+
+def records_digest(data: list) -> str:
+    """
+    Хэш данных, переданных записями.
+    """
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """
+    LRU-кэш в памяти процесса с ограничением по размеру и времени жизни записей.
+    """
+
+    def __init__(self, maxsize: int = REQUEST_CACHE_SIZE, ttl: float = REQUEST_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class InflightCoalescer:
+    """
+    Объединение одинаковых запросов внутри процесса: пока вычисление по ключу идёт,
+    повторные запросы ждут его результат; готовые результаты берутся из TTLCache.
+    """
+
+    def __init__(self, cache: Optional[TTLCache] = None):
+        self.cache = cache or TTLCache()
+        self._inflight: dict = {}
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # shield: отключение одного клиента не отменяет вычисление для остальных
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.cache.put(key, task.result())
+
+
+class TaskDeduplicator:
+    """
+    Дедупликация задач Celery по отпечатку запроса через Redis: task_id выделяется заранее
+    и записывается SET NX с TTL, поэтому из одновременных одинаковых запросов задачу ставит
+    только первый, остальные получают его task_id (в том числе пока результат хранится в backend).
+    Упавшие и отменённые задачи не переиспользуются. При недоступности Redis запросы
+    не объединяются.
+    """
+
+    KEY_PREFIX = "forecast:request:"
+
+    def __init__(self, url: str = REQUEST_CACHE_REDIS_URL, ttl: int = REQUEST_CACHE_TTL):
+        self.ttl = int(ttl)
+        self.redis = aioredis.from_url(url, decode_responses=True, socket_connect_timeout=1)
+
+    async def submit(self, fingerprint: str, submit: Callable[[str], None],
+                     is_reusable: Callable[[str], Awaitable[bool]]) -> Tuple[str, bool]:
+        """
+        Возвращает (task_id, deduplicated). submit(task_id) ставит задачу с заданным id,
+        is_reusable(task_id) проверяет, что существующую задачу можно отдать повторно.
+        """
+        key = self.KEY_PREFIX + fingerprint
+        task_id = uuid.uuid4().hex
+        owned = False
+        try:
+            for _ in range(2):
+                if await self.redis.set(key, task_id, nx=True, ex=self.ttl):
+                    owned = True
+                    break
+                existing = await self.redis.get(key)
+                if existing and await is_reusable(existing):
+                    return existing, True
+                # Задача упала или отменена: освобождаем ключ (только если он не сменился)
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    await pipe.watch(key)
+                    if await pipe.get(key) == existing:
+                        pipe.multi()
+                        pipe.delete(key)
+                        await pipe.execute()
+                    else:
+                        await pipe.unwatch()
+        except Exception as e:
+            print(f"Дедупликация запросов недоступна: {e}")
+            submit(task_id)
+            return task_id, False
+        try:
+            submit(task_id)
+        except Exception:
+            # Задача не поставлена: ключ не должен указывать на несуществующий task_id
+            if owned:
+                try:
+                    await self.redis.delete(key)
+                except Exception:
+                    pass
+            raise
+        return task_id, False
@@ -0,0 +1,50 @@
+from typing import Optional
+
+import redis.asyncio as aioredis
+from redis import Redis
+
+from config import TASK_CANCEL_REDIS_URL, REQUEST_CACHE_TTL
+
+
+class TaskCancelFlags:
+    """
+    Флаги отмены задач прогнозирования в Redis (ключ forecast:cancel:<task_id> с TTL).
+    API выставляет флаг асинхронно (request), воркер опрашивает его синхронно
+    (is_requested_sync) из циклов обучения через forecast.cancellation.
+    Клиенты создаются лениво: синхронный — в процессе воркера после fork.
+    """
+
+    KEY_PREFIX = "forecast:cancel:"
+
+    def __init__(self, url: str = TASK_CANCEL_REDIS_URL, ttl: int = REQUEST_CACHE_TTL):
+        self.url = url
+        self.ttl = int(ttl)
+        self._redis: Optional[aioredis.Redis] = None
+        self._redis_sync: Optional[Redis] = None
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.url, decode_responses=True, socket_connect_timeout=1)
+        return self._redis
+
+    @property
+    def redis_sync(self) -> Redis:
+        if self._redis_sync is None:
+            self._redis_sync = Redis.from_url(self.url, decode_responses=True,
+                                               socket_connect_timeout=1, socket_timeout=1)
+        return self._redis_sync
+
+    async def request(self, task_id: str) -> None:
+        """
+        Выставляет флаг отмены задачи.
+        """
+        await self.redis.set(self.KEY_PREFIX + task_id, 1, ex=self.ttl)
+
+    async def is_requested(self, task_id: str) -> bool:
+        return bool(await self.redis.exists(self.KEY_PREFIX + task_id))
+
+    def is_requested_sync(self, task_id: Optional[str]) -> bool:
+        if not task_id:
+            return False
+        return bool(self.redis_sync.exists(self.KEY_PREFIX + task_id))
@@ -0,0 +1,142 @@
+import asyncio
+from typing import AsyncIterator, Dict, Optional, Set
+
+import redis.asyncio as aioredis
+from celery import states
+
+from config import CELERY_RESULT_BACKEND
+from services.forecast_result import decompress_forecast_result
+
+# Состояния, после которых задача больше не меняется
+READY_STATES = states.READY_STATES
+
+
+class TaskStatusService:
+    """
+    Асинхронное чтение статуса задач Celery прямо из Redis result backend:
+    один общий пул соединений для GET и одно общее pub/sub-соединение, через которое
+    backend публикует каждое сохранённое состояние (канал = ключ celery-task-meta-<id>).
+    Ожидающие клиенты подписываются на канал своей задачи, а единственный читатель
+    раздаёт сообщения их очередям, поэтому long-poll и SSE не опрашивают Redis в цикле.
+    """
+
+    def __init__(self, celery_app, url: str = CELERY_RESULT_BACKEND):
+        self.backend = celery_app.backend
+        self.redis = aioredis.from_url(url, decode_responses=False)
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._waiters: Dict[bytes, Set[asyncio.Queue]] = {}
+        self._lock = asyncio.Lock()
+
+    def _key(self, task_id: str) -> bytes:
+        key = self.backend.get_key_for_task(task_id)
+        return key if isinstance(key, bytes) else key.encode()
+
+    def _decode(self, task_id: str, payload) -> dict:
+        if payload is None:
+            return {"task_id": task_id, "status": states.PENDING, "result": None}
+        meta = self.backend.decode_result(payload)
+        # Сжатый результат прогноза распаковывается здесь: маршруты получают обычный колоночный
+        return {"task_id": task_id, "status": meta["status"],
+                "result": decompress_forecast_result(meta.get("result"))}
+
+    async def get(self, task_id: str) -> dict:
+        """
+        Текущее состояние задачи: {'task_id', 'status', 'result'} (для FAILURE result — исключение).
+        """
+        return self._decode(task_id, await self.redis.get(self._key(task_id)))
+
+    async def _subscribe(self, channel: bytes) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        async with self._lock:
+            if self._pubsub is None:
+                self._pubsub = self.redis.pubsub()
+            waiters = self._waiters.setdefault(channel, set())
+            if not waiters:
+                await self._pubsub.subscribe(channel)
+            waiters.add(queue)
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read_loop())
+        return queue
+
+    async def _unsubscribe(self, channel: bytes, queue: asyncio.Queue) -> None:
+        async with self._lock:
+            waiters = self._waiters.get(channel)
+            if waiters is None:
+                return
+            waiters.discard(queue)
+            if not waiters:
+                del self._waiters[channel]
+                try:
+                    await self._pubsub.unsubscribe(channel)
+                except Exception:
+                    pass
+
+    async def _read_loop(self) -> None:
+        # Единственный читатель общего pub/sub-соединения: раздаёт сообщения очередям подписчиков.
+        # При обрыве соединения подписки восстанавливаются, подписчики получают None
+        # (сигнал перечитать состояние через GET)
+        while self._waiters:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as e:
+                print(f"Ошибка чтения статусов задач из Redis: {e}")
+                async with self._lock:
+                    self._pubsub = self.redis.pubsub()
+                    for channel, waiters in self._waiters.items():
+                        for queue in waiters:
+                            queue.put_nowait(None)
+                    try:
+                        if self._waiters:
+                            await self._pubsub.subscribe(*self._waiters)
+                    except Exception:
+                        await asyncio.sleep(1.0)
+                continue
+            if message is None:
+                continue
+            for queue in list(self._waiters.get(message["channel"], ())):
+                queue.put_nowait(message["data"])
+
+    async def watch(self, task_id: str, since: Optional[str] = None,
+                    heartbeat: Optional[float] = None) -> AsyncIterator[Optional[dict]]:
+        """
+        Поток состояний задачи: сначала текущее (если оно отличается от since), затем каждое
+        сохранённое backend'ом, до завершения задачи. Если heartbeat задан и за это время
+        изменений не было, выдаётся None (для keep-alive в SSE).
+        """
+        channel = self._key(task_id)
+        queue = await self._subscribe(channel)
+        try:
+            # Подписка оформлена до чтения: изменение между GET и ожиданием не потеряется
+            current = await self.get(task_id)
+            if current["status"] != since:
+                yield current
+            while current["status"] not in READY_STATES:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if payload is None:
+                    # Соединение pub/sub восстанавливалось: состояние перечитывается
+                    previous, current = current, await self.get(task_id)
+                    if current["status"] == previous["status"]:
+                        continue
+                else:
+                    current = self._decode(task_id, payload)
+                yield current
+        finally:
+            await self._unsubscribe(channel, queue)
+
+    async def wait(self, task_id: str, since: Optional[str] = None, timeout: float = 25.0) -> dict:
+        """
+        Long-poll: возвращает состояние, как только оно отличается от since
+        (или сразу, если уже отличается); по истечении timeout — текущее состояние.
+        """
+        updates = self.watch(task_id, since=since)
+        try:
+            return await asyncio.wait_for(updates.__anext__(), timeout=timeout)
+        except (asyncio.TimeoutError, StopAsyncIteration):
+            return await self.get(task_id)
+        finally:
+            await updates.aclose()
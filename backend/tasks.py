@@ -2,12 +2,24 @@
 import os
 import pandas as pd
 from celery import Celery
+from celery.exceptions import Ignore
+from kombu import Queue
 from forecast.prophet_forecast import prophet_forecast
 from forecast.xgboost_forecast import xgboost_forecast
 from forecast.arima_forecast import sarima_forecast
 from forecast.lstm_forecast import lstm_forecast
 from forecast.gru_forecast import gru_forecast
 from forecast.transformers_forecast import transformer_forecast
+from config import (CELERY_WORKER_CONCURRENCY, CELERY_WORKER_PREFETCH_MULTIPLIER,
+                    CELERY_RESULT_SERIALIZER, CELERY_RESULT_COMPRESSION, TASK_PROGRESS_INTERVAL,
+                    TASK_CANCEL_CHECK_INTERVAL)
+from services.model_registry import ModelRegistry, make_registry_key, make_lineage_key
+from services.dataset_store import DatasetStore
+from services.forecast_result import pack_forecast_result
+from forecast.resources import thread_budget
+from forecast.progress import progress_reporting
+from forecast.cancellation import ForecastCancelled, cancellation_scope, check_cancelled
+from services.task_cancel import TaskCancelFlags
 
 # Инициализируем Celery, считывая настройки из .env
 celery_app = Celery(
@@ -15,17 +27,150 @@ celery_app = Celery(
     broker=os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0"),
     backend=os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/1")
 )
+if CELERY_WORKER_CONCURRENCY:
+    celery_app.conf.worker_concurrency = CELERY_WORKER_CONCURRENCY
+if CELERY_WORKER_PREFETCH_MULTIPLIER:
+    celery_app.conf.worker_prefetch_multiplier = CELERY_WORKER_PREFETCH_MULTIPLIER
+# Сериализация результатов в backend (msgpack — при установленном пакете). Сжатие
+# (CELERY_RESULT_COMPRESSION) выполняет pack_forecast_result: result backend Celery
+# настройку result_compression не применяет
+celery_app.conf.result_serializer = CELERY_RESULT_SERIALIZER
+celery_app.conf.accept_content = sorted({"json", CELERY_RESULT_SERIALIZER})
+celery_app.conf.result_accept_content = sorted({"json", CELERY_RESULT_SERIALIZER})
+# Задача переходит в STARTED, как только воркер её взял: ожидание в очереди отличается от выполнения
+celery_app.conf.task_track_started = True
 
+# Очереди по классам моделей: быстрые статистические модели не ждут за обучением нейросетей.
+# Воркер, запущенный без -Q, слушает все очереди; в docker-compose у каждой очереди свой воркер
+STATISTICAL_QUEUE = "forecast.statistical"
+TREE_QUEUE = "forecast.tree"
+NEURAL_QUEUE = "forecast.neural"
+MODEL_QUEUES = {
+    "Prophet": STATISTICAL_QUEUE,
+    "SARIMA": STATISTICAL_QUEUE,
+    "XGBoost": TREE_QUEUE,
+    "LSTM": NEURAL_QUEUE,
+    "GRU": NEURAL_QUEUE,
+    "Transformer": NEURAL_QUEUE,
+}
+# Приоритет задачи в API: 0..9, больше — важнее
+MAX_PRIORITY = 9
+DEFAULT_PRIORITY = 5
 
-@celery_app.task
-def run_forecast(model: str, uniqueParams: dict, horizon: int, history: int,
-                 dt_name: str, y_name: str, freq: str, confidence_level: int, data: list):
+
+def route_forecast_task(name, args, kwargs, options, task=None, **kw):
+    """
+    Маршрутизация run_forecast в очередь класса модели (первый аргумент задачи).
+    """
+    if name != "tasks.run_forecast":
+        return None
+    model = args[0] if args else kwargs.get("model")
+    return {"queue": MODEL_QUEUES.get(model, STATISTICAL_QUEUE)}
+
+
+def broker_priority(priority: int) -> int:
+    """
+    Приоритет API (больше — важнее) -> приоритет сообщения Redis-брокера,
+    у которого 0 — наивысший.
+    """
+    return MAX_PRIORITY - max(0, min(MAX_PRIORITY, int(priority)))
+
+
+celery_app.conf.task_queues = [Queue("celery")] + [
+    Queue(name) for name in sorted(set(MODEL_QUEUES.values()))
+]
+celery_app.conf.task_routes = (route_forecast_task,)
+# Приоритеты в Redis: отдельный список на каждый уровень, сначала читаются более важные
+celery_app.conf.broker_transport_options = {
+    "queue_order_strategy": "priority",
+    "priority_steps": list(range(MAX_PRIORITY + 1)),
+    "sep": ":",
+}
+celery_app.conf.task_default_priority = broker_priority(DEFAULT_PRIORITY)
+
+# Реестр обученных моделей: повторный запрос с теми же данными и параметрами
+# (отличающийся только горизонтом или уровнем доверия) обходится без обучения
+model_registry = ModelRegistry()
+
+# Хранилище наборов данных: задача получает dataset_id и отображает столбцы в память
+dataset_store = DatasetStore()
+
+# Флаги кооперативной отмены выполняемых задач (выставляются DELETE /api/forecast/{task_id})
+cancel_flags = TaskCancelFlags()
+
+# Нейросетевые модели: горизонт задаёт размер выходного слоя, поэтому входит в ключ реестра
+# (как и для прямой стратегии XGBoost, где по бустеру на каждый шаг горизонта)
+NEURAL_MODELS = {"LSTM", "GRU", "Transformer"}
+# Модели, которые умеют дополнять сохранённое состояние новыми наблюдениями без переобучения
+UPDATABLE_MODELS = {"SARIMA"}
+
+
+@celery_app.task(bind=True)
+def run_forecast(self, model: str, uniqueParams: dict, horizon: int, history: int,
+                 dt_name: str, y_name: str, freq: str, confidence_level: int, data: list,
+                 dataset_id: str = None):
     """
     Выполняет прогнозирование, выбирая нужную модель по параметру `model`.
-    Принимает данные в виде списка словарей (чтобы их можно было сериализовать).
-    Возвращает результаты прогнозирования в виде словаря.
+    Принимает данные в виде списка словарей (чтобы их можно было сериализовать)
+    или идентификатор набора в хранилище (dataset_id) — тогда данные не идут через брокер.
+    Прогноз выполняется в бюджете потоков процесса воркера (thread_budget): torch, XGBoost,
+    BLAS и OpenMP не занимают больше своей доли ядер. Бюджет возвращается в thread_budget.
+    Ход обучения (этап, фолд, эпоха, ошибки, ETA) публикуется состоянием PROGRESS
+    не чаще раза в TASK_PROGRESS_INTERVAL секунд.
+    Флаг отмены задачи проверяется между эпохами/батчами, шагами перебора SARIMA
+    и сэмплами MC Dropout: отменённая задача завершается в состоянии REVOKED.
+    Возвращает результаты прогнозирования в колоночном формате (pack_forecast_result).
     """
-    df = pd.DataFrame(data)
+    def publish_progress(meta: dict):
+        if self.request.id:
+            self.update_state(state="PROGRESS", meta={"model": model, **meta})
+
+    def is_cancelled() -> bool:
+        return cancel_flags.is_requested_sync(self.request.id)
+
+    try:
+        with thread_budget(model) as budget, progress_reporting(publish_progress, TASK_PROGRESS_INTERVAL), \
+                cancellation_scope(is_cancelled, TASK_CANCEL_CHECK_INTERVAL):
+            # Задача могла быть отменена, пока ждала в очереди
+            check_cancelled()
+            # Бюджет передаётся в результат до упаковки: сжатый результат — один конверт
+            result = forecast_model(model, uniqueParams, horizon, history, dt_name, y_name,
+                                    freq, confidence_level, data, dataset_id,
+                                    extra={"thread_budget": budget})
+    except ForecastCancelled:
+        print(f"Задача {self.request.id} отменена")
+        self.backend.mark_as_revoked(self.request.id, reason="cancelled", request=self.request)
+        # Состояние REVOKED уже записано: воркер не должен перезаписать его результатом
+        raise Ignore()
+    return result
+
+
+def forecast_model(model: str, uniqueParams: dict, horizon: int, history: int,
+                   dt_name: str, y_name: str, freq: str, confidence_level: int, data: list,
+                   dataset_id: str = None, extra: dict = None):
+    """
+    Прогноз выбранной моделью с учётом реестра моделей. extra — дополнительные поля
+    результата (например, thread_budget); они упаковываются вместе с прогнозом.
+    """
+    # Из набора в хранилище берутся только столбцы дат и цели (как в записях от клиента):
+    # набор может быть исходным файлом со всеми столбцами
+    df = dataset_store.load(dataset_id, [dt_name, y_name]) if dataset_id else pd.DataFrame(data)
+
+    registry_key = make_registry_key(
+        model, uniqueParams, df, freq,
+        dt_name=dt_name, y_name=y_name, history=history,
+        horizon=horizon if model in NEURAL_MODELS or uniqueParams.get("forecast_strategy") == "direct" else None
+    )
+    cached_model = model_registry.get(registry_key)
+    artifacts = {"model": cached_model}
+
+    # SARIMA: при промахе по точному ключу берём последнее состояние той же модели
+    # на предыдущей версии ряда, чтобы дополнить его новыми наблюдениями
+    lineage_key = None
+    if model in UPDATABLE_MODELS:
+        lineage_key = make_lineage_key(model, uniqueParams, freq, dt_name=dt_name, y_name=y_name, history=history)
+        if cached_model is None:
+            artifacts["base"] = model_registry.get(lineage_key)
 
     if model == "Prophet":
         forecast_all, forecast_train, forecast_test, forecast_horizon = prophet_forecast(
@@ -35,7 +180,9 @@ def run_forecast(model: str, uniqueParams: dict, horizon: int, history: int,
             dt_name=dt_name,
             y_name=y_name,
             freq=freq,
-            confidence_level=confidence_level
+            confidence_level=confidence_level,
+            artifacts=artifacts,
+            prophet_params=uniqueParams
         )
     elif model == "XGBoost":
         forecast_all, forecast_train, forecast_test, forecast_horizon = xgboost_forecast(
@@ -46,7 +193,8 @@ def run_forecast(model: str, uniqueParams: dict, horizon: int, history: int,
             y_name=y_name,
             freq=freq,
             confidence_level=confidence_level,
-            xgb_params=uniqueParams
+            xgb_params=uniqueParams,
+            artifacts=artifacts
         )
     elif model == "SARIMA":
         order = (uniqueParams.get("p", 1),
@@ -67,7 +215,13 @@ def run_forecast(model: str, uniqueParams: dict, horizon: int, history: int,
             freq=freq,
             confidence_level=confidence_level,
             order=order,
-            seasonal_order=seasonal_order
+            seasonal_order=seasonal_order,
+            refit_full=bool(uniqueParams.get("refit_full", False)),
+            refit_every=uniqueParams.get("refit_every"),
+            long_series=uniqueParams.get("long_series"),
+            window=uniqueParams.get("window", 5000),
+            auto_params=uniqueParams if uniqueParams.get("auto") else None,
+            artifacts=artifacts
         )
     elif model == "LSTM":
         forecast_all, forecast_train, forecast_test, forecast_horizon = lstm_forecast(
@@ -81,7 +235,8 @@ def run_forecast(model: str, uniqueParams: dict, horizon: int, history: int,
             model_params=uniqueParams,
             seasonality=uniqueParams.get("seasonality", "MS"),
             criterion=uniqueParams.get("criterion", "Huber"),
-            optimizer_type=uniqueParams.get("optimizer_type", "AdamW")
+            optimizer_type=uniqueParams.get("optimizer_type", "AdamW"),
+            artifacts=artifacts
         )
     elif model == "GRU":
         forecast_all, forecast_train, forecast_test, forecast_horizon = gru_forecast(
@@ -95,7 +250,8 @@ def run_forecast(model: str, uniqueParams: dict, horizon: int, history: int,
             model_params=uniqueParams,
             seasonality=uniqueParams.get("seasonality", "MS"),
             criterion=uniqueParams.get("criterion", "Huber"),
-            optimizer_type=uniqueParams.get("optimizer_type", "AdamW")
+            optimizer_type=uniqueParams.get("optimizer_type", "AdamW"),
+            artifacts=artifacts
         )
     elif model == "Transformer":
         forecast_all, forecast_train, forecast_test, forecast_horizon = transformer_forecast(
@@ -109,15 +265,28 @@ def run_forecast(model: str, uniqueParams: dict, horizon: int, history: int,
             model_params=uniqueParams,
             seasonality=uniqueParams.get("seasonality", "MS"),
             criterion=uniqueParams.get("criterion", "MSE"),
-            optimizer_type=uniqueParams.get("optimizer_type", "AdamW")
+            optimizer_type=uniqueParams.get("optimizer_type", "AdamW"),
+            artifacts=artifacts
         )
     else:
         raise ValueError("Unsupported model")
 
-    result = {
-        "forecast_all": forecast_all.to_dict(orient="records"),
-        "forecast_train": forecast_train.to_dict(orient="records"),
-        "forecast_test": forecast_test.to_dict(orient="records"),
-        "forecast_horizon": forecast_horizon.to_dict(orient="records")
-    }
-    return result
+    # Модель, обучение которой сокращено бюджетом времени (truncated), в реестр не попадает:
+    # иначе недообученная модель отдавалась бы по этому ключу и после освобождения воркера.
+    # Артефакт Prophet — строка JSON (model_to_json), признак есть только у словарей
+    if isinstance(artifacts.get("model"), dict) and artifacts["model"].get("truncated"):
+        print("Обучение сокращено бюджетом времени: модель не сохраняется в реестр")
+    elif cached_model is None and artifacts.get("model") is not None:
+        try:
+            model_registry.put(registry_key, artifacts["model"])
+            if lineage_key is not None:
+                model_registry.put(lineage_key, artifacts["model"])
+        except Exception as e:
+            print(f"Не удалось сохранить модель в реестр: {e}")
+
+    extra = dict(extra or {})
+    # Порядки, выбранные автоматическим подбором SARIMA
+    if model == "SARIMA" and artifacts.get("model") and artifacts["model"].get("search"):
+        extra["sarima_search"] = artifacts["model"]["search"]
+    return pack_forecast_result(forecast_all, forecast_train, forecast_test, forecast_horizon,
+                                extra=extra, compression=CELERY_RESULT_COMPRESSION)
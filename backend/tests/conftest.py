@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули бэкенда импортируются от корня backend (как в приложении и воркере Celery)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
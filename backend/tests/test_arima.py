@@ -0,0 +1,199 @@
+import pickle
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+import forecast.arima_forecast as arima_forecast
+from forecast.arima_forecast import auto_sarima_order, sarima_forecast
+
+ORDER, SEASONAL_ORDER = (1, 1, 0), (0, 0, 0, 0)
+
+
+def ar1_series(seed, n=400, phi=0.7):
+    e = np.random.default_rng(seed).normal(size=n)
+    y = np.zeros(n)
+    for t in range(1, n):
+        y[t] = phi * y[t - 1] + e[t]
+    return y
+
+
+def monthly_frame(n=120, seed=0):
+    t = np.arange(n)
+    return pd.DataFrame({
+        'ds': pd.date_range('2010-01-01', periods=n, freq='MS'),
+        'y': 50 + 0.3 * t + np.cumsum(np.random.default_rng(seed).normal(size=n)),
+    })
+
+
+def forecast(df, artifacts=None, test_size=12, **kwargs):
+    return sarima_forecast(df, 6, test_size, 'ds', 'y', 'MS', order=kwargs.pop('order', ORDER),
+                           seasonal_order=kwargs.pop('seasonal_order', SEASONAL_ORDER),
+                           artifacts=artifacts, **kwargs)
+
+
+@pytest.fixture
+def fits(monkeypatch):
+    # Число оценок параметров SARIMAX (fit) внутри sarima_forecast
+    calls = []
+
+    class CountingSARIMAX(SARIMAX):
+        def fit(self, *args, **kwargs):
+            calls.append(kwargs.get('start_params'))
+            return super().fit(*args, **kwargs)
+
+    monkeypatch.setattr(arima_forecast, 'SARIMAX', CountingSARIMAX)
+    return calls
+
+
+@pytest.fixture(autouse=True)
+def quiet_statsmodels():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        yield
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_auto_sarima_order_finds_ar1(seed):
+    result = auto_sarima_order(ar1_series(seed), 1, criterion='bic', max_workers=1, time_budget=60)
+    assert result['order'] == [1, 0, 0]
+    assert result['seasonal_order'] == [0, 0, 0, 0]
+    assert result['criterion'] == 'bic'
+    assert not result['timed_out']
+    assert np.isfinite(result['score'])
+
+
+def test_auto_sarima_order_differences_random_walk():
+    walk = np.cumsum(np.random.default_rng(5).normal(size=300))
+    result = auto_sarima_order(walk, 1, criterion='bic', max_workers=1, time_budget=60)
+    assert result['order'] == [0, 1, 0]
+
+
+def test_auto_sarima_order_seasonal_difference_within_budget():
+    t = np.arange(240)
+    y = 10 + 3 * np.sin(2 * np.pi * t / 12) + np.random.default_rng(0).normal(0, 0.3, 240)
+    result = auto_sarima_order(y, 12, max_workers=2, time_budget=10)
+    assert result is not None
+    assert result['seasonal_order'][1] == 1
+    assert result['seasonal_order'][3] == 12
+    # Поиск останавливается по бюджету времени (с запасом на завершение начатых оценок)
+    assert result['elapsed'] < 15
+
+
+def test_sarima_fits_once_and_extends_with_test_part(fits):
+    df = monthly_frame()
+    artifacts = {}
+    _, forecast_train, forecast_test, forecast_horizon = forecast(df, artifacts)
+    assert len(fits) == 1
+    assert len(forecast_train) == 108 and len(forecast_test) == 12 and len(forecast_horizon) == 6
+
+    # Горизонт — те же параметры, дополненные тестовым участком без переоценки
+    train = df.set_index('ds')['y'].asfreq('MS')
+    reference = SARIMAX(train.iloc[:108], order=ORDER).fit(disp=False).append(train.iloc[108:])
+    np.testing.assert_allclose(forecast_horizon['y_forecast'], reference.forecast(6), rtol=1e-8)
+    np.testing.assert_allclose(forecast_test['y_forecast'],
+                               SARIMAX(train.iloc[:108], order=ORDER).fit(disp=False).forecast(12), rtol=1e-8)
+
+    # Сохранённые результаты (реестр моделей) — без оценки параметров
+    cached = forecast(df, {'model': artifacts['model']})
+    assert len(fits) == 1
+    np.testing.assert_allclose(cached[3]['y_forecast'], forecast_horizon['y_forecast'])
+
+
+def test_sarima_refit_full_reuses_parameters(fits):
+    df = monthly_frame()
+    forecast(df, refit_full=True)
+    assert len(fits) == 2
+    assert fits[0] is None and fits[1] is not None
+
+
+def test_sarima_update_appends_new_observations(fits):
+    df = monthly_frame(132)
+    base = {}
+    forecast(df.iloc[:120], base)
+    assert len(fits) == 1
+
+    # Ряд продолжает сохранённый: результаты дополняются 12 новыми наблюдениями без оценки
+    artifacts = {'base': base['model']}
+    updated = forecast(df, artifacts)
+    assert len(fits) == 1
+    assert artifacts['model']['updates'] == 1
+    assert artifacts['model']['n_fit'] == 120
+    np.testing.assert_allclose(artifacts['model']['fit'].params, base['model']['fit'].params)
+    train = df.set_index('ds')['y'].asfreq('MS')
+    reference = SARIMAX(train.iloc[:120], order=ORDER).filter(base['model']['fit'].params)
+    np.testing.assert_allclose(updated[3]['y_forecast'], reference.append(train.iloc[120:]).forecast(6),
+                               rtol=1e-8)
+
+
+def test_sarima_update_refits_on_schedule_and_changed_history(fits):
+    df = monthly_frame(132)
+    base = {}
+    forecast(df.iloc[:120], base)
+
+    # refit_every: полная переоценка, стартуя с прежних параметров
+    artifacts = {'base': base['model']}
+    forecast(df, artifacts, refit_every=1)
+    assert len(fits) == 2
+    np.testing.assert_allclose(fits[1], base['model']['fit'].params)
+    assert artifacts['model']['updates'] == 0
+
+    # Изменённая история не продолжает сохранённый ряд: обучение с нуля
+    changed = df.copy()
+    changed.loc[5, 'y'] += 1.0
+    artifacts = {'base': base['model']}
+    forecast(changed, artifacts)
+    assert len(fits) == 3 and fits[2] is None
+    assert artifacts['model']['updates'] == 0
+
+
+def hourly_frame(n=1200, seed=0):
+    t = np.arange(n)
+    return pd.DataFrame({
+        'ds': pd.date_range('2020-01-01', periods=n, freq='h'),
+        'y': 20 + 5 * np.sin(2 * np.pi * t / 24) + np.random.default_rng(seed).normal(0, 0.3, n),
+    })
+
+
+def hourly_forecast(df, artifacts, **kwargs):
+    return sarima_forecast(df, 24, 48, 'ds', 'y', 'h', order=(1, 0, 0), seasonal_order=(0, 1, 0, 24),
+                           artifacts=artifacts, **kwargs)
+
+
+def test_sarima_long_series_mode_matches_full_model():
+    df = hourly_frame()
+    long_artifacts, full_artifacts = {}, {}
+    # Ряд длиннее window с сезонным периодом 24: режим длинных рядов включается автоматически
+    long_result = hourly_forecast(df, long_artifacts, window=400)
+    full_result = hourly_forecast(df, full_artifacts)
+    assert isinstance(long_artifacts['model']['fit'], arima_forecast.LongSeriesSARIMAResults)
+    assert not isinstance(full_artifacts['model']['fit'], arima_forecast.LongSeriesSARIMAResults)
+
+    for long_part, full_part in zip(long_result[2:], full_result[2:]):
+        np.testing.assert_allclose(long_part['y_forecast'], full_part['y_forecast'], atol=0.05)
+    assert len(long_result[1]) == len(df) - 48
+    assert long_result[1]['y_forecast'].notna().all()
+    # Прогноз по истории повторяет полную модель после начального участка
+    np.testing.assert_allclose(long_result[1]['y_forecast'].iloc[48:], full_result[1]['y_forecast'].iloc[48:],
+                               atol=0.1)
+
+
+def test_sarima_long_series_results_pickle_and_append():
+    df = hourly_frame()
+    artifacts = {}
+    result = hourly_forecast(df, artifacts, long_series=True, window=400)
+    fit = artifacts['model']['fit']
+    fit.predict()
+    restored = pickle.loads(pickle.dumps(fit))
+    # Отфильтрованное состояние не сохраняется в реестр, прогноз восстанавливается по ряду
+    assert restored._filtered is None
+    np.testing.assert_allclose(restored.forecast(48), fit.forecast(48))
+    cached = hourly_forecast(df, {'model': artifacts['model']}, long_series=True, window=400)
+    np.testing.assert_allclose(cached[3]['y_forecast'], result[3]['y_forecast'])
+
+    new_obs = pd.Series(np.full(48, 20.0), index=pd.date_range(df['ds'].iloc[-1], periods=49, freq='h')[1:])
+    extended = fit.append(new_obs)
+    assert len(extended.series) == len(fit.series) + 48
+    np.testing.assert_array_equal(extended.params, fit.params)
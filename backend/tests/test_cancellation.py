@@ -0,0 +1,115 @@
+import asyncio
+import os
+import warnings
+
+import fakeredis
+import fakeredis.aioredis
+import numpy as np
+import pandas as pd
+import pytest
+
+import tasks
+from forecast.arima_forecast import auto_sarima_order
+from forecast.cancellation import (CancellationToken, ForecastCancelled, cancellation_scope, check_cancelled,
+                                   current_token)
+from forecast.lstm_forecast import lstm_forecast
+from services.task_cancel import TaskCancelFlags
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'forecast', 'count_project_data_week_laptop.csv')
+NEURAL_PARAMS = {'seq_length': 8, 'lag_periods': 2, 'window_sizes': [3], 'hidden_dim': 8, 'num_layers': 1,
+                 'epochs': 50, 'n_splits': 2, 'mc_dropout': False, 'time_budget': 0, 'patience': 100}
+
+
+class Flag:
+    # Источник флага отмены: срабатывает на after-м опросе, считает опросы
+    def __init__(self, after=1):
+        self.after = after
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.calls >= self.after
+
+
+@pytest.fixture
+def flags():
+    server = fakeredis.FakeServer()
+    flags = TaskCancelFlags(ttl=60)
+    flags._redis = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    flags._redis_sync = fakeredis.FakeRedis(server=server, decode_responses=True)
+    return flags
+
+
+def test_token_polls_source_at_most_once_per_interval():
+    flag = Flag(after=2)
+    token = CancellationToken(flag, min_interval=60)
+    token.check()
+    token.check()
+    assert flag.calls == 1
+    token._last_check -= 61
+    with pytest.raises(ForecastCancelled):
+        token.check()
+    # Сработавший флаг запоминается, источник больше не опрашивается
+    with pytest.raises(ForecastCancelled):
+        token.check()
+    assert flag.calls == 2
+
+
+def test_token_survives_flag_source_errors():
+    def broken():
+        raise ConnectionError('redis down')
+
+    CancellationToken(broken, min_interval=0).check()
+
+
+def test_cancellation_is_not_swallowed_by_exception_handlers():
+    with cancellation_scope(Flag(), min_interval=0) as token:
+        assert current_token() is token
+        with pytest.raises(ForecastCancelled):
+            try:
+                check_cancelled()
+            except Exception:
+                pytest.fail('ForecastCancelled перехвачен как Exception')
+    assert current_token() is None
+    # Вне задачи проверка ничего не делает
+    check_cancelled()
+
+
+def test_neural_training_stops_on_cancel():
+    df = pd.read_csv(DATA_PATH)
+    flag = Flag(after=5)
+    with cancellation_scope(flag, min_interval=0):
+        with pytest.raises(ForecastCancelled):
+            lstm_forecast(df, 4, 8, 'date', 'product_count', 'W-MON', model_params=NEURAL_PARAMS, device='cpu')
+    assert flag.calls == 5
+
+
+def test_sarima_search_stops_on_cancel():
+    y = np.cumsum(np.random.default_rng(0).normal(size=200))
+    with warnings.catch_warnings(), cancellation_scope(Flag(), min_interval=0):
+        warnings.simplefilter('ignore')
+        with pytest.raises(ForecastCancelled):
+            auto_sarima_order(y, 12, max_workers=1, time_budget=60)
+
+
+def test_cancel_flags_are_shared_between_api_and_worker(flags):
+    assert not flags.is_requested_sync('task-1')
+    asyncio.run(flags.request('task-1'))
+    assert flags.is_requested_sync('task-1')
+    assert asyncio.run(flags.is_requested('task-1'))
+    assert not flags.is_requested_sync('task-2') and not flags.is_requested_sync(None)
+    assert 0 < flags._redis_sync.ttl(TaskCancelFlags.KEY_PREFIX + 'task-1') <= 60
+
+
+def test_cancelled_task_is_marked_revoked(flags, monkeypatch):
+    revoked = []
+    monkeypatch.setattr(tasks, 'cancel_flags', flags)
+    monkeypatch.setattr(tasks.run_forecast.backend, 'mark_as_revoked',
+                        lambda task_id, **kwargs: revoked.append((task_id, kwargs['reason'])))
+    asyncio.run(flags.request('task-1'))
+    records = pd.read_csv(DATA_PATH).to_dict(orient='records')
+    result = tasks.run_forecast.apply(('XGBoost', {'n_estimators': 10}, 4, 8, 'date', 'product_count',
+                                       'W-MON', 95, records), task_id='task-1')
+    assert revoked == [('task-1', 'cancelled')]
+    assert result.state == 'IGNORED'
@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+import pytest
+import torch
+
+from forecast.compute_plan import (LARGE_SERIES_WINDOWS, MAX_BATCH_SIZE, MIN_BATCH_SIZE, MIN_VAL_WINDOWS,
+                                   TARGET_STEPS_PER_EPOCH, plan_data_size)
+from forecast.lstm_forecast import LSTMRegressor
+from forecast.neural_common import restore_neural_model
+
+PARAMS = {'seq_length': 12, 'n_splits': 5, 'batch_size': 64}
+HORIZON = 6
+
+
+@pytest.mark.parametrize('n_train', [30, 60, 200, 1_000, 10_000, 100_000, 1_000_000])
+def test_plan_data_size_bounds(n_train):
+    plan = plan_data_size(PARAMS, n_train, HORIZON)
+    windows = max(1, n_train - PARAMS['seq_length'] - HORIZON + 1)
+
+    assert 2 <= plan['n_splits'] <= PARAMS['n_splits']
+    if windows > LARGE_SERIES_WINDOWS:
+        assert plan['n_splits'] <= 3
+    assert MIN_BATCH_SIZE <= plan['batch_size'] <= MAX_BATCH_SIZE
+    # Размер батча — степень двойки
+    assert plan['batch_size'] & (plan['batch_size'] - 1) == 0
+    if plan['batch_size'] < MAX_BATCH_SIZE:
+        assert windows / plan['batch_size'] <= TARGET_STEPS_PER_EPOCH
+
+
+def test_plan_data_size_keeps_validation_windows():
+    # Фолды уменьшаются, пока в валидационной части меньше MIN_VAL_WINDOWS окон
+    n_train = 100
+    plan = plan_data_size(PARAMS, n_train, HORIZON)
+    val_size = n_train // (plan['n_splits'] + 1)
+    assert val_size - PARAMS['seq_length'] - HORIZON + 1 >= MIN_VAL_WINDOWS
+    assert plan['n_splits'] < PARAMS['n_splits']
+
+
+def test_plan_data_size_small_series_batches():
+    # Короткий ряд: хотя бы четыре шага на эпоху
+    plan = plan_data_size(PARAMS, 100, HORIZON)
+    windows = 100 - PARAMS['seq_length'] - HORIZON + 1
+    assert windows / plan['batch_size'] >= 4
+
+
+def test_plan_data_size_long_series():
+    plan = plan_data_size(PARAMS, 1_000_000, HORIZON)
+    assert plan['n_splits'] == 3
+    assert plan['batch_size'] == MAX_BATCH_SIZE
+
+
+def test_plan_data_size_keeps_requested_values_for_medium_series():
+    assert plan_data_size(PARAMS, 5_000, HORIZON) == {'n_splits': 5, 'batch_size': 64}
+
+
+def test_restore_neural_model_caps_mc_samples_to_budget():
+    def build():
+        return (LSTMRegressor(3, 8, 1, 2, dropout=0.3, device='cpu'),)
+
+    fitted = {'state_dict': build()[0].state_dict()}
+    data = np.random.default_rng(0).random((200, 3))
+    params = {'seq_length': 8, 'batch_size': 16, 'mc_dropout': True, 'mc_samples': 10 ** 9,
+              'auto_plan': True, 'time_budget': 5}
+    # Модель из реестра не обучается, но число MC-сэмплов планируется под бюджет
+    model, planned = restore_neural_model(build, fitted, data, len(data), params, 2, 'cpu', time.monotonic())
+    assert planned['mc_samples'] < params['mc_samples']
+    assert planned['mc_dropout']
+    assert all(torch.equal(a, b) for a, b in zip(model.state_dict().values(), fitted['state_dict'].values()))
+    # Без бюджета параметры не меняются
+    unbounded = restore_neural_model(build, fitted, data, len(data), {**params, 'time_budget': 0}, 2, 'cpu',
+                                     time.monotonic())[1]
+    assert unbounded['mc_samples'] == params['mc_samples']
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.dataset_store import DatasetStore
+
+
+def make_frame(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'date': pd.date_range('2020-01-01', periods=n, freq='D').strftime('%Y-%m-%d'),
+        'value': rng.normal(size=n),
+        'count': np.arange(n),
+        'label': ['a', None] * (n // 2),
+    })
+
+
+def dataset_dirs(store):
+    return sorted(name for name in os.listdir(store.root) if not name.startswith('.'))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DatasetStore(str(tmp_path / 'datasets'))
+
+
+def test_put_load_round_trip(store):
+    df = make_frame()
+    dataset_id = store.put(df, owner_id=1)
+    loaded = store.load(dataset_id)
+    # Числовые столбцы отображаются в память (np.memmap), сравниваются значения
+    assert loaded.to_dict(orient='list') == df.to_dict(orient='list')
+    assert loaded['label'].isna().sum() == 25
+    assert list(store.load(dataset_id, ['date', 'value']).columns) == ['date', 'value']
+    assert store.meta(dataset_id)['owner_id'] == 1
+    with pytest.raises(KeyError):
+        store.load(dataset_id, ['missing'])
+
+
+def test_same_content_reuses_dataset(store):
+    first = store.put(make_frame(), owner_id=1)
+    assert store.put(make_frame(), owner_id=1) == first
+    assert dataset_dirs(store) == [first]
+    # Данные другого пользователя хранятся отдельно, другие данные — тоже
+    other_owner = store.put(make_frame(), owner_id=2)
+    other_data = store.put(make_frame(seed=1), owner_id=1)
+    assert len({first, other_owner, other_data}) == 3
+    assert store.content_hash(first) == store.content_hash(other_owner)
+
+
+def test_evict_removes_expired_datasets(store):
+    old = store.put(make_frame(), owner_id=1)
+    expired = time.time() - store.ttl - 10
+    os.utime(os.path.join(store.root, old, 'meta.json'), (expired, expired))
+    fresh = store.put(make_frame(seed=1), owner_id=1)
+    assert dataset_dirs(store) == [fresh]
+
+
+def test_evict_keeps_size_limit_in_lru_order(tmp_path):
+    store = DatasetStore(str(tmp_path / 'datasets'), max_bytes=10 ** 9)
+    ids = []
+    for seed in range(3):
+        ids.append(store.put(make_frame(500, seed), owner_id=1))
+        stamp = time.time() - 100 + seed
+        os.utime(os.path.join(store.root, ids[-1], 'meta.json'), (stamp, stamp))
+    # Обращение обновляет время доступа: первый набор становится самым свежим
+    store.load(ids[0])
+    store.max_bytes = 1
+    store.evict(keep=ids[2])
+    assert dataset_dirs(store) == [ids[2]]
+    assert store.exists(ids[2]) and not store.exists(ids[1])
+
+
+def test_create_dataset_requires_user_and_stores_owner(store, monkeypatch):
+    import routes.forecast as forecast_routes
+    from utils.auth import get_current_user
+
+    monkeypatch.setattr(forecast_routes, 'dataset_store', store)
+    route = next(r for r in forecast_routes.forecast_router.routes if r.path == '/datasets')
+    assert get_current_user in [dep.call for dep in route.dependant.dependencies]
+
+    request = forecast_routes.DatasetRequest(data=make_frame(10).to_dict(orient='records'))
+    response = asyncio.run(forecast_routes.create_dataset(request, current_user=SimpleNamespace(id=7)))
+    again = asyncio.run(forecast_routes.create_dataset(request, current_user=SimpleNamespace(id=7)))
+    assert response['dataset_id'] == again['dataset_id']
+    assert store.meta(response['dataset_id'])['owner_id'] == 7
+
+
+def test_forecast_model_reads_date_and_target_columns(store, tmp_path, monkeypatch):
+    import tasks
+    from services.forecast_result import unpack_forecast_result
+    from services.model_registry import ModelRegistry
+
+    monkeypatch.setattr(tasks, 'dataset_store', store)
+    monkeypatch.setattr(tasks, 'model_registry', ModelRegistry(str(tmp_path / 'registry')))
+    df = make_frame(80)
+    # Загруженный файл со всеми столбцами даёт тот же прогноз, что и записи двух столбцов
+    dataset_id = store.put(df, owner_id=1)
+    args = ('XGBoost', {'n_estimators': 5}, 3, 5, 'date', 'value', 'D', 95)
+    from_store = unpack_forecast_result(tasks.forecast_model(*args, [], dataset_id))
+    from_records = unpack_forecast_result(tasks.forecast_model(
+        *args, df[['date', 'value']].to_dict(orient='records')))
+    assert from_store['forecast_horizon'] == from_records['forecast_horizon']
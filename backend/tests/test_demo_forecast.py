@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+import routes.forecast as forecast_routes
+
+SARIMA_PARAMS = {'p': 1, 'd': 1, 'q': 0, 'P': 0, 'D': 0, 'Q': 0, 's': 12}
+
+
+def demo_request(**unique_params):
+    data = pd.DataFrame({
+        'date': pd.date_range('2020-01-01', periods=48, freq='MS').strftime('%Y-%m-%d'),
+        'value': [float(i % 12 + i) for i in range(48)],
+    })
+    return forecast_routes.ForecastRequest(
+        model='SARIMA', uniqueParams={**SARIMA_PARAMS, **unique_params}, horizon=3, history=6,
+        dt_name='date', y_name='value', freq='MS', data=data.to_dict(orient='records'))
+
+
+@pytest.fixture
+def sarima_calls(monkeypatch):
+    # Аргументы, с которыми демо-эндпоинт вызывает sarima_forecast
+    calls = []
+    sarima_forecast = forecast_routes.sarima_forecast
+
+    def capture(*args, **kwargs):
+        calls.append(kwargs)
+        return sarima_forecast(*args, **kwargs)
+
+    monkeypatch.setattr(forecast_routes, 'sarima_forecast', capture)
+    return calls
+
+
+def test_demo_sarima_forwards_refit_every(sarima_calls):
+    result = forecast_routes.compute_demo_forecast(demo_request(refit_every=4))
+    assert len(result['forecast_horizon']) == 3
+    assert sarima_calls[0]['refit_every'] == 4
+    forecast_routes.compute_demo_forecast(demo_request())
+    assert sarima_calls[1]['refit_every'] is None
+
+
+def test_demo_sarima_forwards_long_series_window(sarima_calls):
+    result = forecast_routes.compute_demo_forecast(demo_request(long_series=True, window=36))
+    assert len(result['forecast_horizon']) == 3
+    assert all(row['y_forecast'] is not None for row in result['forecast_horizon'])
+    assert (sarima_calls[0]['long_series'], sarima_calls[0]['window']) == (True, 36)
+    # По умолчанию режим длинных рядов выбирается автоматически, окно — как в задаче Celery
+    forecast_routes.compute_demo_forecast(demo_request())
+    assert (sarima_calls[1]['long_series'], sarima_calls[1]['window']) == (None, 5000)
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecast.features import RecursiveFeatureUpdater, build_feature_matrix, create_features
+
+
+# Прежняя реализация create_features (pandas: shift/rolling/diff и календарь через DatetimeIndex)
+def old_create_features(df, dt_col, target_col, lag_periods, seasonality, window_sizes=None):
+    df = df.copy()
+    df[dt_col] = pd.to_datetime(df[dt_col])
+    df.set_index(dt_col, inplace=True)
+    for i in range(1, lag_periods + 1):
+        df[f'lag_{i}'] = df[target_col].shift(i)
+    if window_sizes:
+        for window in window_sizes:
+            df[f'rolling_mean_{window}'] = df[target_col].rolling(window=window).mean()
+            df[f'rolling_std_{window}'] = df[target_col].rolling(window=window).std()
+        df['diff_1'] = df[target_col].diff()
+    if 'M' in seasonality:
+        df['month'] = df.index.month
+        df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
+        df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
+    elif 'W' in seasonality:
+        df['week'] = df.index.isocalendar().week
+        df['month'] = df.index.month
+        df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
+        df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
+    elif 'D' in seasonality:
+        df['day'] = df.index.day
+        df['weekday'] = df.index.weekday
+    df.dropna(inplace=True)
+    return df
+
+
+def make_series(n, freq, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    return pd.DataFrame({
+        'ds': pd.date_range('2015-01-01', periods=n, freq=freq),
+        'y': 100 + 0.5 * t + 10 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 2, n),
+    })
+
+
+@pytest.mark.parametrize('seasonality,freq', [('MS', 'MS'), ('W', 'W'), ('D', 'D')])
+def test_build_feature_matrix_matches_pandas(seasonality, freq):
+    df = make_series(200, freq)
+    expected = old_create_features(df, 'ds', 'y', 6, seasonality, [3, 6, 12]).astype(np.float64)
+    matrix = build_feature_matrix(df, 'ds', 'y', 6, seasonality, [3, 6, 12], use_cache=False)
+
+    assert matrix.columns == list(expected.columns)
+    assert matrix.index.equals(expected.index)
+    # Матрица хранится во float32: расхождение — в пределах его точности
+    np.testing.assert_allclose(matrix.values, expected.to_numpy(), rtol=1e-6, atol=1e-4)
+
+
+def test_create_features_keeps_frame_interface():
+    df = make_series(60, 'MS')
+    frame = create_features(df, 'ds', 'y', 3, 'MS', [3])
+    expected = old_create_features(df, 'ds', 'y', 3, 'MS', [3])
+    assert list(frame.columns) == list(expected.columns)
+    assert frame.index.equals(expected.index)
+
+
+@pytest.mark.parametrize('seasonality,freq', [('MS', 'MS'), ('W', 'W'), ('D', 'D')])
+def test_recursive_updater_matches_full_rebuild(seasonality, freq):
+    df = make_series(120, freq, seed=1)
+    feature_df = old_create_features(df, 'ds', 'y', 6, seasonality, [3, 6, 12]).astype(np.float64)
+    updater = RecursiveFeatureUpdater.from_frame(feature_df, 'y', df['y'].to_numpy(dtype=float))
+
+    future_dates = pd.date_range(df['ds'].iloc[-1], periods=11, freq=freq)[1:]
+    extended = df
+    for date, value in zip(future_dates, np.linspace(150.0, 160.0, len(future_dates))):
+        row = updater.step(value, date)
+        extended = pd.concat([extended, pd.DataFrame({'ds': [date], 'y': [value]})], ignore_index=True)
+        rebuilt = old_create_features(extended, 'ds', 'y', 6, seasonality, [3, 6, 12]).astype(np.float64)
+        np.testing.assert_allclose(row, rebuilt.iloc[-1].to_numpy(), rtol=1e-9, atol=1e-7)
+
+
+def large_series(n=80):
+    # Значения выше 2**24: во float32 дробная часть теряется
+    df = make_series(n, 'MS', seed=2)
+    df['y'] = 16777216.0 + df['y'] + 0.6
+    return df
+
+
+def test_feature_matrix_keeps_target_in_float64():
+    df = large_series()
+    matrix = build_feature_matrix(df, 'ds', 'y', 3, 'MS', [3], use_cache=False)
+    assert matrix.values.dtype == np.float32
+    expected = df.set_index('ds')['y'].loc[matrix.index].to_numpy()
+    np.testing.assert_array_equal(matrix.target, expected)
+
+    frame = create_features(df, 'ds', 'y', 3, 'MS', [3])
+    assert frame['y'].dtype == np.float64
+    np.testing.assert_array_equal(frame['y'].to_numpy(), expected)
+
+
+@pytest.mark.parametrize('model', ['XGBoost', 'LSTM'])
+def test_forecast_y_fact_keeps_input_precision(model):
+    df = large_series()
+    if model == 'XGBoost':
+        from forecast.xgboost_forecast import xgboost_forecast
+        forecast_all = xgboost_forecast(df, 3, 6, 'ds', 'y', 'MS', xgb_params={'n_estimators': 5})[0]
+    else:
+        from forecast.lstm_forecast import lstm_forecast
+        forecast_all = lstm_forecast(df, 3, 6, 'ds', 'y', 'MS', model_params={
+            'seq_length': 6, 'lag_periods': 2, 'window_sizes': [3], 'hidden_dim': 4, 'num_layers': 1,
+            'epochs': 1, 'n_splits': 2, 'mc_dropout': False, 'time_budget': 0})[0]
+    actual = df.set_index('ds')['y']
+    np.testing.assert_array_equal(forecast_all['y_fact'].to_numpy(),
+                                  actual.loc[pd.DatetimeIndex(forecast_all['ds'])].to_numpy())
@@ -0,0 +1,77 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.forecast_result import (decompress_forecast_result, is_columnar, pack_forecast_result,
+                                      unpack_forecast_result)
+
+
+def make_frames(model_name='LSTM'):
+    ds = pd.date_range('2021-01-01', periods=40, freq='D')
+    forecast_all = pd.DataFrame({
+        'ds': ds,
+        'y_fact': np.linspace(1.0, 40.0, 40),
+        'y_forecast': np.linspace(1.5, 40.5, 40),
+        'yhat_lower': np.linspace(0.5, 39.5, 40),
+        'yhat_upper': np.linspace(2.5, 41.5, 40),
+        'model_name': model_name,
+    })
+    forecast_all.loc[3, 'y_forecast'] = np.nan
+    forecast_horizon = pd.DataFrame({
+        'ds': pd.date_range('2021-02-10', periods=5, freq='D'),
+        'y_forecast': [41.0, 42.0, np.inf, 44.0, 45.0],
+        'model_name': model_name,
+    })
+    return forecast_all, forecast_all.iloc[:30], forecast_all.iloc[30:], forecast_horizon
+
+
+def records(df):
+    out = []
+    for row in df.to_dict(orient='records'):
+        out.append({k: (None if isinstance(v, float) and not np.isfinite(v) else v) for k, v in row.items()})
+    return out
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_pack_unpack_round_trip(compression):
+    forecast_all, forecast_train, forecast_test, forecast_horizon = make_frames()
+    packed = pack_forecast_result(forecast_all, forecast_train, forecast_test, forecast_horizon,
+                                  extra={'sarima_search': {'order': [1, 0, 0]}}, compression=compression)
+    # Результат хранится в result backend в JSON
+    packed = json.loads(json.dumps(packed))
+    assert is_columnar(packed)
+    unpacked = unpack_forecast_result(packed)
+
+    assert unpacked['sarima_search'] == {'order': [1, 0, 0]}
+    for name, df in (('forecast_all', forecast_all), ('forecast_train', forecast_train),
+                     ('forecast_test', forecast_test), ('forecast_horizon', forecast_horizon)):
+        assert unpacked[name] == records(df), name
+
+
+def test_pack_uses_index_ranges_for_contiguous_parts():
+    forecast_all, forecast_train, forecast_test, forecast_horizon = make_frames()
+    packed = pack_forecast_result(forecast_all, forecast_train, forecast_test, forecast_horizon)
+    assert packed['train'] == [0, 30]
+    assert packed['test'] == [30, 40]
+    assert packed['model_name'] == 'LSTM'
+    assert packed['forecast_all']['ds'][0] == pd.Timestamp('2021-01-01').value // 10 ** 6
+
+
+def test_pack_keeps_detached_test_part():
+    forecast_all, forecast_train, _, forecast_horizon = make_frames('SARIMA')
+    forecast_test = forecast_horizon.assign(ds=pd.date_range('2022-01-01', periods=5, freq='D'))
+    packed = pack_forecast_result(forecast_all, forecast_train, forecast_test, forecast_horizon)
+    assert 'test' not in packed
+    assert unpack_forecast_result(packed)['forecast_test'] == records(forecast_test)
+
+
+def test_compressed_result_is_smaller_and_decompresses():
+    frames = make_frames()
+    plain = pack_forecast_result(*frames)
+    compressed = pack_forecast_result(*frames, compression='zlib')
+    assert compressed['compression'] == 'zlib'
+    assert len(json.dumps(compressed)) < len(json.dumps(plain))
+    assert decompress_forecast_result(compressed) == json.loads(json.dumps(plain))
+    assert decompress_forecast_result(plain) is plain
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import torch
+
+from forecast.gru_forecast import GRURegressor
+from forecast.lstm_forecast import LSTMRegressor
+from forecast.neural_common import enable_mc_dropout, mc_dropout_predict
+from forecast.transformers_forecast import TransformerModel
+
+INPUT_DIM, SEQ_LENGTH, HORIZON = 5, 8, 3
+
+
+def build(name, num_layers=1):
+    if name == 'LSTM':
+        return LSTMRegressor(INPUT_DIM, 8, num_layers, HORIZON, dropout=0.3, device='cpu')
+    if name == 'GRU':
+        return GRURegressor(INPUT_DIM, 8, num_layers, HORIZON, dropout=0.3, device='cpu')
+    return TransformerModel(INPUT_DIM, 8, 2, num_layers, 1, 16, dropout=0.3, horizon=HORIZON)
+
+
+@pytest.fixture
+def x():
+    torch.manual_seed(0)
+    return torch.rand(4, SEQ_LENGTH, INPUT_DIM)
+
+
+@pytest.mark.parametrize('num_layers', [1, 2])
+@pytest.mark.parametrize('name', ['LSTM', 'GRU', 'Transformer'])
+def test_mc_dropout_samples_differ(name, num_layers, x):
+    torch.manual_seed(1)
+    model = build(name, num_layers)
+    with torch.no_grad():
+        model.eval()
+        assert torch.equal(model(x), model(x))
+        enable_mc_dropout(model)
+        assert not torch.equal(model(x), model(x))
+
+
+@pytest.mark.parametrize('name', ['LSTM', 'GRU', 'Transformer'])
+def test_mc_dropout_predict_gives_mean_and_quantiles(name, x):
+    torch.manual_seed(1)
+    model = build(name)
+    enable_mc_dropout(model)
+    with torch.no_grad():
+        # max_rows меньше n_samples * batch: сэмплы считаются несколькими проходами
+        mean, q = mc_dropout_predict(model, x, n_samples=50, max_rows=64, quantiles=(0.05, 0.5, 0.95))
+    assert mean.shape == (len(x), HORIZON)
+    assert q.shape == (3, len(x), HORIZON)
+    assert np.all(q[0] <= q[1]) and np.all(q[1] <= q[2])
+    assert np.all(q[2] - q[0] > 0)
+    assert np.all((mean > q[0]) & (mean < q[2]))
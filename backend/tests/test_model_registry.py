@@ -0,0 +1,73 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.model_registry import ModelRegistry, make_lineage_key, make_registry_key
+
+
+def make_frame(n=30, seed=0):
+    return pd.DataFrame({
+        'ds': pd.date_range('2020-01-01', periods=n, freq='D'),
+        'y': np.random.default_rng(seed).normal(size=n),
+    })
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / 'registry'))
+
+
+def test_registry_key_depends_on_model_params_and_data():
+    df = make_frame()
+    key = make_registry_key('XGBoost', {'a': 1, 'b': 2}, df, 'D', test_size=5)
+    # Порядок параметров не важен, копия данных даёт тот же ключ
+    assert make_registry_key('XGBoost', {'b': 2, 'a': 1}, df.copy(), 'D', test_size=5) == key
+    changed = df.copy()
+    changed.loc[3, 'y'] += 1e-9
+    assert len({
+        key,
+        make_registry_key('SARIMA', {'a': 1, 'b': 2}, df, 'D', test_size=5),
+        make_registry_key('XGBoost', {'a': 1, 'b': 3}, df, 'D', test_size=5),
+        make_registry_key('XGBoost', {'a': 1, 'b': 2}, df, 'W', test_size=5),
+        make_registry_key('XGBoost', {'a': 1, 'b': 2}, df, 'D', test_size=6),
+        make_registry_key('XGBoost', {'a': 1, 'b': 2}, changed, 'D', test_size=5),
+    }) == 6
+
+
+def test_lineage_key_ignores_data():
+    key = make_lineage_key('SARIMA', {'p': 1}, 'D', history=5)
+    assert make_lineage_key('SARIMA', {'p': 1}, 'D', history=5) == key
+    assert make_lineage_key('SARIMA', {'p': 2}, 'D', history=5) != key
+    assert key != make_registry_key('SARIMA', {'p': 1}, make_frame(), 'D', history=5)
+
+
+def test_put_get_round_trip(registry):
+    artifact = {'state_dict': {'w': np.arange(5.0)}, 'truncated': False}
+    registry.put('key', artifact)
+    loaded = registry.get('key')
+    np.testing.assert_array_equal(loaded['state_dict']['w'], artifact['state_dict']['w'])
+    assert registry.get('missing') is None
+    assert [name for name in os.listdir(registry.root) if name.endswith('.tmp')] == []
+
+
+def test_corrupt_artifact_is_a_miss(registry):
+    with open(os.path.join(registry.root, 'broken.pkl'), 'wb') as f:
+        f.write(b'not a pickle')
+    assert registry.get('broken') is None
+
+
+def test_evict_removes_least_recently_used(registry):
+    payload = np.zeros(1000)
+    for i, key in enumerate(['a', 'b', 'c']):
+        registry.put(key, payload)
+        stamp = time.time() - 100 + i
+        os.utime(os.path.join(registry.root, f'{key}.pkl'), (stamp, stamp))
+    # Обращение к самому старому артефакту делает его самым свежим
+    registry.get('a')
+    size = os.path.getsize(os.path.join(registry.root, 'a.pkl'))
+    registry.max_bytes = 2 * size
+    registry.evict()
+    assert sorted(os.listdir(registry.root)) == ['a.pkl', 'c.pkl']
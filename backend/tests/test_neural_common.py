@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+from sklearn.preprocessing import MinMaxScaler
+from torch.utils.data import DataLoader, Dataset
+
+from forecast.neural_common import SlidingWindowLoader, aggregate_historical_forecast
+
+
+# Прежний набор окон (DataLoader(TimeSeriesDataset(...)) в нейросетевых модулях)
+class OldTimeSeriesDataset(Dataset):
+    def __init__(self, data: np.ndarray, seq_length: int, horizon: int):
+        self.data = data
+        self.seq_length = seq_length
+        self.horizon = horizon
+
+    def __len__(self):
+        return max(0, len(self.data) - self.seq_length - self.horizon + 1)
+
+    def __getitem__(self, idx):
+        x = self.data[idx: idx + self.seq_length]
+        y = self.data[idx + self.seq_length: idx + self.seq_length + self.horizon, 0]
+        return torch.FloatTensor(x), torch.FloatTensor(y)
+
+
+# Прежняя агрегация исторического прогноза: записи (дата, прогноз) по всем окнам и groupby
+def old_historical_forecast(index, all_forecasts, seq_length, scaler):
+    forecast_steps = [
+        (index[seq_length + i + h], forecast * (scaler.data_max_[0] - scaler.data_min_[0]) + scaler.data_min_[0])
+        for i in range(all_forecasts.shape[0])
+        for h, forecast in enumerate(all_forecasts[i])
+        if seq_length + i + h < len(index)
+    ]
+    forecast_df = pd.DataFrame(forecast_steps, columns=['ds', 'y_forecast'])
+    return forecast_df.groupby('ds')['y_forecast'].mean().reset_index()
+
+
+@pytest.mark.parametrize('seq_length,horizon,batch_size', [(12, 6, 16), (5, 1, 7), (24, 12, 64)])
+def test_sliding_window_loader_matches_dataset(seq_length, horizon, batch_size):
+    data = np.random.default_rng(0).normal(size=(150, 4)).astype(np.float32)
+    loader = SlidingWindowLoader(data, seq_length, horizon, batch_size=batch_size, shuffle=False)
+    old = DataLoader(OldTimeSeriesDataset(data, seq_length, horizon), batch_size=batch_size, shuffle=False)
+
+    assert len(loader) == len(old)
+    for (x, y), (old_x, old_y) in zip(loader, old):
+        assert torch.equal(x, old_x)
+        assert torch.equal(y, old_y)
+
+
+def test_sliding_window_loader_shuffle_covers_all_windows():
+    data = np.arange(60, dtype=np.float32).reshape(30, 2)
+    loader = SlidingWindowLoader(data, 4, 2, batch_size=8, shuffle=True)
+    starts = sorted(int(x[0, 0, 0]) // 2 for batch_x, _ in loader for x in batch_x.split(1))
+    assert starts == list(range(30 - 4 - 2 + 1))
+
+
+def test_sliding_window_loader_too_short_series():
+    loader = SlidingWindowLoader(np.zeros((5, 3)), 4, 3, batch_size=8)
+    assert len(loader) == 0
+    assert list(loader) == []
+
+
+@pytest.mark.parametrize('seq_length,horizon', [(12, 6), (7, 1), (3, 20)])
+def test_aggregate_historical_forecast_matches_groupby(seq_length, horizon):
+    rng = np.random.default_rng(1)
+    n = 120
+    index = pd.date_range('2020-01-01', periods=n, freq='D', name='ds')
+    scaler = MinMaxScaler().fit(rng.normal(50, 10, size=(n, 3)))
+    all_forecasts = rng.uniform(size=(n - seq_length - horizon + 1, horizon))
+
+    result = aggregate_historical_forecast(index, all_forecasts, seq_length, scaler)
+    expected = old_historical_forecast(index, all_forecasts, seq_length, scaler)
+
+    assert (result['ds'].to_numpy() == expected['ds'].to_numpy()).all()
+    np.testing.assert_allclose(result['y_forecast'].to_numpy(), expected['y_forecast'].to_numpy(),
+                               rtol=1e-12, atol=1e-9)
+    assert (result['y_spread'] >= 0).all()
@@ -0,0 +1,97 @@
+import os
+
+import pandas as pd
+import pytest
+
+import forecast.progress as progress
+from forecast.lstm_forecast import lstm_forecast
+from forecast.progress import (ProgressReporter, current_reporter, progress_reporting, progress_skip,
+                               progress_stage, progress_step)
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'forecast', 'count_project_data_week_laptop.csv')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Управляемое время для интервала публикаций и ETA
+    now = [100.0]
+    monkeypatch.setattr(progress.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_reporter_throttles_steps_but_not_stages(clock):
+    published = []
+    reporter = ProgressReporter(published.append, min_interval=2.0)
+    reporter.start_stage('cv', total=10, n_folds=2)
+    clock[0] += 1
+    reporter.step(fold=1, epoch=1)
+    assert len(published) == 1
+    clock[0] += 1.5
+    reporter.step(fold=1, epoch=2, train_loss=0.5)
+    assert len(published) == 2
+    # ETA: 2.5 с на 2 эпохи, осталось 8
+    assert published[-1] == {'stage': 'cv', 'n_folds': 2, 'fold': 1, 'epoch': 2, 'train_loss': 0.5,
+                             'done': 2, 'total': 10, 'elapsed': 2.5, 'eta': 10.0}
+    reporter.start_stage('full', total=3)
+    assert len(published) == 3
+    assert (published[-1]['stage'], published[-1]['done'], published[-1]['eta']) == ('full', 0, None)
+
+
+def test_skip_reduces_expected_epochs(clock):
+    published = []
+    reporter = ProgressReporter(published.append, min_interval=0)
+    reporter.start_stage('cv', total=10)
+    clock[0] += 4
+    reporter.step()
+    reporter.step()
+    reporter.skip(5)
+    assert reporter.total == 5
+    reporter.skip(100)
+    assert reporter.total == reporter.done == 2
+
+
+def test_publish_errors_do_not_break_training():
+    def failing(meta):
+        raise ConnectionError('backend down')
+
+    reporter = ProgressReporter(failing, min_interval=0)
+    reporter.start_stage('cv', total=1)
+    reporter.step()
+    assert reporter.done == 1
+
+
+def test_module_functions_use_the_active_reporter():
+    # Вне задачи функции ничего не делают
+    progress_stage('cv', 4)
+    progress_step(epoch=1)
+    assert current_reporter() is None
+
+    published = []
+    with progress_reporting(published.append, min_interval=0) as reporter:
+        assert current_reporter() is reporter
+        progress_stage('cv', 4, n_folds=2)
+        progress_step(epoch=1, train_loss=0.123456789)
+        progress_skip(0)
+        progress_skip(2)
+    assert current_reporter() is None
+    assert published[-1]['train_loss'] == 0.123457
+    assert reporter.total == 2
+
+
+@pytest.mark.parametrize('parallel_folds', [False, True])
+def test_neural_training_reports_every_stage(parallel_folds):
+    df = pd.read_csv(DATA_PATH)
+    params = {'seq_length': 8, 'lag_periods': 2, 'window_sizes': [3], 'hidden_dim': 8, 'num_layers': 1,
+              'epochs': 3, 'n_splits': 2, 'mc_dropout': False, 'time_budget': 0, 'patience': 100,
+              'parallel_folds': parallel_folds, 'fold_workers': 2}
+    published = []
+    with progress_reporting(published.append, min_interval=0):
+        lstm_forecast(df, 4, 8, 'date', 'product_count', 'W-MON', model_params=params, device='cpu')
+    stages = [meta['stage'] for meta in published]
+    assert stages[0] == 'cv' and stages[-1] == 'forecast'
+    # Параллельные фолды: после кросс-валидации модель переобучается на всей выборке
+    assert ('full' in stages) == parallel_folds
+    cv = [meta for meta in published if meta['stage'] == 'cv']
+    assert cv[0]['total'] == 6 and cv[-1]['done'] == cv[-1]['total']
+    assert all('train_loss' in meta for meta in cv[1:])
@@ -0,0 +1,81 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+from prophet import Prophet
+from prophet.serialize import model_from_json
+from scipy.stats import norm
+
+from forecast.prophet_forecast import prophet_forecast
+
+HORIZON, TEST_SIZE = 6, 12
+
+
+@pytest.fixture(autouse=True)
+def quiet_prophet():
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+
+
+@pytest.fixture(scope='module')
+def df():
+    t = np.arange(96)
+    return pd.DataFrame({
+        'date': pd.date_range('2015-01-01', periods=96, freq='MS').strftime('%Y-%m-%d'),
+        'value': 100 + 0.5 * t + 10 * np.sin(2 * np.pi * t / 12) + np.random.default_rng(0).normal(0, 2, 96),
+    })
+
+
+@pytest.fixture
+def predict_calls(monkeypatch):
+    calls = []
+    predict = Prophet.predict
+
+    def counting_predict(self, *args, **kwargs):
+        calls.append(len(args[0]) if args else None)
+        return predict(self, *args, **kwargs)
+
+    monkeypatch.setattr(Prophet, 'predict', counting_predict)
+    return calls
+
+
+def forecast(df, artifacts=None, **params):
+    return prophet_forecast(df, HORIZON, TEST_SIZE, 'date', 'value', 'MS', 95, artifacts=artifacts,
+                            prophet_params=params)
+
+
+def test_prophet_predicts_history_and_horizon_in_one_call(df, predict_calls):
+    artifacts = {}
+    forecast_all, forecast_train, forecast_test, forecast_horizon = forecast(df, artifacts, uncertainty_samples=0)
+    assert predict_calls == [len(df) + HORIZON]
+    assert (len(forecast_all), len(forecast_train), len(forecast_test), len(forecast_horizon)) == \
+        (len(df), len(df) - TEST_SIZE, TEST_SIZE, HORIZON)
+    assert forecast_horizon['ds'].iloc[0] == pd.Timestamp('2023-01-01')
+
+    # Те же значения, что и отдельные вызовы predict для истории и горизонта
+    m = model_from_json(artifacts['model'])
+    m.uncertainty_samples = 0
+    history = m.predict(pd.DataFrame({'ds': pd.to_datetime(df['date'])}))
+    future = m.predict(pd.DataFrame({'ds': forecast_horizon['ds']}))
+    np.testing.assert_allclose(forecast_all['y_forecast'], history['yhat'])
+    np.testing.assert_allclose(forecast_horizon['y_forecast'], future['yhat'])
+
+
+def test_prophet_analytic_intervals_without_sampling(df):
+    forecast_all, forecast_train, _, forecast_horizon = forecast(df, uncertainty_samples=0)
+    residual_std = (forecast_train['y_fact'] - forecast_train['y_forecast']).std(ddof=0)
+    half_width = norm.ppf(0.975) * residual_std
+    for part in (forecast_all, forecast_horizon):
+        np.testing.assert_allclose(part['yhat_upper'] - part['y_forecast'], half_width)
+        np.testing.assert_allclose(part['y_forecast'] - part['yhat_lower'], half_width)
+
+
+def test_prophet_sampled_intervals_and_registry_model(df):
+    artifacts = {}
+    result = forecast(df, artifacts, uncertainty_samples=200)
+    horizon = result[3]
+    assert (horizon['yhat_lower'] < horizon['y_forecast']).all()
+    assert (horizon['y_forecast'] < horizon['yhat_upper']).all()
+    # Модель из реестра: тот же точечный прогноз без обучения
+    cached = forecast(df, {'model': artifacts['model']}, uncertainty_samples=0)
+    np.testing.assert_allclose(cached[3]['y_forecast'], horizon['y_forecast'])
@@ -0,0 +1,136 @@
+import asyncio
+
+import fakeredis.aioredis
+import pytest
+
+from services.request_cache import (InflightCoalescer, TaskDeduplicator, TTLCache, records_digest,
+                                    request_fingerprint)
+
+
+def test_request_fingerprint_is_canonical():
+    digest = records_digest([{'ds': '2020-01-01', 'y': 1}])
+    assert records_digest([{'y': 1, 'ds': '2020-01-01'}]) == digest
+    key = request_fingerprint({'model': 'XGBoost', 'horizon': 3}, digest)
+    assert request_fingerprint({'horizon': 3, 'model': 'XGBoost'}, digest) == key
+    assert request_fingerprint({'model': 'XGBoost', 'horizon': 4}, digest) != key
+    other_data = records_digest([{'ds': '2020-01-01', 'y': 2}])
+    assert request_fingerprint({'model': 'XGBoost', 'horizon': 3}, other_data) != key
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expired():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    expired = TTLCache(maxsize=2, ttl=-1)
+    expired.put('a', 1)
+    assert expired.get('a') is None
+
+
+def test_inflight_coalescer_computes_once_for_concurrent_requests():
+    coalescer = InflightCoalescer(TTLCache(maxsize=8, ttl=60))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {'result': len(calls)}
+
+    async def scenario():
+        results = await asyncio.gather(*(coalescer.run('key', compute) for _ in range(5)))
+        # Готовый результат берётся из кэша
+        cached = await coalescer.run('key', compute)
+        return results, cached
+
+    results, cached = asyncio.run(scenario())
+    assert calls == [1]
+    assert results == [{'result': 1}] * 5 and cached == {'result': 1}
+
+
+def test_inflight_coalescer_does_not_cache_failures():
+    coalescer = InflightCoalescer(TTLCache(maxsize=8, ttl=60))
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ValueError('boom')
+        return 'ok'
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await coalescer.run('key', compute)
+        return await coalescer.run('key', compute)
+
+    assert asyncio.run(scenario()) == 'ok'
+    assert len(attempts) == 2
+
+
+@pytest.fixture
+def deduplicator():
+    deduplicator = TaskDeduplicator(ttl=60)
+    deduplicator.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return deduplicator
+
+
+def test_task_deduplicator_reuses_task_for_same_fingerprint(deduplicator):
+    submitted = []
+
+    async def reusable(task_id):
+        return True
+
+    async def scenario():
+        first = await deduplicator.submit('fp', submitted.append, reusable)
+        second = await deduplicator.submit('fp', submitted.append, reusable)
+        other = await deduplicator.submit('other', submitted.append, reusable)
+        return first, second, other
+
+    first, second, other = asyncio.run(scenario())
+    assert first == (submitted[0], False)
+    assert second == (submitted[0], True)
+    assert other == (submitted[1], False)
+    assert len(submitted) == 2
+
+
+def test_task_deduplicator_replaces_failed_task(deduplicator):
+    submitted = []
+
+    async def not_reusable(task_id):
+        return False
+
+    async def scenario():
+        first = await deduplicator.submit('fp', submitted.append, not_reusable)
+        second = await deduplicator.submit('fp', submitted.append, not_reusable)
+        return first, second, await deduplicator.redis.get(TaskDeduplicator.KEY_PREFIX + 'fp')
+
+    first, second, stored = asyncio.run(scenario())
+    assert not first[1] and not second[1]
+    assert first[0] != second[0] and stored == second[0]
+
+
+def test_task_deduplicator_releases_key_when_submit_fails(deduplicator):
+    def failing_submit(task_id):
+        raise RuntimeError('broker down')
+
+    async def reusable(task_id):
+        return True
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await deduplicator.submit('fp', failing_submit, reusable)
+        return await deduplicator.redis.get(TaskDeduplicator.KEY_PREFIX + 'fp')
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_task_deduplicator_submits_without_redis():
+    deduplicator = TaskDeduplicator(url='redis://127.0.0.1:1/0', ttl=60)
+    submitted = []
+
+    async def reusable(task_id):
+        return True
+
+    task_id, deduplicated = asyncio.run(deduplicator.submit('fp', submitted.append, reusable))
+    assert submitted == [task_id] and not deduplicated
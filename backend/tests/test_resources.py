@@ -0,0 +1,68 @@
+import pytest
+import torch
+from threadpoolctl import threadpool_info
+
+import forecast.resources as resources
+from forecast.resources import current_thread_budget, plan_thread_budget, thread_budget
+from forecast.xgboost_forecast import default_nthread
+
+
+@pytest.fixture
+def eight_cores(monkeypatch):
+    monkeypatch.setattr(resources, 'available_cores', lambda: 8)
+    monkeypatch.setattr(resources, 'CELERY_WORKER_CONCURRENCY', 0)
+    monkeypatch.setattr(resources, 'TASK_THREAD_BUDGET', 0)
+    monkeypatch.setattr(resources, 'XGB_NTHREAD', 0)
+
+
+@pytest.mark.parametrize('concurrency,share', [(1, 8), (2, 4), (3, 2), (8, 1), (16, 1)])
+def test_cores_are_split_between_worker_processes(eight_cores, concurrency, share):
+    for model in ('Prophet', 'XGBoost', 'LSTM'):
+        budget = plan_thread_budget(model, concurrency)
+        assert budget['share'] == share
+        assert budget['blas'] == 1
+
+
+def test_share_goes_to_the_model_class(eight_cores):
+    statistical = plan_thread_budget('SARIMA', 2)
+    tree = plan_thread_budget('XGBoost', 2)
+    neural = plan_thread_budget('GRU', 2)
+    assert (statistical['model_class'], statistical['workers'], statistical['xgb_nthread'],
+            statistical['torch_intra']) == ('statistical', 4, 1, 1)
+    assert (tree['model_class'], tree['xgb_nthread'], tree['openmp'], tree['torch_intra']) == ('tree', 4, 4, 1)
+    assert (neural['model_class'], neural['torch_intra'], neural['openmp'], neural['xgb_nthread']) == \
+        ('neural', 4, 4, 1)
+    # Без явного concurrency Celery запускает процесс на ядро
+    assert plan_thread_budget('LSTM')['share'] == 1
+
+
+def test_explicit_budgets_override_the_split(eight_cores, monkeypatch):
+    monkeypatch.setattr(resources, 'TASK_THREAD_BUDGET', 3)
+    monkeypatch.setattr(resources, 'XGB_NTHREAD', 6)
+    assert plan_thread_budget('LSTM', 2)['torch_intra'] == 3
+    assert plan_thread_budget('XGBoost', 2)['xgb_nthread'] == 6
+
+
+def test_thread_budget_applies_and_restores_limits(eight_cores):
+    prev_threads = torch.get_num_threads()
+    assert current_thread_budget() is None
+    with thread_budget('XGBoost', 4) as budget:
+        assert current_thread_budget() is budget
+        assert default_nthread() == 2
+        assert torch.get_num_threads() == 1
+        assert budget['torch_interop'] == torch.get_num_interop_threads()
+        for pool in threadpool_info():
+            if pool['user_api'] == 'blas':
+                assert pool['num_threads'] == 1
+    assert current_thread_budget() is None
+    assert torch.get_num_threads() == prev_threads
+
+
+def test_thread_budget_restores_after_error(eight_cores):
+    prev_threads = torch.get_num_threads()
+    with pytest.raises(ValueError):
+        with thread_budget('LSTM', 1):
+            assert torch.get_num_threads() == 8
+            raise ValueError('fail')
+    assert current_thread_budget() is None
+    assert torch.get_num_threads() == prev_threads
@@ -0,0 +1,89 @@
+import asyncio
+
+import fakeredis.aioredis
+import pytest
+
+from services.forecast_result import compress_forecast_result
+from services.task_status import TaskStatusService
+from tasks import celery_app
+
+TASK_ID = 'task-1'
+
+
+@pytest.fixture
+def service():
+    service = TaskStatusService(celery_app)
+    service.redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    return service
+
+
+async def store(service, status, result=None):
+    # Как Redis result backend Celery: состояние записывается и публикуется в канал ключа задачи
+    payload = service.backend.encode({'task_id': TASK_ID, 'status': status, 'result': result})
+    key = service._key(TASK_ID)
+    await service.redis.set(key, payload)
+    await service.redis.publish(key, payload)
+
+
+def later(coro, delay=0.05):
+    async def run():
+        await asyncio.sleep(delay)
+        await coro
+    return asyncio.ensure_future(run())
+
+
+def test_get_reads_state_and_decompresses_result(service):
+    result = {'format': 'columnar', 'version': 1, 'forecast_all': {'ds': ['2020-01-01']}}
+
+    async def scenario():
+        pending = await service.get(TASK_ID)
+        await store(service, 'SUCCESS', compress_forecast_result(result, 'zlib'))
+        return pending, await service.get(TASK_ID)
+
+    pending, done = asyncio.run(scenario())
+    assert pending == {'task_id': TASK_ID, 'status': 'PENDING', 'result': None}
+    assert done == {'task_id': TASK_ID, 'status': 'SUCCESS', 'result': result}
+
+
+def test_wait_returns_on_published_change(service):
+    async def scenario():
+        publisher = later(store(service, 'SUCCESS', {'value': 1}))
+        state = await service.wait(TASK_ID, since='PENDING', timeout=5)
+        await publisher
+        return state
+
+    state = asyncio.run(scenario())
+    assert (state['status'], state['result']) == ('SUCCESS', {'value': 1})
+    assert service._waiters == {}
+
+
+def test_wait_returns_current_state_immediately_or_on_timeout(service):
+    async def scenario():
+        await store(service, 'PROGRESS', {'epoch': 1})
+        # Состояние уже отличается от since — ответ сразу
+        changed = await service.wait(TASK_ID, since='PENDING', timeout=5)
+        unchanged = await service.wait(TASK_ID, since='PROGRESS', timeout=0.1)
+        return changed, unchanged
+
+    changed, unchanged = asyncio.run(scenario())
+    assert changed['status'] == 'PROGRESS'
+    assert unchanged['status'] == 'PROGRESS'
+
+
+def test_watch_streams_states_until_ready(service):
+    async def scenario():
+        await store(service, 'PROGRESS', {'epoch': 1})
+        states = []
+        publisher = None
+        async for state in service.watch(TASK_ID, heartbeat=0.2):
+            states.append(None if state is None else state['status'])
+            if publisher is None:
+                publisher = later(store(service, 'SUCCESS', {'value': 1}), delay=0.3)
+        await publisher
+        return states
+
+    states = asyncio.run(scenario())
+    # Без изменений за heartbeat выдаётся None (keep-alive)
+    assert states[0] == 'PROGRESS' and states[-1] == 'SUCCESS'
+    assert None in states[1:-1]
+    assert service._waiters == {}
@@ -0,0 +1,78 @@
+import os
+
+import pandas as pd
+import pytest
+
+import tasks
+from services.forecast_result import unpack_forecast_result
+from services.model_registry import ModelRegistry
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'forecast', 'count_project_data_week_laptop.csv')
+HORIZON = 4
+HISTORY = 8
+
+# Параметры, при которых каждая модель обучается за секунды. MC Dropout отключён:
+# прогноз из реестра сравнивается с прогнозом обученной модели
+NEURAL_PARAMS = {'seq_length': 8, 'lag_periods': 2, 'window_sizes': [3], 'hidden_dim': 8, 'num_layers': 1,
+                 'd_model': 8, 'nhead': 2, 'num_encoder_layers': 1, 'dim_feedforward': 16,
+                 'epochs': 2, 'n_splits': 2, 'mc_dropout': False, 'time_budget': 0}
+MODEL_PARAMS = {
+    'Prophet': [{}, {'uncertainty_samples': 0}],
+    'SARIMA': [{'p': 1, 'd': 1, 'q': 0, 'P': 0, 'D': 0, 'Q': 0, 's': 52}],
+    'XGBoost': [{'n_estimators': 10}],
+    'LSTM': [NEURAL_PARAMS],
+    'GRU': [NEURAL_PARAMS],
+    'Transformer': [NEURAL_PARAMS],
+}
+RESULT_COLUMNS = {'ds', 'y_fact', 'y_forecast', 'yhat_lower', 'yhat_upper', 'model_name'}
+CASES = [(model, params) for model, variants in MODEL_PARAMS.items() for params in variants]
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+    monkeypatch.setattr(tasks, 'model_registry', registry)
+    return registry
+
+
+@pytest.fixture(scope='module')
+def records():
+    return pd.read_csv(DATA_PATH).to_dict(orient='records')
+
+
+def run(model, params, records):
+    return unpack_forecast_result(tasks.forecast_model(
+        model, params, HORIZON, HISTORY, 'date', 'product_count', 'W-MON', 95, records
+    ))
+
+
+@pytest.mark.parametrize('model,params', CASES, ids=[f'{m}-{i}' for i, (m, _) in enumerate(CASES)])
+def test_forecast_model_runs_and_stores_artifact(model, params, records, registry):
+    result = run(model, params, records)
+    assert len(result['forecast_horizon']) == HORIZON
+    assert len(result['forecast_all']) > 0
+    assert all(row['y_forecast'] is not None for row in result['forecast_horizon'])
+    # Столбцы результата общие для всех моделей
+    for name in ('forecast_all', 'forecast_train', 'forecast_horizon'):
+        assert set(result[name][0]) <= RESULT_COLUMNS, name
+    assert len(os.listdir(registry.root)) > 0
+
+    # Повторный запрос берёт модель из реестра и даёт тот же прогноз горизонта
+    again = run(model, params, records)
+    assert [row['y_forecast'] for row in again['forecast_horizon']] == \
+        pytest.approx([row['y_forecast'] for row in result['forecast_horizon']], rel=1e-6)
+
+
+def test_truncated_neural_model_is_not_registered(records, registry):
+    run('LSTM', {**NEURAL_PARAMS, 'time_budget': 1e-3}, records)
+    assert os.listdir(registry.root) == []
+
+
+def test_run_forecast_packs_thread_budget_into_compressed_result(records, registry, monkeypatch):
+    monkeypatch.setattr(tasks, 'CELERY_RESULT_COMPRESSION', 'zlib')
+    packed = tasks.run_forecast.run('XGBoost', {'n_estimators': 10}, HORIZON, HISTORY,
+                                    'date', 'product_count', 'W-MON', 95, records)
+    assert set(packed) == {'format', 'version', 'compression', 'data'}
+    result = unpack_forecast_result(packed)
+    assert result['thread_budget']['model_class'] == 'tree'
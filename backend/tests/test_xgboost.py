@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+from xgboost import Booster
+
+import forecast.xgboost_forecast as xgboost_module
+from forecast.features import build_feature_matrix
+from forecast.xgboost_forecast import default_nthread, xgboost_forecast
+
+HORIZON, TEST_SIZE = 6, 12
+
+
+def make_frame(n=120, seed=0):
+    t = np.arange(n)
+    return pd.DataFrame({
+        'ds': pd.date_range('2015-01-01', periods=n, freq='MS'),
+        'y': 100 + 0.5 * t + 10 * np.sin(2 * np.pi * t / 12) + np.random.default_rng(seed).normal(0, 2, n),
+    })
+
+
+def forecast(df, artifacts=None, **params):
+    return xgboost_forecast(df, HORIZON, TEST_SIZE, 'ds', 'y', 'MS',
+                            xgb_params={'n_estimators': 20, **params}, artifacts=artifacts)
+
+
+def load_booster(raw):
+    booster = Booster()
+    booster.load_model(bytearray(raw))
+    return booster
+
+
+def horizon_row(values, date, lag, window_sizes=(), seasonality=''):
+    # Строка признаков шага горизонта полным перестроением матрицы: к ряду дописывается
+    # строка даты шага (значение не участвует в признаках при lagged_stats)
+    frame = pd.DataFrame({'ds': list(values.index) + [date], 'y': list(values.to_numpy()) + [0.0]})
+    matrix = build_feature_matrix(frame, 'ds', 'y', lag, seasonality=seasonality, window_sizes=list(window_sizes),
+                                  include_exog=False, use_cache=False, lagged_stats=True)
+    return np.delete(matrix.values[-1:], matrix.columns.index('y'), axis=1)
+
+
+def rebuilt_recursive_forecast(booster, df, future_dates, **features):
+    # Рекурсивный прогноз по шагам с перестроением признаков на ряду, дополненном прогнозами
+    values = df.set_index('ds')['y'].astype(float)
+    forecasts = []
+    for date in future_dates:
+        forecasts.append(float(booster.inplace_predict(horizon_row(values, date, **features))[0]))
+        values.loc[date] = forecasts[-1]
+    return np.array(forecasts)
+
+
+def test_recursive_horizon_matches_feature_rebuild():
+    df = make_frame()
+    artifacts = {}
+    forecast_horizon = forecast(df, artifacts)[3]
+    assert len(forecast_horizon) == HORIZON
+    assert artifacts['model']['direct'] is None
+    expected = rebuilt_recursive_forecast(load_booster(artifacts['model']['booster']), df,
+                                          forecast_horizon['ds'], lag=5)
+    np.testing.assert_allclose(forecast_horizon['y_forecast'], expected, rtol=1e-6)
+
+
+@pytest.mark.parametrize('features', [
+    {'lags': 3, 'window_sizes': [3, 6], 'seasonality': 'M'},
+    {'lags': 2, 'window_sizes': [4], 'seasonality': 'W'},
+    {'lags': 7, 'seasonality': 'D'},
+])
+def test_rich_features_recursive_horizon_matches_feature_rebuild(features):
+    df = make_frame()
+    artifacts = {}
+    forecast_all, _, _, forecast_horizon = forecast(df, artifacts, **features)
+    # Первые строки без полной истории окон отбрасываются
+    assert len(forecast_all) == len(df) - max([features['lags'], 1] + features.get('window_sizes', []))
+    expected = rebuilt_recursive_forecast(load_booster(artifacts['model']['booster']), df, forecast_horizon['ds'],
+                                          lag=features['lags'], window_sizes=features.get('window_sizes', ()),
+                                          seasonality=features['seasonality'])
+    np.testing.assert_allclose(forecast_horizon['y_forecast'], expected, rtol=1e-5)
+
+
+def test_direct_strategy_trains_booster_per_step():
+    df = make_frame()
+    artifacts = {}
+    forecast_horizon = forecast(df, artifacts, forecast_strategy='direct', direct_workers=2)[3]
+    boosters = [load_booster(raw) for raw in artifacts['model']['direct']]
+    assert len(boosters) == HORIZON
+    # Все шаги прогнозируются по строке признаков первого шага горизонта
+    row = horizon_row(df.set_index('ds')['y'], forecast_horizon['ds'].iloc[0], lag=5)
+    expected = [booster.inplace_predict(row)[0] for booster in boosters]
+    np.testing.assert_allclose(forecast_horizon['y_forecast'], expected, rtol=1e-6)
+
+    cached = forecast(df, {'model': artifacts['model']}, forecast_strategy='direct')[3]
+    np.testing.assert_allclose(cached['y_forecast'], forecast_horizon['y_forecast'])
+
+
+def test_direct_strategy_falls_back_to_recursive_for_short_series():
+    df = make_frame(TEST_SIZE + 5 + HORIZON)
+    artifacts = {}
+    forecast_horizon = forecast(df, artifacts, forecast_strategy='direct')[3]
+    assert artifacts['model']['direct'] is None
+    assert forecast_horizon['y_forecast'].notna().all()
+
+
+@pytest.fixture
+def booster_params(monkeypatch):
+    # Параметры, с которыми создаются XGBRegressor внутри xgboost_forecast
+    calls = []
+
+    class RecordingRegressor(xgboost_module.XGBRegressor):
+        def __init__(self, **kwargs):
+            calls.append(kwargs)
+            super().__init__(**kwargs)
+
+    monkeypatch.setattr(xgboost_module, 'XGBRegressor', RecordingRegressor)
+    return calls
+
+
+def test_booster_defaults_follow_worker_and_training_size(booster_params):
+    forecast(make_frame(40))
+    params = booster_params[0]
+    assert params['tree_method'] == 'hist'
+    assert params['n_jobs'] == default_nthread()
+    # max_bin не больше числа строк обучения (40 - 5 лагов - 12 в тесте)
+    assert params['max_bin'] == 23
+    # Собственные ключи запроса не попадают в параметры бустера
+    assert not {'lags', 'window_sizes', 'seasonality', 'forecast_strategy'} & set(params)
+
+
+def test_booster_params_from_request_override_defaults(booster_params):
+    forecast(make_frame(), nthread=3, max_bin=64, tree_method='approx', lags=3, window_sizes=[3])
+    params = booster_params[0]
+    assert (params['n_jobs'], params['max_bin'], params['tree_method']) == (3, 64, 'approx')
+    assert 'nthread' not in params
@@ -11,3 +11,43 @@ export const logout = () => API.post("/auth/logout");
 export const uploadFile = (fileData) => API.post("/api/upload", fileData, {
   headers: { "Content-Type": "multipart/form-data" }
 });
+
+// Компактный (колоночный) формат результата прогноза
+export const COLUMNAR_MEDIA_TYPE = "application/vnd.timeflow.columnar+json";
+
+const columnsToRecords = (columns, modelName, start = 0, stop) => {
+  const names = Object.keys(columns || {});
+  if (!names.length) return [];
+  const end = stop === undefined ? columns[names[0]].length : stop;
+  const records = [];
+  for (let i = start; i < end; i++) {
+    const row = {};
+    for (const name of names) {
+      const value = columns[name][i];
+      row[name] =
+        name === "ds" && value !== null
+          ? new Date(value).toISOString().slice(0, 19)
+          : value;
+    }
+    if (modelName) row.model_name = modelName;
+    records.push(row);
+  }
+  return records;
+};
+
+// Колоночный результат -> списки записей forecast_all/train/test/horizon
+export const expandForecastResult = (result) => {
+  if (!result || result.format !== "columnar") return result;
+  const { model_name: modelName, forecast_all: all } = result;
+  const part = (name) =>
+    result[name]
+      ? columnsToRecords(all, modelName, result[name][0], result[name][1])
+      : columnsToRecords(result[`forecast_${name}`], modelName);
+  return {
+    ...result,
+    forecast_all: columnsToRecords(all, modelName),
+    forecast_train: part("train"),
+    forecast_test: part("test"),
+    forecast_horizon: columnsToRecords(result.forecast_horizon, modelName),
+  };
+};
@@ -10,6 +10,7 @@ import {
   FormControlLabel,
   Paper,
   Slider,
+  Switch,
   Typography,
   ToggleButton,
   ToggleButtonGroup,
@@ -37,6 +38,7 @@ export const SarimaBlock = memo(function SarimaBlock({
   const [localDSeasonal, setLocalDSeasonal] = useState(sarimaParams?.D || 1);
   const [localQSeasonal, setLocalQSeasonal] = useState(sarimaParams?.Q || 1);
   const [localS, setLocalS] = useState(sarimaParams?.s || 12);
+  const [localAuto, setLocalAuto] = useState(Boolean(sarimaParams?.auto));
   const [paramsOpen, setParamsOpen] = useState(false);
   const { setIsDirty } = useContext(DashboardContext);
 
@@ -49,6 +51,7 @@ export const SarimaBlock = memo(function SarimaBlock({
       D: localDSeasonal,
       Q: localQSeasonal,
       s: localS,
+      auto: localAuto,
     });
     setActive(true);
     setIsDirty(true);
@@ -61,6 +64,7 @@ export const SarimaBlock = memo(function SarimaBlock({
     localDSeasonal,
     localQSeasonal,
     localS,
+    localAuto,
     setSarimaParams,
     setActive,
     setIsDirty,
@@ -111,6 +115,17 @@ export const SarimaBlock = memo(function SarimaBlock({
         </Box>
       </Box>
       <Collapse in={paramsOpen}>
+        <FormControlLabel
+          sx={{ mt: 1, color: theme.palette.common.white }}
+          control={
+            <Switch
+              checked={localAuto}
+              onChange={(e) => setLocalAuto(e.target.checked)}
+              color="primary"
+            />
+          }
+          label="Автоподбор порядков (p, d, q, P, D, Q)"
+        />
         <Box sx={{ mt: 1, display: "flex", flexWrap: "wrap", gap: 2 }}>
           <Box>
             <Typography variant="body2" sx={{ color: theme.palette.common.white, mb: 0.5 }}>p</Typography>
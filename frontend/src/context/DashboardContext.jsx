@@ -16,6 +16,9 @@ export const DashboardProvider = ({ children }) => {
   const [selectedColumns, setSelectedColumns] = useState([]);
   const [uploadedFile, setUploadedFile] = useState(null);
   const [uploadedFileName, setUploadedFileName] = useState("");
+  // Идентификатор загруженного файла в хранилище наборов на сервере (только в памяти:
+  // после восстановления сессии данные отправляются заново)
+  const [datasetId, setDatasetId] = useState(null);
   const [currentSessionId, setCurrentSessionId] = useState(null);
   const [tablePage, setTablePage] = useState(0);
   const [tableRowsPerPage, setTableRowsPerPage] = useState(25);
@@ -148,6 +151,7 @@ export const DashboardProvider = ({ children }) => {
     setSelectedColumns([]);
     setUploadedFile(null);
     setUploadedFileName("");
+    setDatasetId(null);
     setTablePage(0);
     setTableRowsPerPage(25);
     setSecondPageState({
@@ -318,6 +322,8 @@ export const DashboardProvider = ({ children }) => {
         setUploadedFile,
         uploadedFileName,
         setUploadedFileName,
+        datasetId,
+        setDatasetId,
         currentSessionId,
         setCurrentSessionId,
         tablePage,
@@ -45,6 +45,7 @@ const Dashboard = () => {
     setUploadedFile,
     uploadedFileName,
     setUploadedFileName,
+    setDatasetId,
     currentSessionId,
     setCurrentSessionId,
     resetDashboardState,
@@ -90,6 +91,8 @@ const Dashboard = () => {
       const receivedData = response.data.full_data || [];
       const columnNames = response.data.columns || [];
       setOriginalData(receivedData);
+      // Файл уже сохранён на сервере: прогноз по неизменённым данным ссылается на него
+      setDatasetId(response.data.dataset_id || null);
       setColumns(columnNames);
       addHistoryItem(file.name);
       analyzeData(receivedData);
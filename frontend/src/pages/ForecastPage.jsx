@@ -4,6 +4,7 @@ import React, {
   useEffect,
   useCallback,
   useMemo,
+  useRef,
   memo,
 } from "react";
 import {
@@ -64,6 +65,7 @@ import { SarimaBlock } from "../components/models/SARIMABlock";
 import { ProphetBlock } from "../components/models/ProphetBlock";
 import { XGBoostBlock } from "../components/models/XGBoostBlock";
 import GlassPaper from "../components/GlassPaper";
+import { COLUMNAR_MEDIA_TYPE, expandForecastResult } from "../api";
 
 import {
   Chart as ChartJS,
@@ -77,6 +79,9 @@ import {
   Legend,
 } from "chart.js";
 
+// Состояния задачи, после которых статус больше не меняется
+const FINAL_TASK_STATES = ["SUCCESS", "FAILURE", "REVOKED"];
+
 ChartJS.register(
   CategoryScale,
   LinearScale,
@@ -252,7 +257,24 @@ const AnimatedMetricChip = memo(function AnimatedMetricChip({ label, value, type
   );
 });
 
-const SpinnerOverlay = () => (
+const STAGE_LABELS = {
+  cv: "Кросс-валидация",
+  full: "Обучение",
+  forecast: "Прогноз",
+};
+
+// Подпись хода обучения: этап, фолд, эпоха, ошибка на валидации и оставшееся время
+const formatProgress = (progress) => {
+  if (!progress || !progress.stage) return null;
+  const parts = [STAGE_LABELS[progress.stage] || progress.stage];
+  if (progress.fold && progress.n_folds) parts.push(`фолд ${progress.fold}/${progress.n_folds}`);
+  if (progress.epoch && progress.epochs) parts.push(`эпоха ${progress.epoch}/${progress.epochs}`);
+  if (progress.val_loss !== undefined) parts.push(`val ${progress.val_loss.toFixed(4)}`);
+  if (progress.eta !== null && progress.eta !== undefined) parts.push(`≈${Math.ceil(progress.eta)} с`);
+  return parts.join(" · ");
+};
+
+const SpinnerOverlay = ({ progress }) => (
   <Box
     sx={{
       position: "absolute",
@@ -261,6 +283,8 @@ const SpinnerOverlay = () => (
       width: "100%",
       height: "100%",
       display: "flex",
+      flexDirection: "column",
+      gap: 1,
       alignItems: "center",
       justifyContent: "center",
       zIndex: 2,
@@ -268,6 +292,11 @@ const SpinnerOverlay = () => (
     }}
   >
     <CircularProgress size={48} sx={{ color: (theme) => theme.palette.primary.main }} />
+    {formatProgress(progress) && (
+      <Typography variant="caption" sx={{ color: "#fff" }}>
+        {formatProgress(progress)}
+      </Typography>
+    )}
   </Box>
 );
 
@@ -293,6 +322,10 @@ export default function ForecastPage() {
   const stateSelectedColumns = location.state?.selectedColumns || [];
   const initialModifiedData = stateModifiedData.length ? stateModifiedData : [];
   const initialSelectedColumns = stateSelectedColumns.length ? stateSelectedColumns : [];
+  // dataset_id загруженного файла, если данные не менялись при предобработке
+  const stateDatasetId = location.state?.datasetId || null;
+  // Набор на сервере для текущих данных: отправляется один раз и переиспользуется между запусками
+  const uploadedDatasetRef = useRef({ data: null, id: null });
 
   useEffect(() => {
     if (!initialModifiedData || initialModifiedData.length === 0 || initialSelectedColumns.length < 2) {
@@ -546,38 +579,71 @@ export default function ForecastPage() {
     [theme]
   );
 
-  // Функция опроса статуса задачи
+  // Отслеживание статуса задачи: сервер присылает изменения через SSE (EventSource),
+  // при ошибке потока — long-poll (/wait), ответ на который приходит при смене статуса
   const pollTaskStatus = useCallback((taskId, modelName) => {
     if (!taskId) return;
-    const intervalId = setInterval(async () => {
-      try {
-        const statusResp = await axios.get(
-          `http://localhost:8000/api/forecast/status/${taskId}`
+    let finished = false;
+
+    const applyStatus = (data) => {
+      if (finished) return;
+      if (data.progress) {
+        setForecastResults((prevResults) =>
+          prevResults.map((res) =>
+            res.modelName === modelName ? { ...res, progress: data.progress } : res
+          )
         );
-        if (statusResp.data.status !== "PENDING") {
-          clearInterval(intervalId);
-          const { forecast_all, forecast_train, forecast_test, forecast_horizon } =
-            statusResp.data.result;
-          setForecastResults((prevResults) =>
-            prevResults.map((res) =>
-              res.modelName === modelName
-                ? {
-                    ...res,
-                    forecastAll: forecast_all || [],
-                    forecastTrain: forecast_train || [],
-                    forecastTest: forecast_test || [],
-                    forecastHorizon: forecast_horizon || [],
-                    status: statusResp.data.status,
-                  }
-                : res
-            )
+      }
+      if (!FINAL_TASK_STATES.includes(data.status)) return;
+      finished = true;
+      const { forecast_all, forecast_train, forecast_test, forecast_horizon } =
+        expandForecastResult(data.result) || {};
+      setForecastResults((prevResults) =>
+        prevResults.map((res) =>
+          res.modelName === modelName
+            ? {
+                ...res,
+                forecastAll: forecast_all || [],
+                forecastTrain: forecast_train || [],
+                forecastTest: forecast_test || [],
+                forecastHorizon: forecast_horizon || [],
+                status: data.status,
+              }
+            : res
+        )
+      );
+    };
+
+    const longPoll = async (since) => {
+      try {
+        while (!finished) {
+          const statusResp = await axios.get(
+            `http://localhost:8000/api/forecast/status/${taskId}/wait`,
+            { params: { since }, headers: { Accept: COLUMNAR_MEDIA_TYPE } }
           );
+          since = statusResp.data.status;
+          applyStatus(statusResp.data);
         }
       } catch (error) {
         console.error("Ошибка при опросе статуса задачи:", error);
-        clearInterval(intervalId);
       }
-    }, 3000);
+    };
+
+    const source = new EventSource(
+      `http://localhost:8000/api/forecast/events/${taskId}?format=columnar`,
+      { withCredentials: true }
+    );
+    let lastStatus = "PENDING";
+    source.addEventListener("status", (event) => {
+      const data = JSON.parse(event.data);
+      lastStatus = data.status;
+      applyStatus(data);
+      if (finished) source.close();
+    });
+    source.onerror = () => {
+      source.close();
+      if (!finished) longPoll(lastStatus);
+    };
   }, [setForecastResults]);
 
   const [localIsLoading, setLocalIsLoading] = useState(false);
@@ -612,6 +678,21 @@ export default function ForecastPage() {
       if (transformerActive)
         activeModels.push({ model: "Transformer", uniqueParams: transformerParams });
 
+      // Модели ссылаются на данные по dataset_id: неизменённые данные — загруженный файл,
+      // изменённые отправляются на сервер один раз для этих данных
+      let datasetId = stateDatasetId;
+      if (!datasetId) {
+        if (uploadedDatasetRef.current.data !== initialModifiedData) {
+          const datasetResp = await axios.post(
+            "http://localhost:8000/api/datasets",
+            { data: initialModifiedData },
+            { withCredentials: true }
+          );
+          uploadedDatasetRef.current = { data: initialModifiedData, id: datasetResp.data.dataset_id };
+        }
+        datasetId = uploadedDatasetRef.current.id;
+      }
+
       const newResults = [];
       for (let m of activeModels) {
         const payload = {
@@ -623,7 +704,7 @@ export default function ForecastPage() {
           y_name: initialSelectedColumns[1] || "y",
           freq: localCommonParams.freq,
           confidence_level: localCommonParams.confidenceLevel,
-          data: initialModifiedData,
+          dataset_id: datasetId,
         };
         const resp = await axios.post("http://localhost:8000/api/forecast", payload);
         if (!resp.data.task_id) {
@@ -651,6 +732,7 @@ export default function ForecastPage() {
     localCommonParams,
     initialModifiedData,
     initialSelectedColumns,
+    stateDatasetId,
     prophetActive,
     prophetParams,
     xgboostActive,
@@ -670,6 +752,30 @@ export default function ForecastPage() {
     forecastsRunning,
   ]);
 
+  // Обработчик кнопки "Отменить": задачи в очереди не начнутся, обучающиеся остановятся
+  // за несколько секунд (итоговый статус REVOKED придёт через отслеживание статуса)
+  const handleCancelForecast = useCallback(async () => {
+    const running = forecastResults.filter((res) => res.status === "PENDING");
+    const cancelled = new Set();
+    await Promise.all(
+      running.map(async (res) => {
+        try {
+          const resp = await axios.delete(`http://localhost:8000/api/forecast/${res.taskId}`);
+          if (resp.data.cancelled) cancelled.add(res.taskId);
+        } catch (err) {
+          console.error("Ошибка отмены задачи:", err);
+        }
+      })
+    );
+    setForecastResults((prevResults) =>
+      prevResults.map((res) =>
+        cancelled.has(res.taskId) && res.status === "PENDING"
+          ? { ...res, status: "REVOKED", progress: undefined }
+          : res
+      )
+    );
+  }, [forecastResults, setForecastResults]);
+
   return (
     <motion.div
       initial={{ opacity: 0, x: 50 }}
@@ -844,6 +950,16 @@ export default function ForecastPage() {
                     "Построить прогноз"
                   )}
                 </Button>
+                {forecastsRunning && (
+                  <Button
+                    variant="outlined"
+                    color="error"
+                    onClick={handleCancelForecast}
+                    sx={{ borderRadius: "12px", px: 3, ml: 2 }}
+                  >
+                    Отменить
+                  </Button>
+                )}
               </Box>
             </GlassPaper>
             {forecastResults.length > 0 && (
@@ -962,7 +1078,7 @@ export default function ForecastPage() {
                         {subTab === 0 && (
                           <Box sx={{ height: 400, position: "relative" }}>
                             <Line data={chartAll} options={chartOptions} />
-                            {curModel.status === "PENDING" && <SpinnerOverlay />}
+                            {curModel.status === "PENDING" && <SpinnerOverlay progress={curModel.progress} />}
                             {metricsAll && (
                               <Box sx={{ display: "flex", flexWrap: "wrap", gap: 1, mt: 2, pt: 3, pb: 10 }}>
                                 <AnimatedMetricChip label="MAE" value={metricsAll.mae} type="mae" icon={<TrendingDownIcon />} />
@@ -977,7 +1093,7 @@ export default function ForecastPage() {
                         {subTab === 1 && (
                           <Box sx={{ height: 400, position: "relative" }}>
                             <Line data={chartTrain} options={chartOptions} />
-                            {curModel.status === "PENDING" && <SpinnerOverlay />}
+                            {curModel.status === "PENDING" && <SpinnerOverlay progress={curModel.progress} />}
                             {metricsTrain && (
                               <Box sx={{ display: "flex", flexWrap: "wrap", gap: 1, mt: 2, pt: 3, pb: 10 }}>
                                 <AnimatedMetricChip label="MAE" value={metricsTrain.mae} type="mae" icon={<TrendingDownIcon />} />
@@ -992,7 +1108,7 @@ export default function ForecastPage() {
                         {subTab === 2 && (
                           <Box sx={{ height: 400, position: "relative" }}>
                             <Line data={chartTest} options={chartOptions} />
-                            {curModel.status === "PENDING" && <SpinnerOverlay />}
+                            {curModel.status === "PENDING" && <SpinnerOverlay progress={curModel.progress} />}
                             {metricsTest && (
                               <Box sx={{ display: "flex", flexWrap: "wrap", gap: 1, mt: 2, pt: 3, pb: 10 }}>
                                 <AnimatedMetricChip label="MAE" value={metricsTest.mae} type="mae" icon={<TrendingDownIcon />} />
@@ -1007,7 +1123,7 @@ export default function ForecastPage() {
                         {subTab === 3 && (
                           <Box sx={{ height: 400, position: "relative", pt: 5 }}>
                             <Line data={chartHorizon} options={chartOptions} />
-                            {curModel.status === "PENDING" && <SpinnerOverlay />}
+                            {curModel.status === "PENDING" && <SpinnerOverlay progress={curModel.progress} />}
                             <Box sx={{ display: "flex", flexWrap: "wrap", gap: 1, mt: 2, pt: 3, pb: 10 }}>
                               <Typography sx={{ mt: 2 }}>
                                 Прогноз будущего (факт отсутствует).
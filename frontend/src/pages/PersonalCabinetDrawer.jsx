@@ -207,6 +207,7 @@ const PersonalCabinetDrawer = ({ open, onClose }) => {
     setColumns,
     setSelectedColumns,
     setUploadedFileName,
+    setDatasetId,
     setSecondPageState,
     setPreprocessingSettings,
     setForecastResults,
@@ -263,6 +264,8 @@ const PersonalCabinetDrawer = ({ open, onClose }) => {
   const handleLoadSession = async (sessionId, state) => {
     try {
       if (state.originalData) setOriginalData(state.originalData);
+      // Набор сессии на сервере неизвестен: при прогнозе данные отправятся заново
+      setDatasetId(null);
       if (state.columns) setColumns(state.columns);
       if (state.filters) setFilters(state.filters);
       if (state.selectedColumns) setSelectedColumns(state.selectedColumns);
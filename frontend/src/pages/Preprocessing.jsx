@@ -189,6 +189,7 @@ const SelectedColumnsPage = () => {
     selectedColumns,
     filteredData,
     filters,
+    datasetId,
     secondPageState,
     setSecondPageState,
     setIsDirty,
@@ -597,7 +598,14 @@ const SelectedColumnsPage = () => {
   };
 
   const handleGoToForecast = () => {
-    navigate("/forecast", { state: { modifiedData: finalData, selectedColumns } });
+    // Без фильтров и шагов обработки данные совпадают с загруженным файлом (порядок строк
+    // не важен: модели сортируют ряд по дате), поэтому прогноз ссылается на его dataset_id
+    const unmodified =
+      !Object.values(filters || {}).some(Boolean) &&
+      !Object.values(secondPageState.processingSteps || {}).some(Boolean);
+    navigate("/forecast", {
+      state: { modifiedData: finalData, selectedColumns, datasetId: unmodified ? datasetId : null },
+    });
   };
 
   return (